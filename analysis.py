@@ -0,0 +1,151 @@
+import os
+import re
+import pickle
+import logging
+
+logger = logging.getLogger("Analyzer")
+
+# NLTK's English stop word list, bundled so analysis needs no corpus download
+STOP_WORDS = frozenset((
+    "i", "me", "my", "myself", "we", "our", "ours", "ourselves", "you", "you're", "you've",
+    "you'll", "you'd", "your", "yours", "yourself", "yourselves", "he", "him", "his", "himself",
+    "she", "she's", "her", "hers", "herself", "it", "it's", "its", "itself", "they", "them",
+    "their", "theirs", "themselves", "what", "which", "who", "whom", "this", "that", "that'll",
+    "these", "those", "am", "is", "are", "was", "were", "be", "been", "being", "have", "has",
+    "had", "having", "do", "does", "did", "doing", "a", "an", "the", "and", "but", "if", "or",
+    "because", "as", "until", "while", "of", "at", "by", "for", "with", "about", "against",
+    "between", "into", "through", "during", "before", "after", "above", "below", "to", "from",
+    "up", "down", "in", "out", "on", "off", "over", "under", "again", "further", "then", "once",
+    "here", "there", "when", "where", "why", "how", "all", "any", "both", "each", "few", "more",
+    "most", "other", "some", "such", "no", "nor", "not", "only", "own", "same", "so", "than",
+    "too", "very", "s", "t", "can", "will", "just", "don", "don't", "should", "should've", "now",
+    "d", "ll", "m", "o", "re", "ve", "y", "ain", "aren", "aren't", "couldn", "couldn't", "didn",
+    "didn't", "doesn", "doesn't", "hadn", "hadn't", "hasn", "hasn't", "haven", "haven't", "isn",
+    "isn't", "ma", "mightn", "mightn't", "mustn", "mustn't", "needn", "needn't", "shan", "shan't",
+    "shouldn", "shouldn't", "wasn", "wasn't", "weren", "weren't", "won", "won't", "wouldn",
+    "wouldn't"
+))
+
+# The Treebank contraction splits word_tokenize applies that can still match
+# once punctuation is stripped, e.g. "cannot" -> "can not"
+CONTRACTIONS = [re.compile(pattern) for pattern in (
+    r"(?i)\b(can)(not)\b",
+    r"(?i)\b(gim)(me)\b",
+    r"(?i)\b(gon)(na)\b",
+    r"(?i)\b(got)(ta)\b",
+    r"(?i)\b(lem)(me)\b",
+    r"(?i)\b(wan)(na)(?=\s)",
+)]
+
+# Runs of word characters other than digits, the tokens analyze() keeps apart
+WORD_RUN = re.compile(r'[^\W\d]+')
+
+STEMS_FILE = "stems.pkl"
+
+# Stems a query engine memoizes on top of those saved with the index, queries can bring any word
+QUERY_MEMO_SIZE = 50_000
+
+
+def tokenize(text):
+    """Split text reduced to word characters and whitespace into tokens.
+
+    Gives the same tokens as nltk's word_tokenize on such text without
+    loading the tokenizer models.
+    """
+    # Padded like the Treebank tokenizer, so (?=\s) also matches at the end
+    text = f" {text} "
+    for pattern in CONTRACTIONS:
+        text = pattern.sub(r" \1 \2 ", text)
+    return text.split()
+
+
+class Analyzer:
+    """Lowercases, strips punctuation and digits, tokenizes, removes stop words and stems.
+
+    Stems are memoized, and the memo is saved with the index, so a query
+    engine only imports the NLTK stemmer for words the corpus never had.
+    At most memo_size stems computed here are memoized, None keeps every
+    one, which indexing needs to save them all.
+    """
+
+    def __init__(self, memo_size=None):
+        self.stems = {}
+        self.memo_size = memo_size
+        self.memoized = 0
+        self._stemmer = None
+
+    def stem(self, token):
+        stem = self.stems.get(token)
+        if stem is None:
+            if self._stemmer is None:
+                # Importing nltk takes most of a second, only pay for it when needed
+                from nltk.stem.porter import PorterStemmer
+                self._stemmer = PorterStemmer()
+            stem = self._stemmer.stem(token)
+            if self.memo_size is None or self.memoized < self.memo_size:
+                self.stems[token] = stem
+                self.memoized += 1
+        return stem
+
+    def analyze(self, text):
+        """Return the index terms of a text"""
+        if not text:
+            return []
+
+        # Convert to lowercase
+        text = text.lower()
+
+        # Remove punctuation and numbers
+        text = re.sub(r'[^\w\s]', ' ', text)
+        text = re.sub(r'\d+', ' ', text)
+
+        # Remove stop words and stem
+        return [self.stem(token) for token in tokenize(text) if token not in STOP_WORDS and len(token) > 2]
+
+    def analyze_offsets(self, text):
+        """Return (term, start, end) for the terms of analyze(text), with their character offsets in text"""
+        terms = []
+        if not text:
+            return terms
+        for match in WORD_RUN.finditer(text):
+            start, end = match.span()
+            word = match.group().lower()
+            if len(word) != end - start:
+                # Lowercasing changed the length (e.g. a dotted capital I), clean the run like
+                # analyze() does and give every piece the span of the whole run
+                pieces = [(part, start, end) for part in tokenize(re.sub(r'[^\w\s]', ' ', word))]
+            else:
+                # Contractions only split whole runs, since the runs are what analyze() tokenizes
+                parts = tokenize(word)
+                if len(parts) > 1:
+                    middle = start + len(parts[0])
+                    pieces = ((parts[0], start, middle), (parts[1], middle, end))
+                else:
+                    pieces = ((word, start, end),)
+            for token, token_start, token_end in pieces:
+                if token not in STOP_WORDS and len(token) > 2:
+                    terms.append((self.stem(token), token_start, token_end))
+        return terms
+
+    def save(self, index_dir):
+        """Save the stems of every token seen while indexing"""
+        try:
+            with open(os.path.join(index_dir, STEMS_FILE), 'wb') as f:
+                pickle.dump(self.stems, f)
+            return True
+        except Exception as e:
+            logger.error(f"Error saving stems: {e}")
+            return False
+
+    def load(self, index_dir):
+        """Load the stems saved with an index, keeping any already computed"""
+        path = os.path.join(index_dir, STEMS_FILE)
+        if not os.path.exists(path):
+            return False
+        try:
+            with open(path, 'rb') as f:
+                self.stems.update(pickle.load(f))
+            return True
+        except Exception as e:
+            logger.error(f"Error loading stems: {e}")
+            return False
@@ -1,13 +1,18 @@
-from flask import Flask, render_template, request, jsonify, redirect, url_for
+from flask import Flask, render_template, request, jsonify, redirect, url_for, Response, stream_with_context
 import os
 import sys
 import pickle
 import logging
+import queue
 import threading
 import schedule
 import time
 from datetime import datetime
 import json
+import csv
+import io
+
+import numpy as np
 
 # Configure paths for imports
 current_dir = os.path.dirname(os.path.abspath(__file__))
@@ -18,20 +23,20 @@ try:
     from crawler import PurePortalCrawler
     from inverted_index import InvertedIndex
     from query_processor import QueryProcessor
+    from metrics import metrics
+    from profiler import SamplingProfiler, SlowQueryLog
+    from dates import parse_publication_date, parse_year_range
+    from query_log import QueryLog
+    from log_config import configure_logging, tail_lines, follow
+    from jobs import JobOrchestrator, JobCancelled
+    from index_store import IndexStore
 except ImportError as e:
     print(f"Error importing modules: {e}")
     print("Make sure crawler.py, inverted_index.py, and query_processor.py are in the same directory as app.py")
     sys.exit(1)
 
-# Configure logging
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(levelname)s - %(message)s',
-    handlers=[
-        logging.FileHandler("web_app.log"),
-        logging.StreamHandler()
-    ]
-)
+# Configure logging, crawler, index and search messages also go to their own files
+configure_logging("web_app.log")
 logger = logging.getLogger("WebApp")
 
 app = Flask(__name__)
@@ -40,10 +45,12 @@ app = Flask(__name__)
 data_dir = "."  # Changed from "crawled_data" to match the expected structure
 index_dir = "index_data"
 query_processor = None
-crawler_running = False
-indexing_running = False
 bg_thread = None
 stop_bg_thread = False
+profiler = SamplingProfiler(output_dir="profiles")
+slow_queries = SlowQueryLog(threshold_ms=float(os.environ.get('SLOW_QUERY_MS', 100)))
+# Searches and result clicks for training the rerank model, see rerank.py
+query_log = QueryLog(os.path.join(data_dir, "query_log.jsonl"))
 
 # Create directories if they don't exist
 os.makedirs(data_dir, exist_ok=True)
@@ -52,7 +59,14 @@ os.makedirs(index_dir, exist_ok=True)
 # Initialize query processor
 def init_query_processor():
     global query_processor
-    query_processor = QueryProcessor(data_dir=data_dir, index_dir=index_dir)
+    shard_addresses = os.environ.get('SEARCH_SHARDS')
+    if shard_addresses:
+        # Comma-separated host:port or Unix socket paths of running shard servers
+        from sharding import ShardedQueryProcessor, parse_address
+        addresses = [parse_address(address.strip()) for address in shard_addresses.split(',') if address.strip()]
+        query_processor = ShardedQueryProcessor(addresses, data_dir=data_dir, index_dir=index_dir)
+    else:
+        query_processor = QueryProcessor(data_dir=data_dir, index_dir=index_dir)
     return query_processor.load_data()
 
 # Initialize query processor at startup
@@ -60,13 +74,107 @@ init_successful = init_query_processor()
 if not init_successful:
     logger.warning("Failed to initialize query processor. Search results may be unavailable.")
 
+START_URL = "https://pureportal.coventry.ac.uk/en/organisations/fbl-school-of-economics-finance-and-accounting"
+# Keep fetched pages in pages.warc.gz so extraction can be re-run without crawling (CRAWL_ARCHIVE=0 to disable)
+ARCHIVE_PAGES = os.environ.get('CRAWL_ARCHIVE', '1') != '0'
+
+def run_index(job, index_builder):
+    """Build or update the index, then reload the query processor"""
+    steps = []
+    
+    def report(step, done, total):
+        # Each build step is a stage, finished when the next one starts
+        if not steps or steps[-1] != step:
+            if steps:
+                job.finish_stage(steps[-1])
+            steps.append(step)
+        job.progress(step, done, total)
+    
+    index_builder.progress = report
+    if index_builder.has_index():
+        success = index_builder.update_index()
+    else:
+        success = index_builder.build_index()
+    job.check_cancelled()
+    if not success:
+        raise RuntimeError("Error building/updating index, see index.log")
+    if steps:
+        job.finish_stage(steps[-1])
+    stats = index_builder.get_statistics()
+    logger.info(f"Indexing completed. Contains {stats['total_documents']} documents and {stats['total_terms']} terms.")
+    
+    job.progress('reload')
+    init_query_processor()
+    job.finish_stage('reload')
+
+def crawl_job(job, max_pages=100):
+    """Crawl the publications"""
+    crawler = PurePortalCrawler(START_URL, data_dir=data_dir, archive_pages=ARCHIVE_PAGES)
+    if not crawler.crawl(max_pages=max_pages, on_page=lambda page, _: job.progress('crawl', page, max_pages)):
+        job.check_cancelled()
+        raise RuntimeError("Crawl failed, see crawler.log")
+    job.finish_stage('crawl')
+    logger.info(f"Crawler completed. Found {len(crawler.publications)} publications.")
+
+def index_job(job):
+    """Build or update the index from the last crawl"""
+    run_index(job, InvertedIndex(data_dir=data_dir, index_dir=index_dir))
+
+def refresh_job(job, max_pages=200):
+    """Crawl, index and reload, analyzing each crawled page while the crawl continues"""
+    index_builder = InvertedIndex(data_dir=data_dir, index_dir=index_dir)
+    pages = queue.Queue()
+    
+    def analyze_pages():
+        analyzed = 0
+        try:
+            while True:
+                publications = pages.get()
+                if publications is None:
+                    return
+                index_builder.prepare(publications)
+                analyzed += len(publications)
+                job.progress('analyze', analyzed)
+        except JobCancelled:
+            # The crawl stops at its next page
+            return
+    
+    def on_page(page, publications):
+        pages.put(publications)
+        job.progress('crawl', page, max_pages)
+    
+    analyzer = threading.Thread(target=analyze_pages, name="analyze-pages", daemon=True)
+    analyzer.start()
+    try:
+        crawler = PurePortalCrawler(START_URL, data_dir=data_dir, archive_pages=ARCHIVE_PAGES)
+        crawled = crawler.crawl(max_pages=max_pages, on_page=on_page)
+    finally:
+        pages.put(None)
+        analyzer.join()
+    job.check_cancelled()
+    if not crawled:
+        raise RuntimeError("Crawl failed, see crawler.log")
+    job.finish_stage('crawl')
+    job.finish_stage('analyze')
+    logger.info(f"Crawler completed. Found {len(crawler.publications)} publications.")
+    
+    # Only the corpus-wide steps are left, the pages were analyzed as they arrived
+    run_index(job, index_builder)
+
+# Crawl and index jobs run one at a time, in the order they were requested
+jobs = JobOrchestrator(os.path.join(data_dir, "jobs.json"))
+jobs.register('crawl', crawl_job)
+jobs.register('index', index_job)
+jobs.register('refresh', refresh_job)
+jobs.start()
+
 def scheduled_task():
-    print("Scheduled task is running...")
+    """Queue the weekly crawl and index refresh"""
+    logger.info("Running scheduled tasks")
+    jobs.submit('refresh', max_pages=200)
 
 # Background scheduler thread
 def run_scheduler():
-    global stop_bg_thread
-    
     # Schedule weekly crawl and index update
     schedule.every().monday.at("01:00").do(scheduled_task)
     
@@ -79,35 +187,6 @@ bg_thread = threading.Thread(target=run_scheduler)
 bg_thread.daemon = True
 bg_thread.start()
 
-# Scheduled task function
-def scheduled_task():
-    """Run scheduled tasks (crawler and indexing)"""
-    logger.info("Running scheduled tasks")
-    # Run crawler
-    try:
-        start_url = "https://pureportal.coventry.ac.uk/en/organisations/fbl-school-of-economics-finance-and-accounting"
-        crawler = PurePortalCrawler(start_url, data_dir=data_dir)
-        crawler.crawl(max_pages=200)
-        logger.info(f"Scheduled crawler completed. Found {len(crawler.publications)} publications.")
-    except Exception as e:
-        logger.error(f"Error in scheduled crawler: {e}")
-    # Run indexing
-    try:
-        index_builder = InvertedIndex(data_dir=data_dir, index_dir=index_dir)
-        if os.path.exists(f"{index_dir}/index.pkl"):
-            success = index_builder.update_index()
-        else:
-            success = index_builder.build_index()
-        if success:
-            stats = index_builder.get_statistics()
-            logger.info(f"Scheduled indexing completed. Index contains {stats['total_documents']} documents and {stats['total_terms']} terms.")
-        else:
-            logger.error("Error in scheduled indexing")
-    except Exception as e:
-        logger.error(f"Error in scheduled indexing: {e}")
-    # Reinitialize query processor
-    init_query_processor()
-
 @app.route('/')
 def home():
     """Home page route"""
@@ -118,23 +197,106 @@ def search_page():
     """Search page route"""
     return render_template('search.html')
 
+def clean_result(result):
+    """Convert a search result into a JSON-serializable dictionary"""
+    clean = {
+        'doc_id': result.get('doc_id'),
+        'title': result.get('title', result.get('Title', 'No title')),
+        'authors': result.get('authors', result.get('Authors', [])),
+        'author_profile_links': list(result.get('Author Profile Links', result.get('author_profile_links', []))),
+        'year': result.get('year', result.get('Year', '')),
+        'date': result.get('Date', ''),
+        'url': result.get('url', result.get('Publication Link', '')),
+        'abstract': result.get('abstract', result.get('Abstract', 'No abstract available')),
+        'keywords': result.get('keywords', result.get('Keywords', [])),
+        'aliases': result.get('Aliases', []),
+        'score': float(result.get('score', 0))
+    }
+    if 'snippet' in result:
+        # The snippet replaces the abstract, GET /api/publication/<doc_id> has the full text
+        del clean['abstract']
+        clean['snippet'] = result['snippet']
+        clean['title_highlights'] = result.get('title_highlights', [])
+    if len(clean['author_profile_links']) < len(clean['authors']):
+        clean['author_profile_links'].extend(['' for _ in range(
+            len(clean['authors']) - len(clean['author_profile_links'])
+        )])
+    return clean
+
 @app.route('/api/search')
 def search_api():
     """API endpoint for search"""
+    metrics.start_request()
+    start = time.perf_counter()
+    try:
+        return perform_search()
+    finally:
+        trace = metrics.finish_request('search')
+        elapsed = time.perf_counter() - start
+        if slow_queries.is_slow(elapsed):
+            record_slow_query(elapsed, trace)
+
+def record_slow_query(elapsed, trace):
+    """Add the current request to the slow query log"""
+    query = request.args.get('query', '')
+    try:
+        postings_sizes = query_processor.postings_sizes(query) if query and query_processor else {}
+    except Exception as e:
+        logger.error(f"Error measuring postings sizes: {e}")
+        postings_sizes = {}
+    params = {key: value for key, value in request.args.items() if key != 'query'}
+    slow_queries.record(query, elapsed, trace, postings_sizes, params)
+
+def perform_search():
+    """Run a search from the request arguments and build the JSON response"""
     global query_processor
+    start = time.perf_counter()
     
     # Get search parameters
     query = request.args.get('query', '')
     author = request.args.get('author', '')
     year = request.args.get('year', '')
+    mode = request.args.get('mode', 'keyword')
+    sort = request.args.get('sort', 'relevance')
+    # Publications with a department member among their authors, or those of one member
+    members_only = request.args.get('members', '0') != '0'
+    member = request.args.get('member', '')
+    # Add terms that co-occur with the query's terms in the corpus
+    expand = request.args.get('expand', '0') != '0'
     
-    if not query and not author and not year:
+    if not query and not author and not year and not member:
         return jsonify({
             'success': False,
             'message': 'Please provide at least one search parameter',
             'results': []
         })
     
+    # Years are a single year or an inclusive range like 2019..2024, open ends allowed
+    year_range = None
+    if year:
+        try:
+            year_range = parse_year_range(year)
+        except ValueError as e:
+            return jsonify({
+                'success': False,
+                'message': str(e),
+                'results': []
+            })
+    try:
+        recency_weight = max(float(request.args.get('recency', 0) or 0), 0.0)
+    except ValueError:
+        recency_weight = 0.0
+    member_id = None
+    if member:
+        try:
+            member_id = int(member)
+        except ValueError:
+            return jsonify({
+                'success': False,
+                'message': f"Invalid member id: {member!r}",
+                'results': []
+            })
+    
     # If query processor is not initialized, try to initialize it
     if query_processor is None:
         init_successful = init_query_processor()
@@ -149,74 +311,310 @@ def search_api():
     results = []
     
     try:
-        if query:
-            results = query_processor.search(query)
+        if query and mode == 'semantic':
+            results = query_processor.semantic_search(query)
+        elif query and mode == 'hybrid':
+            results = query_processor.hybrid_search(query)
+        elif query:
+            # Year ranges, member filters, date sorting and recency boosts are applied inside the ranker
+            results = query_processor.search(query, year_range=year_range, sort=sort,
+                                             recency_weight=recency_weight,
+                                             members_only=members_only, expand=expand, member_id=member_id)
+        elif member_id is not None:
+            results = query_processor.member_publications(member_id, year_range=year_range)
+            if results is None:
+                return jsonify({
+                    'success': False,
+                    'message': f"No department member with id {member_id}",
+                    'results': []
+                })
         elif author:
-            results = query_processor.search_by_author(author)
+            results = query_processor.search_by_author(author, year_range=year_range, members_only=members_only)
         elif year:
-            results = query_processor.search_by_year(year)
+            results = query_processor.search_by_year(year_range, members_only=members_only)
         
         # Filter results if multiple criteria
-        if author and (query or year):
-            results = [r for r in results if any(author.lower() in a.lower() for a in r.get('authors', r.get('Authors', [])))]
-        
-        if year and (query or author):
-            try:
-                year_int = int(year)
-                # Handle both 'year' and 'Year' fields
-                results = [r for r in results if r.get('year', r.get('Year', None)) == year_int]
-            except ValueError:
-                pass
-        if author and query:
+        if author and (query or member_id is not None):
             results = [r for r in results if any(author.lower() in a.lower()
                                                  for a in r.get('authors', r.get('Authors', [])))]
-        if year and query:
-            try:
-                year_int = int(year)
-                results = [r for r in results if r.get('year', r.get('Year', None)) == year_int]
-            except ValueError:
-                pass
-        if year and author and not query:
-            try:
-                year_int = int(year)
-                results = [r for r in results if r.get('year', r.get('Year', None)) == year_int]
-            except ValueError:
-                pass
+        if year_range and query and mode in ('semantic', 'hybrid'):
+            dates = query_processor.date_index()
+            results = [r for r in results if dates.contains(r['doc_id'], year_range)]
+        if members_only and query and mode in ('semantic', 'hybrid'):
+            members = query_processor.member_index()
+            results = [r for r in results if members.is_member_document(r['doc_id'])]
+        if member_id is not None and query and mode in ('semantic', 'hybrid'):
+            member_docs = query_processor.member_index().doc_ids(member_id)
+            results = [r for r, keep in zip(results, np.isin([r['doc_id'] for r in results], member_docs)) if keep]
+        
+        if request.args.get('snippets', '1') != '0':
+            query_processor.add_snippets(results, query)
         
         # Clean results for JSON serialization
-        clean_results = []
-        for result in results:
-            # Convert non-serializable objects and clean the result
-            clean_result = {
-                'title': result.get('title', result.get('Title', 'No title')),
-                'authors': result.get('authors', result.get('Authors', [])),
-                'author_profile_links': result.get('Author Profile Links', result.get('author_profile_links', [])),
-                'year': result.get('year', result.get('Year', '')),
-                'url': result.get('url', result.get('Publication Link', '')),
-                'abstract': result.get('abstract', result.get('Abstract', 'No abstract available')),
-                'keywords': result.get('keywords', result.get('Keywords', [])),
-                'score': float(result.get('score', 0))
-            }
-            if len(clean_result['author_profile_links']) < len(clean_result['authors']):
-                clean_result['author_profile_links'].extend(['' for _ in range(
-                    len(clean_result['authors']) - len(clean_result['author_profile_links'])
-                )])
-            clean_results.append(clean_result)
+        with metrics.stage('materialize'):
+            clean_results = [clean_result(result) for result in results]
+        
+        # Facet counts over every matched document, not just the returned page
+        facets = {}
+        if request.args.get('facets', '1') != '0':
+            if query:
+                matched = query_processor.matching_doc_ids(query)
+                if year_range:
+                    dates = query_processor.date_index()
+                    matched = matched[dates.in_range(dates.ordinals_of(matched), year_range)]
+                if members_only:
+                    matched = matched[query_processor.member_index().contains(matched)]
+                if member_id is not None:
+                    matched = matched[np.isin(matched, query_processor.member_index().doc_ids(member_id))]
+            else:
+                matched = [r['doc_id'] for r in clean_results if r['doc_id'] is not None]
+            with metrics.stage('facets'):
+                facets = query_processor.facet_counts(matched)
+        
+        params = {key: value for key, value in request.args.items() if key != 'query'}
+        query_id = query_log.log_query(query, params, clean_results, time.perf_counter() - start)
         
+        with metrics.stage('serialize'):
+            return jsonify({
+                'success': True,
+                'message': f"Found {len(clean_results)} results",
+                'results': clean_results,
+                'facets': facets,
+                'query_id': query_id
+            })
+    
+    except Exception as e:
+        logger.error(f"Error during search: {e}")
+        return jsonify({
+            'success': False,
+            'message': f"Error performing search: {str(e)}",
+            'results': []
+        })
+
+@app.route('/api/search/batch', methods=['POST'])
+def batch_search_api():
+    """API endpoint for scoring many queries in one request"""
+    global query_processor
+    
+    payload = request.get_json(silent=True) or {}
+    queries = payload.get('queries', [])
+    if not isinstance(queries, list) or not queries:
+        return jsonify({
+            'success': False,
+            'message': 'Please provide a non-empty list of queries',
+            'results': []
+        })
+    queries = [str(q) for q in queries]
+    
+    try:
+        max_results = int(payload.get('max_results', 10))
+    except (TypeError, ValueError):
+        max_results = 10
+    
+    if query_processor is None:
+        init_successful = init_query_processor()
+        if not init_successful:
+            return jsonify({
+                'success': False,
+                'message': 'Search engine not initialized. Please run crawler and indexing first.',
+                'results': []
+            })
+    
+    # Stream one JSON object per line if requested, so clients can consume results as they come
+    stream = payload.get('stream') or 'application/x-ndjson' in request.headers.get('Accept', '')
+    if stream:
+        def generate():
+            for position, results in query_processor.iter_search_many(queries, max_results=max_results):
+                yield json.dumps({
+                    'query': queries[position],
+                    'results': [clean_result(r) for r in results]
+                }) + '\n'
+        return Response(stream_with_context(generate()), mimetype='application/x-ndjson')
+    
+    try:
+        all_results = query_processor.search_many(queries, max_results=max_results)
         return jsonify({
             'success': True,
-            'message': f"Found {len(clean_results)} results",
-            'results': clean_results
+            'message': f"Searched {len(queries)} queries",
+            'results': [
+                {'query': query, 'results': [clean_result(r) for r in results]}
+                for query, results in zip(queries, all_results)
+            ]
+        })
+    except Exception as e:
+        logger.error(f"Error during batch search: {e}")
+        return jsonify({
+            'success': False,
+            'message': f"Error performing batch search: {str(e)}",
+            'results': []
         })
+
+# Columns of CSV exports, list fields are joined with "; "
+EXPORT_FIELDS = ('doc_id', 'score', 'title', 'authors', 'author_profile_links', 'year', 'date', 'url',
+                 'abstract', 'keywords', 'aliases')
+
+# Results per write to the response stream
+EXPORT_BATCH = 200
+
+def csv_row(result):
+    """Flatten a clean result for CSV, aliases become their publication links"""
+    row = dict(result)
+    row['aliases'] = [alias.get('Publication Link', '') for alias in row.get('aliases', [])]
+    return {key: '; '.join(map(str, value)) if isinstance(value, list) else value for key, value in row.items()}
+
+@app.route('/api/export')
+def export_api():
+    """API endpoint streaming every publication matching a search as NDJSON or CSV"""
+    global query_processor
     
+    export_format = request.args.get('format', 'ndjson')
+    if export_format not in ('ndjson', 'csv'):
+        return jsonify({
+            'success': False,
+            'message': f"Unknown export format: {export_format!r}, use ndjson or csv"
+        }), 400
+    query = request.args.get('query', '')
+    author = request.args.get('author', '').lower()
+    sort = request.args.get('sort', 'relevance')
+    members_only = request.args.get('members', '0') != '0'
+    expand = request.args.get('expand', '0') != '0'
+    try:
+        year_range = parse_year_range(request.args['year']) if request.args.get('year') else None
+        member_id = int(request.args['member']) if request.args.get('member') else None
+        recency_weight = max(float(request.args.get('recency', 0) or 0), 0.0)
+    except ValueError as e:
+        return jsonify({
+            'success': False,
+            'message': str(e)
+        }), 400
+    
+    if query_processor is None:
+        init_successful = init_query_processor()
+        if not init_successful:
+            return jsonify({
+                'success': False,
+                'message': 'Search engine not initialized. Please run crawler and indexing first.'
+            })
+    # A reload swaps the global, the export keeps reading the processor it started with
+    processor = query_processor
+    
+    def rows():
+        for result in processor.iter_export(query, year_range=year_range, sort=sort, recency_weight=recency_weight,
+                                            members_only=members_only, member_id=member_id, expand=expand):
+            if author and not any(author in a.lower() for a in result.get('authors', result.get('Authors', []))):
+                continue
+            yield clean_result(result)
+    
+    def generate_ndjson():
+        batch = []
+        for row in rows():
+            batch.append(json.dumps(row, ensure_ascii=False))
+            if len(batch) == EXPORT_BATCH:
+                yield '\n'.join(batch) + '\n'
+                batch = []
+        if batch:
+            yield '\n'.join(batch) + '\n'
+    
+    def generate_csv():
+        # One small buffer is reused for every batch of rows
+        buffer = io.StringIO()
+        writer = csv.DictWriter(buffer, fieldnames=EXPORT_FIELDS, extrasaction='ignore')
+        writer.writeheader()
+        for count, row in enumerate(rows(), 1):
+            writer.writerow(csv_row(row))
+            if count % EXPORT_BATCH == 0:
+                yield buffer.getvalue()
+                buffer.seek(0)
+                buffer.truncate()
+        yield buffer.getvalue()
+    
+    # No Content-Length, so the response goes out with chunked transfer encoding
+    if export_format == 'csv':
+        response = Response(stream_with_context(generate_csv()), mimetype='text/csv')
+    else:
+        response = Response(stream_with_context(generate_ndjson()), mimetype='application/x-ndjson')
+    response.headers['Content-Disposition'] = f'attachment; filename=publications.{export_format}'
+    return response
+
+@app.route('/api/similar/<int:doc_id>')
+def similar_api(doc_id):
+    """API endpoint for publications similar to a given document"""
+    global query_processor
+    
+    try:
+        max_results = int(request.args.get('max_results', 5))
+    except ValueError:
+        max_results = 5
+    
+    if query_processor is None:
+        init_successful = init_query_processor()
+        if not init_successful:
+            return jsonify({
+                'success': False,
+                'message': 'Search engine not initialized. Please run crawler and indexing first.',
+                'results': []
+            })
+    
+    try:
+        results = query_processor.find_similar(doc_id, max_results=max_results)
+        return jsonify({
+            'success': True,
+            'message': f"Found {len(results)} similar publications",
+            'results': [clean_result(r) for r in results]
+        })
     except Exception as e:
-        logger.error(f"Error during search: {e}")
+        logger.error(f"Error finding similar publications: {e}")
         return jsonify({
             'success': False,
-            'message': f"Error performing search: {str(e)}",
+            'message': f"Error finding similar publications: {str(e)}",
             'results': []
         })
 
+@app.route('/api/publication/<int:doc_id>')
+def publication_api(doc_id):
+    """API endpoint for one publication with its full abstract"""
+    global query_processor
+    
+    if query_processor is None:
+        init_successful = init_query_processor()
+        if not init_successful:
+            return jsonify({
+                'success': False,
+                'message': 'Search engine not initialized. Please run crawler and indexing first.'
+            })
+    
+    publication = query_processor.get_publication(doc_id)
+    if publication is None:
+        return jsonify({
+            'success': False,
+            'message': f'No publication with id {doc_id}'
+        }), 404
+    return jsonify({
+        'success': True,
+        'publication': clean_result(publication)
+    })
+
+@app.route('/api/members')
+def members_api():
+    """API endpoint for the department members with their ids and publication counts"""
+    global query_processor
+    
+    if query_processor is None:
+        init_successful = init_query_processor()
+        if not init_successful:
+            return jsonify({
+                'success': False,
+                'message': 'Search engine not initialized. Please run crawler and indexing first.',
+                'members': []
+            })
+    
+    members = query_processor.department_members()
+    return jsonify({
+        'success': True,
+        'message': f"Found {len(members)} department members",
+        'members': members
+    })
+
 @app.route('/admin')
 def admin_page():
     """Admin page route"""
@@ -225,8 +623,6 @@ def admin_page():
 @app.route('/api/status')
 def get_status():
     """API endpoint for getting system status"""
-    global crawler_running, indexing_running
-    
     stats = {}
     
     # Get publication stats
@@ -237,12 +633,12 @@ def get_status():
                 publications = pickle.load(f)
             stats['total_publications'] = len(publications)
             
-            # Count by year
+            # Count by year, older crawls store the date text rather than a year
             years = {}
             for pub in publications:
-                year = pub.get('year', pub.get('Year', None))
-                if year:
-                    years[year] = years.get(year, 0) + 1
+                parsed = parse_publication_date(pub.get('Year', pub.get('year')))
+                if parsed:
+                    years[parsed[0]] = years.get(parsed[0], 0) + 1
             
             if years:
                 stats['years_range'] = f"{min(years.keys())} - {max(years.keys())}"
@@ -259,19 +655,22 @@ def get_status():
         except Exception as e:
             logger.error(f"Error loading publications for statistics: {e}")
     
-    # Get index stats
-    if os.path.exists(f"{index_dir}/metadata.pkl"):
+    # Get index stats, from the committed generation the query processor reads
+    index_store = IndexStore(index_dir)
+    index_path = index_store.open() or index_dir
+    stats['index_generation'] = index_store.current_generation()
+    if os.path.exists(f"{index_path}/metadata.pkl"):
         try:
-            with open(f"{index_dir}/metadata.pkl", 'rb') as f:
+            with open(f"{index_path}/metadata.pkl", 'rb') as f:
                 metadata = pickle.load(f)
                 stats['avg_document_length'] = round(metadata.get('avg_document_length', 0), 2)
                 stats['indexed_documents'] = metadata.get('total_documents', 0)
         except Exception as e:
             logger.error(f"Error loading index metadata for statistics: {e}")
     
-    if os.path.exists(f"{index_dir}/index.pkl"):
+    if os.path.exists(f"{index_path}/index.pkl"):
         try:
-            with open(f"{index_dir}/index.pkl", 'rb') as f:
+            with open(f"{index_path}/index.pkl", 'rb') as f:
                 index = pickle.load(f)
                 stats['vocabulary_size'] = len(index)
         except Exception as e:
@@ -285,16 +684,18 @@ def get_status():
         except:
             stats['data_size'] = "N/A"
     
-    if os.path.exists(index_dir):
+    if os.path.exists(index_path):
         try:
-            index_size = sum(os.path.getsize(os.path.join(index_dir, f)) for f in os.listdir(index_dir) if os.path.isfile(os.path.join(index_dir, f)))
+            index_size = sum(os.path.getsize(os.path.join(index_path, f)) for f in os.listdir(index_path) if os.path.isfile(os.path.join(index_path, f)))
             stats['index_size'] = f"{index_size / (1024*1024):.2f} MB"
         except:
             stats['index_size'] = "N/A"
     
     # Add system status
-    stats['crawler_running'] = crawler_running
-    stats['indexing_running'] = indexing_running
+    running = jobs.running()
+    stats['crawler_running'] = running is not None and running.kind in ('crawl', 'refresh')
+    stats['indexing_running'] = running is not None and running.kind in ('index', 'refresh')
+    stats['jobs_queued'] = len(jobs.active()) - (running is not None)
     stats['last_updated'] = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
     
     return jsonify({
@@ -302,108 +703,189 @@ def get_status():
         'stats': stats
     })
 
-@app.route('/api/start_crawler', methods=['POST'])
-def start_crawler():
-    """API endpoint for starting the crawler"""
-    global crawler_running
-    
-    if crawler_running:
+def submit_job(kind, started_message, **params):
+    """Queue a job and answer with it, or with the job of that kind already queued or running"""
+    job, created = jobs.submit(kind, **params)
+    if not created:
         return jsonify({
             'success': False,
-            'message': 'Crawler is already running'
+            'message': f'The {kind} job is already {job.status}',
+            'job': job.to_dict()
         })
-    
-    # Run crawler in a separate thread
-    def run_crawler():
-        global crawler_running
-        crawler_running = True
-        
-        try:
-            start_url = "https://pureportal.coventry.ac.uk/en/organisations/fbl-school-of-economics-finance-and-accounting"
-            crawler = PurePortalCrawler(start_url, data_dir=data_dir)
-            crawler.crawl(max_pages=100)  # Limit for testing
-            logger.info(f"Crawler completed. Found {len(crawler.publications)} publications.")
-        except Exception as e:
-            logger.error(f"Error running crawler: {e}")
-        
-        crawler_running = False
-    
-    thread = threading.Thread(target=run_crawler)
-    thread.daemon = True
-    thread.start()
-    
     return jsonify({
         'success': True,
-        'message': 'Crawler started'
+        'message': started_message,
+        'job': job.to_dict()
     })
 
+@app.route('/api/start_crawler', methods=['POST'])
+def start_crawler():
+    """API endpoint for starting the crawler"""
+    return submit_job('crawl', 'Crawler started', max_pages=100)
+
 @app.route('/api/build_index', methods=['POST'])
 def build_index():
     """API endpoint for building/updating the index"""
-    global indexing_running
-    
-    if indexing_running:
+    return submit_job('index', 'Indexing started')
+
+@app.route('/api/force_update', methods=['POST'])
+def force_update():
+    """API endpoint for forcing a scheduled update"""
+    return submit_job('refresh', 'Forced update started', max_pages=200)
+
+@app.route('/api/jobs')
+def jobs_api():
+    """API endpoint for recent crawl and index jobs with their stage progress"""
+    limit = request.args.get('limit', 20, type=int)
+    return jsonify({
+        'success': True,
+        'jobs': jobs.list(limit)
+    })
+
+@app.route('/api/jobs/<job_id>')
+def job_api(job_id):
+    """API endpoint for one job"""
+    job = jobs.get(job_id)
+    if job is None:
+        return jsonify({
+            'success': False,
+            'message': f'No job {job_id}'
+        }), 404
+    return jsonify({
+        'success': True,
+        'job': job.to_dict()
+    })
+
+@app.route('/api/jobs/<job_id>/cancel', methods=['POST'])
+def cancel_job(job_id):
+    """API endpoint for cancelling a queued or running job"""
+    if not jobs.cancel(job_id):
+        return jsonify({
+            'success': False,
+            'message': f'No queued or running job {job_id}'
+        }), 404
+    return jsonify({
+        'success': True,
+        'message': 'Job cancelled',
+        'job': jobs.get(job_id).to_dict()
+    })
+
+@app.route('/metrics')
+def prometheus_metrics():
+    """Search metrics in the Prometheus text exposition format"""
+    return Response(metrics.render_prometheus(), mimetype='text/plain; version=0.0.4')
+
+@app.route('/api/metrics')
+def metrics_summary():
+    """API endpoint for per-stage search timings shown on the admin page"""
+    return jsonify({
+        'success': True,
+        'metrics': metrics.summary()
+    })
+
+@app.route('/api/profiler/start', methods=['POST'])
+def start_profiler():
+    """API endpoint for sampling worker thread stacks for a time window"""
+    data = request.get_json(silent=True) or {}
+    try:
+        duration = min(max(float(data.get('duration', 30)), 1.0), 600.0)
+        interval = min(max(float(data.get('interval_ms', 5)), 1.0), 1000.0) / 1000
+    except (TypeError, ValueError):
+        return jsonify({
+            'success': False,
+            'message': 'duration and interval_ms must be numbers'
+        }), 400
+
+    if not profiler.start(duration=duration, interval=interval):
         return jsonify({
             'success': False,
-            'message': 'Indexing is already running'
+            'message': 'Profiler is already running'
         })
-    
-    # Run indexing in a separate thread
-    def run_indexing():
-        global indexing_running, query_processor
-        indexing_running = True
-        
-        try:
-            index_builder = InvertedIndex(data_dir=data_dir, index_dir=index_dir)
-            
-            # Check if index exists and update or build from scratch
-            if os.path.exists(f"{index_dir}/index.pkl"):
-                success = index_builder.update_index()
-            else:
-                success = index_builder.build_index()
-            
-            if success:
-                stats = index_builder.get_statistics()
-                logger.info(f"Indexing completed. Contains {stats['total_documents']} documents and {stats['total_terms']} terms.")
-                
-                # Reinitialize query processor
-                init_query_processor()
-            else:
-                logger.error("Error building/updating index")
-        except Exception as e:
-            logger.error(f"Error building index: {e}")
-        
-        indexing_running = False
-    
-    thread = threading.Thread(target=run_indexing)
-    thread.daemon = True
-    thread.start()
-    
+
     return jsonify({
         'success': True,
-        'message': 'Indexing started'
+        'message': f'Profiling for {duration:g} seconds'
     })
 
-@app.route('/api/force_update', methods=['POST'])
-def force_update():
-    """API endpoint for forcing a scheduled update"""
-    thread = threading.Thread(target=scheduled_task)
-    thread.daemon = True
-    thread.start()
-    
+@app.route('/api/profiler/stop', methods=['POST'])
+def stop_profiler():
+    """API endpoint for ending a profiling window early"""
+    profiler.stop()
+    return jsonify({
+        'success': True,
+        'message': 'Profiler stopped',
+        'profiler': profiler.status()
+    })
+
+@app.route('/api/profiler/status')
+def profiler_status():
+    """API endpoint for the profiler state"""
+    return jsonify({
+        'success': True,
+        'profiler': profiler.status()
+    })
+
+@app.route('/api/profiler/profile')
+def profiler_profile():
+    """Download the last profile as collapsed stacks for flamegraph.pl or speedscope"""
+    if not profiler.last_output or not os.path.exists(profiler.last_output):
+        return jsonify({
+            'success': False,
+            'message': 'No profile has been recorded yet'
+        }), 404
+    with open(profiler.last_output, 'r', encoding='utf-8') as f:
+        content = f.read()
+    filename = os.path.basename(profiler.last_output)
+    return Response(content, mimetype='text/plain',
+                    headers={'Content-Disposition': f'attachment; filename={filename}'})
+
+@app.route('/api/slow_queries', methods=['GET', 'POST'])
+def slow_queries_api():
+    """API endpoint for the slow query log, POST sets the threshold"""
+    if request.method == 'POST':
+        data = request.get_json(silent=True) or {}
+        try:
+            slow_queries.threshold_ms = max(float(data.get('threshold_ms')), 0.0)
+        except (TypeError, ValueError):
+            return jsonify({
+                'success': False,
+                'message': 'threshold_ms must be a number'
+            }), 400
+
+    limit = request.args.get('limit', 50, type=int)
     return jsonify({
         'success': True,
-        'message': 'Forced update started'
+        'threshold_ms': slow_queries.threshold_ms,
+        'queries': slow_queries.recent(limit)
     })
 
+@app.route('/api/click', methods=['POST'])
+def click_api():
+    """API endpoint recording a click on a search result"""
+    data = request.get_json(silent=True) or {}
+    if not data.get('query_id'):
+        return jsonify({
+            'success': False,
+            'message': 'query_id is required'
+        }), 400
+    try:
+        rank = int(data.get('rank', -1))
+    except (TypeError, ValueError):
+        rank = -1
+    query_log.log_click(str(data['query_id']), data.get('doc_id'), str(data.get('url') or ''), rank)
+    return jsonify({'success': True})
+
+# Log files the admin log viewer may read
+VIEWABLE_LOGS = ('crawler.log', 'index.log', 'web_app.log', 'search.log', 'slow_queries.log')
+
 @app.route('/api/logs')
 def get_logs():
-    """API endpoint for getting system logs"""
+    """API endpoint for the last lines of a system log and the offset to follow it from"""
     log_file = request.args.get('file', 'web_app.log')
+    lines = min(max(request.args.get('lines', 500, type=int), 1), 5000)
     
     # Validate log_file to prevent path traversal
-    valid_logs = ['crawler.log', 'index.log', 'web_app.log', 'search.log']
-    if log_file not in valid_logs:
+    if log_file not in VIEWABLE_LOGS:
         return jsonify({
             'success': False,
             'message': 'Invalid log file',
@@ -412,15 +894,14 @@ def get_logs():
     
     try:
         if os.path.exists(log_file):
-            # Get the last 500 lines for performance
-            with open(log_file, 'r', encoding='utf-8') as f:
-                lines = f.readlines()
-                content = ''.join(lines[-500:])
+            # Only the blocks holding the last lines are read, however large the log is
+            content, offset = tail_lines(log_file, lines)
             
             return jsonify({
                 'success': True,
                 'message': 'Log content loaded',
-                'content': content
+                'content': content,
+                'offset': offset
             })
         else:
             return jsonify({
@@ -435,12 +916,47 @@ def get_logs():
             'content': ''
         })
 
+@app.route('/api/logs/stream')
+def stream_logs():
+    """Server-sent events with the lines appended to a system log after an offset"""
+    log_file = request.args.get('file', 'web_app.log')
+    if log_file not in VIEWABLE_LOGS:
+        return jsonify({
+            'success': False,
+            'message': 'Invalid log file'
+        }), 400
+    if not os.path.exists(log_file):
+        return jsonify({
+            'success': False,
+            'message': f'Log file {log_file} not found'
+        }), 404
+
+    # A reconnecting EventSource resumes from the id of the last event it got
+    offset = request.headers.get('Last-Event-ID', request.args.get('offset'))
+    try:
+        offset = max(int(offset), 0)
+    except (TypeError, ValueError):
+        offset = os.path.getsize(log_file)
+
+    def generate():
+        for position, text in follow(log_file, offset):
+            if text:
+                data = ''.join(f"data: {line}\n" for line in text.splitlines())
+                yield f"id: {position}\n{data}\n"
+            else:
+                yield ": keep-alive\n\n"
+
+    return Response(stream_with_context(generate()), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
 # Cleanup function to stop background thread when the app exits
 def cleanup():
     global stop_bg_thread
     stop_bg_thread = True
     if bg_thread and bg_thread.is_alive():
         bg_thread.join(timeout=1.0)
+    jobs.shutdown()
+    query_log.close()
     logger.info("Application shutting down")
 
 # Register cleanup function to be called on exit
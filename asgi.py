@@ -0,0 +1,168 @@
+"""Production entry point: uvicorn asgi:app --host 0.0.0.0 --port 5000
+
+Keyword, semantic and hybrid queries on /api/search are scored in the
+search process pool; every other route is served by the Flask app.
+Run a single uvicorn worker, the pool provides the parallelism.
+"""
+import os
+import sys
+import json
+import time
+import asyncio
+import logging
+from urllib.parse import parse_qs
+
+from asgiref.wsgi import WsgiToAsgi
+
+current_dir = os.path.dirname(os.path.abspath(__file__))
+sys.path.append(current_dir)
+
+import app as web_app
+from metrics import metrics
+from search_pool import SearchPool, Overloaded, DeadlineExceeded
+
+logger = logging.getLogger("ASGI")
+
+pool = SearchPool(
+    data_dir=web_app.data_dir,
+    index_dir=web_app.index_dir,
+    workers=int(os.environ.get('SEARCH_WORKERS', 0)) or None,
+    max_pending=int(os.environ.get('SEARCH_MAX_PENDING', 0)) or None,
+    timeout=float(os.environ.get('SEARCH_DEADLINE_MS', 2000)) / 1000
+)
+flask_app = WsgiToAsgi(web_app.app)
+_start_lock = asyncio.Lock()
+_background_tasks = set()
+
+
+async def send_json(send, status, payload, headers=()):
+    body = json.dumps(payload, default=str).encode('utf-8')
+    await send({
+        'type': 'http.response.start',
+        'status': status,
+        'headers': [(b'content-type', b'application/json'),
+                    (b'content-length', str(len(body)).encode())] + list(headers)
+    })
+    await send({'type': 'http.response.body', 'body': body})
+
+
+def pooled_search_args(scope):
+    """Query arguments of a search the pool can answer, None for everything else"""
+    if scope['method'] != 'GET' or scope['path'] != '/api/search':
+        return None
+    args = {key: values[0] for key, values in
+            parse_qs(scope['query_string'].decode('latin-1'), keep_blank_values=True).items()}
+    # Author, year and member filters, query expansion and date ranking are applied by the Flask handler
+    if (not args.get('query') or args.get('author') or args.get('year') or args.get('member')
+            or args.get('members', '0') != '0' or args.get('expand', '0') != '0'
+            or args.get('sort', 'relevance') != 'relevance' or args.get('recency', '0') not in ('', '0')):
+        return None
+    return args
+
+
+async def ensure_pool():
+    """Start the pool on first use and restart it in the background after a rebuild"""
+    if pool.executor is None:
+        async with _start_lock:
+            if pool.executor is None:
+                await asyncio.get_running_loop().run_in_executor(None, pool.start)
+        return
+    task = asyncio.create_task(pool.refresh())
+    _background_tasks.add(task)
+    task.add_done_callback(_background_tasks.discard)
+
+
+async def pooled_search(args, send):
+    query = args['query']
+    mode = args.get('mode', 'keyword')
+    timeout = None
+    if 'timeout_ms' in args:
+        try:
+            # Clients may ask for a tighter deadline, never a looser one
+            timeout = min(float(args['timeout_ms']) / 1000, pool.timeout)
+        except ValueError:
+            pass
+
+    start = time.perf_counter()
+    try:
+        output = await pool.search(query, mode=mode, max_results=10,
+                                   with_facets=args.get('facets', '1') != '0',
+                                   with_snippets=args.get('snippets', '1') != '0', timeout=timeout)
+    except Overloaded as e:
+        metrics.increment('search_pool_rejected')
+        await send_json(send, 503, {
+            'success': False,
+            'message': f'Search is overloaded, please retry shortly ({e})',
+            'results': []
+        }, [(b'retry-after', b'1')])
+        return
+    except DeadlineExceeded as e:
+        metrics.increment('search_pool_timeouts')
+        await send_json(send, 504, {
+            'success': False,
+            'message': str(e),
+            'results': []
+        })
+        return
+    except Exception as e:
+        logger.error(f"Error during pooled search: {e}")
+        await send_json(send, 200, {
+            'success': False,
+            'message': f"Error performing search: {str(e)}",
+            'results': []
+        })
+        return
+    pool_seconds = time.perf_counter() - start
+
+    clean_results = [web_app.clean_result(result) for result in output['results']]
+    params = {key: value for key, value in args.items() if key != 'query'}
+    query_id = web_app.query_log.log_query(query, params, clean_results, pool_seconds)
+    await send_json(send, 200, {
+        'success': True,
+        'message': f"Found {len(clean_results)} results",
+        'results': clean_results,
+        'facets': output['facets'],
+        'query_id': query_id
+    })
+
+    elapsed = time.perf_counter() - start
+    metrics.observe('search_request_seconds', elapsed, endpoint='search_pool')
+    if web_app.slow_queries.is_slow(elapsed):
+        processor = web_app.query_processor
+        postings_sizes = processor.postings_sizes(query) if processor else {}
+        trace = {'stages': {'pool': pool_seconds, 'serialize': elapsed - pool_seconds}}
+        web_app.slow_queries.record(query, elapsed, trace, postings_sizes, params)
+
+
+async def lifespan(receive, send):
+    while True:
+        message = await receive()
+        if message['type'] == 'lifespan.startup':
+            try:
+                await ensure_pool()
+            except Exception as e:
+                logger.error(f"Error starting search pool: {e}")
+            await send({'type': 'lifespan.startup.complete'})
+        elif message['type'] == 'lifespan.shutdown':
+            await asyncio.get_running_loop().run_in_executor(None, pool.shutdown)
+            web_app.cleanup()
+            await send({'type': 'lifespan.shutdown.complete'})
+            return
+
+
+async def app(scope, receive, send):
+    if scope['type'] == 'lifespan':
+        await lifespan(receive, send)
+        return
+
+    if scope['type'] == 'http':
+        if scope['path'] == '/api/pool':
+            await send_json(send, 200, {'success': True, 'pool': pool.status()})
+            return
+        args = pooled_search_args(scope)
+        if args is not None:
+            await ensure_pool()
+            await pooled_search(args, send)
+            return
+
+    await flask_app(scope, receive, send)
@@ -0,0 +1,328 @@
+import os
+import re
+import sys
+import json
+import time
+import pickle
+import random
+import shutil
+import argparse
+import resource
+import platform
+import tempfile
+import subprocess
+import multiprocessing
+from datetime import datetime
+
+import numpy as np
+
+current_dir = os.path.dirname(os.path.abspath(__file__))
+sys.path.append(current_dir)
+
+# Sizes a default run finishes in minutes, larger ones are opt-in through --sizes
+DEFAULT_SIZES = [1000, 10000, 50000]
+
+
+def load_template(path):
+    """Load the crawled publications used as the schema and vocabulary source"""
+    with open(path, 'rb') as f:
+        return pickle.load(f)
+
+
+def generate_corpus(template, size, seed=0, abstract_words=0):
+    """Generate a synthetic PurePortal-shaped corpus of the requested size.
+
+    Title words, authors, journals and dates are sampled from the template
+    publications, so term frequencies stay close to the real crawl.
+    """
+    rng = random.Random(seed)
+    words = [w for pub in template for w in re.findall(r"[A-Za-z][A-Za-z'-]+", pub.get('Title', ''))]
+    authors = sorted({(name, link) for pub in template
+                      for name, link in zip(pub.get('Authors', []), pub.get('Author Profile Links', []))})
+    journals = [pub.get('Journal', '') for pub in template]
+    dates = [pub.get('Year', '') for pub in template]
+    if not words:
+        raise ValueError("Template publications have no title words to sample from")
+
+    corpus = []
+    for doc_id in range(size):
+        title = ' '.join(rng.choice(words) for _ in range(rng.randint(6, 14)))
+        pub_authors = rng.sample(authors, k=min(len(authors), rng.randint(0, 4))) if authors else []
+        abstract = ' '.join(rng.choice(words) for _ in range(abstract_words)) if abstract_words else ''
+        slug = re.sub(r'[^a-z0-9]+', '-', title.lower()).strip('-')[:60]
+        corpus.append({
+            'Title': title,
+            'Authors': [name for name, _ in pub_authors],
+            'Year': rng.choice(dates),
+            'Publication Link': f"https://pureportal.coventry.ac.uk/en/publications/{slug}-{doc_id}",
+            'Author Profile Links': [link for _, link in pub_authors],
+            'Journal': rng.choice(journals),
+            'Abstract': abstract,
+            'Keywords': []
+        })
+    return corpus
+
+
+def generate_queries(corpus, count, seed=0):
+    """Build a query log of 1-3 word queries drawn from corpus titles"""
+    rng = random.Random(seed)
+    queries = []
+    for _ in range(count):
+        words = rng.choice(corpus)['Title'].split()
+        start = rng.randrange(len(words))
+        queries.append(' '.join(words[start:start + rng.randint(1, 3)]))
+    return queries
+
+
+def load_query_log(path):
+    """Read a query log with one query per line"""
+    with open(path, 'r', encoding='utf-8') as f:
+        return [line.strip() for line in f if line.strip()]
+
+
+def current_rss_mb():
+    """Resident set size of this process in MB"""
+    try:
+        with open('/proc/self/statm') as f:
+            pages = int(f.read().split()[1])
+        return pages * os.sysconf('SC_PAGE_SIZE') / (1024 * 1024)
+    except (OSError, ValueError):
+        return None
+
+
+def peak_rss_mb():
+    """Peak resident set size of this process in MB"""
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports kilobytes, macOS reports bytes
+    return peak / (1024 * 1024) if sys.platform == 'darwin' else peak / 1024
+
+
+def directory_size_mb(path):
+    total = 0
+    for root, _, files in os.walk(path):
+        total += sum(os.path.getsize(os.path.join(root, name)) for name in files)
+    return total / (1024 * 1024)
+
+
+def latency_summary(latencies):
+    """Percentiles in milliseconds and throughput for a list of latencies in seconds"""
+    if not latencies:
+        return {}
+    millis = np.asarray(latencies) * 1000
+    total = float(np.sum(latencies))
+    return {
+        'queries': len(latencies),
+        'mean_ms': round(float(np.mean(millis)), 4),
+        'p50_ms': round(float(np.percentile(millis, 50)), 4),
+        'p95_ms': round(float(np.percentile(millis, 95)), 4),
+        'p99_ms': round(float(np.percentile(millis, 99)), 4),
+        'max_ms': round(float(np.max(millis)), 4),
+        'qps': round(len(latencies) / total, 2) if total else None
+    }
+
+
+def replay(func, queries, warmup=10):
+    """Run func on every query, returning a latency summary that also counts failed calls"""
+    for query in queries[:warmup]:
+        try:
+            func(query)
+        except Exception:
+            pass
+    latencies = []
+    errors = 0
+    for query in queries:
+        start = time.perf_counter()
+        try:
+            func(query)
+        except Exception:
+            errors += 1
+            continue
+        latencies.append(time.perf_counter() - start)
+    summary = latency_summary(latencies)
+    summary['errors'] = errors
+    return summary
+
+
+# Run in a fresh interpreter, so nothing is imported or cached beforehand
+COLD_START_SCRIPT = """
+import sys, json, time
+start = time.perf_counter()
+from query_processor import QueryProcessor
+imported = time.perf_counter()
+processor = QueryProcessor(data_dir=sys.argv[1], index_dir=sys.argv[2])
+loaded = time.perf_counter()
+processor.search(sys.argv[3])
+searched = time.perf_counter()
+print(json.dumps({
+    'import_seconds': round(imported - start, 3),
+    'load_seconds': round(loaded - imported, 3),
+    'first_query_seconds': round(searched - loaded, 3),
+    'total_seconds': round(searched - start, 3),
+    'heavy_modules': sorted(name for name in ('nltk', 'sklearn', 'tkinter') if name in sys.modules)
+}))
+"""
+
+
+def cold_start(data_dir, index_dir, query):
+    """Time importing the query engine, opening an index and answering the first query"""
+    output = subprocess.check_output([sys.executable, '-c', COLD_START_SCRIPT, data_dir, index_dir, query],
+                                     cwd=current_dir, stderr=subprocess.DEVNULL)
+    return json.loads(output.decode().strip().splitlines()[-1])
+
+
+def run_size(size, template_path, queries, work_dir, seed, abstract_words, api):
+    """Benchmark one corpus size, meant to run in its own process so RSS is isolated"""
+    from inverted_index import InvertedIndex
+    from query_processor import QueryProcessor
+
+    data_dir = os.path.join(work_dir, f"corpus_{size}")
+    index_dir = os.path.join(data_dir, "index_data")
+    os.makedirs(data_dir, exist_ok=True)
+    result = {'documents': size}
+
+    start = time.perf_counter()
+    corpus = generate_corpus(load_template(template_path), size, seed=seed, abstract_words=abstract_words)
+    with open(os.path.join(data_dir, "publications.pkl"), 'wb') as f:
+        pickle.dump(corpus, f)
+    result['generate_seconds'] = round(time.perf_counter() - start, 3)
+    if not queries:
+        queries = generate_queries(corpus, 1000, seed=seed)
+
+    # Near-duplicate detection on its own, it runs inside every build
+    from dedup import PublicationDeduplicator
+    start = time.perf_counter()
+    PublicationDeduplicator().find_clusters(corpus)
+    result['dedup_seconds'] = round(time.perf_counter() - start, 3)
+    del corpus
+
+    start = time.perf_counter()
+    builder = InvertedIndex(data_dir=data_dir, index_dir=index_dir)
+    if not builder.build_index():
+        raise RuntimeError(f"Index build failed for {size} documents")
+    result['build_seconds'] = round(time.perf_counter() - start, 3)
+    result['vocabulary_size'] = len(builder.index)
+    result['index_size_mb'] = round(directory_size_mb(index_dir), 3)
+    result['build_peak_rss_mb'] = round(peak_rss_mb(), 1)
+    del builder
+
+    result['cold_start'] = cold_start(data_dir, index_dir, queries[0])
+
+    start = time.perf_counter()
+    processor = QueryProcessor(data_dir=data_dir, index_dir=index_dir)
+    result['load_seconds'] = round(time.perf_counter() - start, 3)
+    result['loaded_rss_mb'] = current_rss_mb()
+
+    authors = [pub['Authors'][0] for pub in processor.publications[:1000] if pub.get('Authors')]
+    author_queries = [authors[i % len(authors)] for i in range(min(len(queries), 200))] if authors else []
+
+    result['search'] = replay(processor.search, queries)
+    result['search_by_author'] = replay(processor.search_by_author, author_queries)
+
+    start = time.perf_counter()
+    processor.search_many(queries)
+    elapsed = time.perf_counter() - start
+    result['search_many'] = {'queries': len(queries), 'seconds': round(elapsed, 4),
+                             'qps': round(len(queries) / elapsed, 2) if elapsed else None}
+
+    if api:
+        # The web app initializes from the working directory, so point it at this corpus
+        os.chdir(data_dir)
+        import app as web_app
+        web_app.query_processor = processor
+        client = web_app.app.test_client()
+        result['api_search'] = replay(lambda q: client.get('/api/search', query_string={'query': q}), queries)
+
+    result['peak_rss_mb'] = round(peak_rss_mb(), 1)
+    return result
+
+
+def git_commit():
+    try:
+        return subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD'], cwd=current_dir,
+                                       stderr=subprocess.DEVNULL).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(baseline_path, results):
+    """Print the relative change of the headline numbers against an earlier run"""
+    with open(baseline_path, 'r', encoding='utf-8') as f:
+        baseline = {run['documents']: run for run in json.load(f)['runs']}
+
+    metrics = [('build_seconds',), ('dedup_seconds',), ('index_size_mb',), ('load_seconds',), ('cold_start', 'total_seconds'),
+               ('peak_rss_mb',),
+               ('search', 'p50_ms'), ('search', 'p95_ms'), ('search', 'p99_ms'), ('search', 'qps')]
+    for run in results['runs']:
+        old = baseline.get(run['documents'])
+        if not old:
+            continue
+        print(f"\n{run['documents']} documents vs {baseline_path}")
+        for path in metrics:
+            new_value, old_value = run, old
+            for key in path:
+                new_value = (new_value or {}).get(key)
+                old_value = (old_value or {}).get(key)
+            if new_value is None or not old_value:
+                continue
+            change = (new_value - old_value) / old_value * 100
+            print(f"  {'.'.join(path):<16} {old_value:>12} -> {new_value:<12} ({change:+.1f}%)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark index build and query latency on synthetic corpora")
+    parser.add_argument('--sizes', default=','.join(str(s) for s in DEFAULT_SIZES),
+                        help="Comma-separated corpus sizes (default: %(default)s), e.g. 100000,1000000 "
+                             "for the large corpora")
+    parser.add_argument('--template', default=os.path.join(current_dir, 'publications.pkl'),
+                        help="Crawled publications used as the schema and vocabulary source")
+    parser.add_argument('--query-log', help="File with one query per line to replay (default: sampled from titles)")
+    parser.add_argument('--abstract-words', type=int, default=0, help="Words per synthetic abstract")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--no-api', action='store_true', help="Skip the /api/search measurement")
+    parser.add_argument('--work-dir', help="Directory for generated corpora (default: a temporary directory)")
+    parser.add_argument('--output', help="Where to write the JSON results")
+    parser.add_argument('--compare', help="Earlier results file to compare against")
+    args = parser.parse_args()
+
+    sizes = [int(s) for s in args.sizes.split(',') if s.strip()]
+    queries = load_query_log(args.query_log) if args.query_log else None
+    work_dir = args.work_dir or tempfile.mkdtemp(prefix="search_benchmark_")
+
+    results = {
+        'commit': git_commit(),
+        'timestamp': datetime.now().isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'cpu_count': os.cpu_count(),
+        'query_log': args.query_log,
+        'runs': []
+    }
+
+    # A fresh process per size keeps RSS and caches from leaking between runs
+    context = multiprocessing.get_context('spawn')
+    try:
+        for size in sizes:
+            print(f"Benchmarking {size} documents...")
+            with context.Pool(1) as pool:
+                run = pool.apply(run_size, (size, args.template, queries, work_dir, args.seed,
+                                            args.abstract_words, not args.no_api))
+            results['runs'].append(run)
+            print(json.dumps(run, indent=2))
+    finally:
+        if not args.work_dir:
+            shutil.rmtree(work_dir, ignore_errors=True)
+
+    output = args.output or os.path.join(
+        current_dir, 'benchmark_results', f"{datetime.now():%Y%m%d-%H%M%S}-{results['commit'] or 'unknown'}.json"
+    )
+    os.makedirs(os.path.dirname(output), exist_ok=True)
+    with open(output, 'w', encoding='utf-8') as f:
+        json.dump(results, f, indent=2)
+    print(f"Results saved to {output}")
+
+    if args.compare:
+        compare(args.compare, results)
+
+
+if __name__ == "__main__":
+    main()
@@ -9,20 +9,16 @@ import csv
 import pickle
 import os
 import logging
+import argparse
+from datetime import datetime
+from spimi import RECORDS_FILE, append_records
+from extraction import parse_publications
+from page_archive import PageArchive
 
-# Configure logging
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(levelname)s - %(message)s',
-    handlers=[
-        logging.FileHandler("crawler.log"),
-        logging.StreamHandler()
-    ]
-)
 logger = logging.getLogger("PurePortalCrawler")
 
 class PurePortalCrawler:
-    def __init__(self, start_url, data_dir="."):
+    def __init__(self, start_url, data_dir=".", archive_pages=False):
         self.start_url = start_url
         self.data_dir = data_dir
         self.department_members = []
@@ -31,6 +27,10 @@ class PurePortalCrawler:
         # Create data directory if it doesn't exist
         if not os.path.exists(data_dir):
             os.makedirs(data_dir)
+        
+        # Fetched pages are kept so extraction can be re-run offline (see page_archive.py)
+        self.archive = PageArchive(data_dir) if archive_pages else None
+        self.crawl_id = datetime.now().strftime("%Y%m%dT%H%M%S")
 
         try:    
             # Initialize WebDriver
@@ -101,68 +101,38 @@ class PurePortalCrawler:
         self.department_members = list(members)
         return members
     
-    def extract_publication_details(self):
+    def extract_publication_details(self, page=None):
         """Extract publication details from the current page"""
         publications = []
-        count = 0
         try:
-            publication_elements = WebDriverWait(self.driver, 10).until(
+            WebDriverWait(self.driver, 10).until(
                 EC.presence_of_all_elements_located((By.CLASS_NAME, "result-container"))
             )
-            for publication in publication_elements:
-                try:
-                    title_element = publication.find_element(By.CLASS_NAME, "title")
-                    author_elements = publication.find_elements(By.CLASS_NAME, 'link.person')
-                    year_element = publication.find_element(By.CLASS_NAME, "date")
-                    link_element = publication.find_element(By.CLASS_NAME, 'link')
-                    journal_element = None
-                    abstract_element = None
-                    keywords = []
-                    
-                    # Try to get journal info if available
-                    try:
-                        journal_element = publication.find_element(By.CLASS_NAME, 'journal')
-                    except:
-                        pass
-                    
-                    title = title_element.text if title_element else ""
-                    authors = [author.text.strip() for author in author_elements]
-                    author_profiles = [author.get_attribute("href") for author in author_elements]
-                    year = year_element.text if year_element else ""
-                    # Try to extract year as integer
-                    try:
-                        if year:
-                            year = int(year)
-                    except ValueError:
-                        pass
-                        
-                    link = link_element.get_attribute("href") if link_element else ""
-                    journal = journal_element.text if journal_element else ""
-                    abstract = abstract_element.text if abstract_element else ""
-                    
-                    publications.append({
-                        "Title": title,
-                        "Authors": authors,
-                        "Year": year,
-                        "Publication Link": link,
-                        "Author Profile Links": author_profiles,
-                        "Journal": journal,
-                        "Abstract": abstract,
-                        "Keywords": keywords
-                    })
-                    count += 1
-                    logger.info(f"{count}. Title: {title}")
-                except Exception as e:
-                    logger.error(f"Error extracting data from a publication: {e}")
+            # Parsed from the page source, the same way archived pages are re-extracted
+            html = self.driver.page_source
+            url = self.driver.current_url
+            if self.archive is not None:
+                self.archive.append(url, html, crawl=self.crawl_id, kind='publications', page=page)
+            publications = parse_publications(html, url)
+            for count, publication in enumerate(publications, 1):
+                logger.info(f"{count}. Title: {publication['Title']}")
         except Exception as e:
             logger.error(f"Error extracting publications: {e}")
         return publications
     
-    def crawl_all_publications(self, max_pages=None):
-        """Crawl all publications with optional page limit"""
+    def crawl_all_publications(self, max_pages=None, on_page=None):
+        """Crawl all publications with optional page limit.
+
+        on_page(page_number, publications) is called after each page is
+        saved, and may raise to stop the crawl.
+        """
         all_data = []
         page_count = 0
         
+        # Records are appended page by page so indexing can stream them
+        records_path = os.path.join(self.data_dir, RECORDS_FILE)
+        open(records_path, 'w', encoding='utf-8').close()
+        
         while True:
             page_count += 1
             logger.info(f"Crawling page {page_count}")
@@ -172,13 +142,16 @@ class PurePortalCrawler:
                 logger.info(f"Reached max pages limit ({max_pages})")
                 break
                 
-            publications = self.extract_publication_details()
+            publications = self.extract_publication_details(page=page_count)
             if not publications:
                 logger.warning("No publications found on this page")
                 break
                 
             all_data.extend(publications)
+            append_records(records_path, publications)
             logger.info(f"Total publications collected: {len(all_data)}")
+            if on_page:
+                on_page(page_count, publications)
             
             try:
                 next_button = WebDriverWait(self.driver, 5).until(
@@ -277,8 +250,8 @@ class PurePortalCrawler:
         except Exception as e:
             logger.error(f"Error saving publications to pickle: {e}")
     
-    def crawl(self, max_pages=None):
-        """Run the crawler to extract all data"""
+    def crawl(self, max_pages=None, on_page=None):
+        """Run the crawler to extract all data, on_page is passed to crawl_all_publications"""
         try:
             logger.info(f"Starting crawler with URL: {self.start_url}")
             self.driver.get(self.start_url)
@@ -293,7 +266,7 @@ class PurePortalCrawler:
             
             # Navigate to publications and extract them
             self.go_to_publications()
-            self.crawl_all_publications(max_pages=max_pages)
+            self.crawl_all_publications(max_pages=max_pages, on_page=on_page)
             
             # Save the publications
             self.save_publications_to_csv()
@@ -311,6 +284,12 @@ class PurePortalCrawler:
 
 # Example usage
 if __name__ == "__main__":
+    from log_config import configure_logging
+    configure_logging("crawler.log")
+    parser = argparse.ArgumentParser(description="Crawl the department's publications")
+    parser.add_argument('--archive', action='store_true',
+                        help="Keep the fetched pages in pages.warc.gz for offline re-extraction")
+    args = parser.parse_args()
     start_url = ""
-    crawler = PurePortalCrawler(start_url)
+    crawler = PurePortalCrawler(start_url, archive_pages=args.archive)
     crawler.crawl(max_pages=2)  # Limit to 2 pages for testing
\ No newline at end of file
@@ -0,0 +1,263 @@
+import os
+import re
+import logging
+from datetime import date
+
+import numpy as np
+
+logger = logging.getLogger("DateIndex")
+
+MONTHS = {
+    'jan': 1, 'feb': 2, 'mar': 3, 'apr': 4, 'may': 5, 'jun': 6,
+    'jul': 7, 'aug': 8, 'sep': 9, 'oct': 10, 'nov': 11, 'dec': 12
+}
+
+# "2 Jan 2025", "Sept 2019", "2019" as shown on the portal, and ISO dates
+TEXT_DATE = re.compile(r'^(?:(\d{1,2})\s+)?(?:([A-Za-z]{3,9})\.?,?\s+)?(\d{4})$')
+ISO_DATE = re.compile(r'^(\d{4})(?:-(\d{1,2})(?:-(\d{1,2}))?)?$')
+YEAR = re.compile(r'\b(1[89]\d{2}|2\d{3})\b')
+
+# Ordinal stored for publications without a usable date, sorts before every real date
+UNKNOWN = 0
+
+
+def parse_publication_date(value):
+    """Parse a crawled date into (year, month, day), missing parts are None.
+
+    Returns None when no year can be found in the value.
+    """
+    if value is None or isinstance(value, bool):
+        return None
+    if isinstance(value, int):
+        return (value, None, None) if 1000 <= value <= 9999 else None
+
+    text = str(value).strip()
+    year = month = day = None
+    match = TEXT_DATE.match(text)
+    if match:
+        day_text, month_text, year_text = match.groups()
+        year = int(year_text)
+        if month_text:
+            month = MONTHS.get(month_text[:3].lower())
+            if month and day_text:
+                day = int(day_text)
+    else:
+        match = ISO_DATE.match(text)
+        if match:
+            year = int(match.group(1))
+            month = int(match.group(2)) if match.group(2) else None
+            day = int(match.group(3)) if match.group(3) else None
+        else:
+            # Anything else, keep just the year if one is mentioned
+            match = YEAR.search(text)
+            if not match:
+                return None
+            year = int(match.group(1))
+
+    # Drop parts that don't make a real date rather than the whole date
+    try:
+        date(year, month or 1, day or 1)
+    except ValueError:
+        try:
+            date(year, month or 1, 1)
+            day = None
+        except ValueError:
+            month = day = None
+    return year, month, day
+
+
+def iso_date(parsed):
+    """Format (year, month, day) as an ISO 8601 date of the known precision, like 2019-09"""
+    year, month, day = parsed
+    if month is None:
+        return f"{year:04d}"
+    if day is None:
+        return f"{year:04d}-{month:02d}"
+    return f"{year:04d}-{month:02d}-{day:02d}"
+
+
+def date_ordinal(parsed):
+    """Day ordinal of the first day of a parsed date, UNKNOWN if there is none"""
+    if parsed is None:
+        return UNKNOWN
+    year, month, day = parsed
+    return date(year, month or 1, day or 1).toordinal()
+
+
+def normalize_publication(publication):
+    """Replace the crawled date text of a publication with typed date fields.
+
+    Year becomes an int (None when unknown), Date the ISO date and
+    Date Text keeps the text as crawled. Normalizing twice is harmless.
+    """
+    year_key = 'year' if 'year' in publication and 'Year' not in publication else 'Year'
+    text = publication.get('Date Text', publication.get(year_key, ''))
+    parsed = parse_publication_date(text)
+    publication['Date Text'] = '' if text is None else str(text)
+    publication[year_key] = parsed[0] if parsed else None
+    publication['Date'] = iso_date(parsed) if parsed else ''
+    return publication
+
+
+def publication_ordinal(publication):
+    """Day ordinal of a publication, normalized or not"""
+    if publication.get('Date'):
+        return date_ordinal(parse_publication_date(publication['Date']))
+    return date_ordinal(parse_publication_date(publication.get('Year', publication.get('year'))))
+
+
+def parse_year_range(text):
+    """Parse "2019", "2019..2024", "2019.." or "..2024" into an inclusive (start, end) year range.
+
+    Open ends are None. Raises ValueError for anything else.
+    """
+    if isinstance(text, int):
+        return text, text
+    text = str(text).strip()
+    if '..' in text:
+        start, _, end = text.partition('..')
+    else:
+        start = end = text
+    start, end = start.strip(), end.strip()
+    if not (start or end) or not all(re.fullmatch(r'\d{4}', part) for part in (start, end) if part):
+        raise ValueError(f"Invalid year or year range: {text!r}")
+    start = int(start) if start else None
+    end = int(end) if end else None
+    if start is not None and end is not None and start > end:
+        raise ValueError(f"Year range starts after it ends: {text!r}")
+    return start, end
+
+
+class DateIndex:
+    """Doc-values column of publication dates with a date-sorted copy for range queries.
+
+    ordinals holds the day ordinal of every document by doc id, order the
+    doc ids sorted by date, so a year range is two binary searches into
+    sorted_ordinals and a slice of order.
+    """
+
+    FILES = ('dates.npy', 'dates_order.npy')
+
+    def __init__(self):
+        self.ordinals = None
+        self.order = None
+        self.sorted_ordinals = None
+
+    def build(self, publications):
+        """Build the date column for publications in doc id order"""
+        self.start()
+        for publication in publications:
+            self.add(publication)
+        return self.finish()
+
+    def start(self):
+        """Begin an incremental build, documents are then passed to add() in doc id order"""
+        self._ordinals = []
+
+    def add(self, publication):
+        """Add the next document, returns its date ordinal"""
+        ordinal = publication_ordinal(publication)
+        self._ordinals.append(ordinal)
+        return ordinal
+
+    def finish(self):
+        self._set_column(np.asarray(self._ordinals, dtype=np.int32))
+        self._ordinals = None
+        known = int(np.count_nonzero(self.ordinals))
+        logger.info(f"Built date column for {len(self.ordinals)} documents, {known} with a date")
+        return True
+
+    def _set_column(self, ordinals, order=None):
+        self.ordinals = ordinals
+        # Stable, so documents of the same day stay in doc id order
+        self.order = np.argsort(ordinals, kind='stable').astype(np.int32) if order is None else order
+        self.sorted_ordinals = ordinals[self.order]
+
+    def save(self, index_dir):
+        """Save the date column and its sort order next to the index"""
+        try:
+            for name, array in zip(self.FILES, (self.ordinals, self.order)):
+                path = os.path.join(index_dir, name)
+                with open(path + ".tmp", 'wb') as f:
+                    np.save(f, array)
+                os.replace(path + ".tmp", path)
+            logger.info(f"Date column saved to {index_dir}")
+            return True
+        except Exception as e:
+            logger.error(f"Error saving date column: {e}")
+            return False
+
+    def load(self, index_dir, mmap_mode='r'):
+        """Memory-map the date column, False for indexes saved without one"""
+        paths = [os.path.join(index_dir, name) for name in self.FILES]
+        if not all(os.path.exists(path) for path in paths):
+            return False
+        try:
+            ordinals, order = (np.load(path, mmap_mode=mmap_mode) for path in paths)
+            self._set_column(ordinals, order)
+            return True
+        except Exception as e:
+            logger.error(f"Error loading date column: {e}")
+            self.ordinals = self.order = self.sorted_ordinals = None
+            return False
+
+    def is_built(self):
+        return self.ordinals is not None
+
+    def __len__(self):
+        return 0 if self.ordinals is None else len(self.ordinals)
+
+    @staticmethod
+    def ordinal_bounds(year_range):
+        """Inclusive day ordinal bounds of a (start, end) year range"""
+        start, end = year_range
+        low = date(start, 1, 1).toordinal() if start is not None else UNKNOWN + 1
+        high = date(end, 12, 31).toordinal() if end is not None else date.max.toordinal()
+        return low, high
+
+    def ordinals_of(self, doc_ids):
+        """Date ordinals of an array of doc ids, UNKNOWN for ids past the column"""
+        doc_ids = np.asarray(doc_ids, dtype=np.int64)
+        ordinals = np.full(len(doc_ids), UNKNOWN, dtype=np.int32)
+        inside = doc_ids < len(self)
+        ordinals[inside] = self.ordinals[doc_ids[inside]]
+        return ordinals
+
+    def ordinal(self, doc_id):
+        return int(self.ordinals[doc_id]) if doc_id < len(self) else UNKNOWN
+
+    def in_range(self, ordinals, year_range):
+        """Boolean mask of the ordinals falling in a year range"""
+        low, high = self.ordinal_bounds(year_range)
+        return (ordinals >= low) & (ordinals <= high)
+
+    def contains(self, doc_id, year_range):
+        low, high = self.ordinal_bounds(year_range)
+        return low <= self.ordinal(doc_id) <= high
+
+    def doc_ids_between(self, year_range, newest_first=True):
+        """Doc ids dated within a year range, sorted by date"""
+        low, high = self.ordinal_bounds(year_range)
+        start = np.searchsorted(self.sorted_ordinals, low, side='left')
+        end = np.searchsorted(self.sorted_ordinals, high, side='right')
+        doc_ids = self.order[start:end]
+        return doc_ids[::-1] if newest_first else doc_ids
+
+    @staticmethod
+    def recency(ordinals, half_life_years=5.0, today=None):
+        """Decay in (0, 1] halving every half_life_years of age, 0 for undated documents"""
+        today = (today or date.today()).toordinal()
+        age_years = np.maximum(today - ordinals.astype(np.float64), 0.0) / 365.25
+        return np.where(ordinals != UNKNOWN, np.exp2(-age_years / half_life_years), 0.0)
+
+    def year_counts(self):
+        """Number of dated documents per year, oldest year first"""
+        if not len(self) or self.sorted_ordinals[-1] == UNKNOWN:
+            return {}
+        first = np.searchsorted(self.sorted_ordinals, UNKNOWN, side='right')
+        first_year = date.fromordinal(int(self.sorted_ordinals[first])).year
+        last_year = date.fromordinal(int(self.sorted_ordinals[-1])).year
+        years = range(first_year, last_year + 1)
+        starts = np.searchsorted(self.sorted_ordinals, [date(year, 1, 1).toordinal() for year in years])
+        ends = np.append(starts[1:], len(self.sorted_ordinals))
+        return {year: int(end - start) for year, start, end in zip(years, starts, ends) if end > start}
@@ -0,0 +1,190 @@
+import re
+import zlib
+import logging
+from difflib import SequenceMatcher
+from collections import defaultdict
+import numpy as np
+
+logger = logging.getLogger("Deduplicator")
+
+# Mersenne-style prime just above 2^32 for the universal hash family
+HASH_PRIME = np.uint64(4294967311)
+
+# Title words that differ between duplicates must be this similar, so typos and
+# plurals still match but "Business" never matches "Economic"
+WORD_MATCH_RATIO = 0.8
+
+# Candidates whose signatures agree on fewer positions than threshold - margin are not
+# confirmed exactly, 3 standard errors of the MinHash estimate at 64 permutations
+ESTIMATE_MARGIN = 0.15
+
+# Members of a bucket compared with each other: all of them in small buckets, the
+# neighbours in signature order in large ones, which holds the pair checks to
+# O(documents * bands * fan-out) however clustered the corpus is
+MAX_BUCKET_FANOUT = 64
+
+class PublicationDeduplicator:
+    """Collapse near-duplicate publications using MinHash signatures and LSH banding"""
+
+    def __init__(self, num_perm=64, bands=16, threshold=0.8, shingle_size=5, seed=1):
+        if num_perm % bands:
+            raise ValueError("num_perm must be divisible by bands")
+        self.num_perm = num_perm
+        self.bands = bands
+        self.rows = num_perm // bands
+        self.threshold = threshold
+        self.shingle_size = shingle_size
+
+        rng = np.random.default_rng(seed)
+        # Keep a below 2^31 so a * hash + b cannot overflow 64 bits
+        self.hash_a = rng.integers(1, 2**31, size=num_perm, dtype=np.uint64)
+        self.hash_b = rng.integers(0, 2**32, size=num_perm, dtype=np.uint64)
+
+    @staticmethod
+    def normalize_title(title):
+        return re.sub(r'[^a-z0-9]+', ' ', (title or '').lower()).strip()
+
+    def shingles(self, publication):
+        """Character shingles of the normalized title plus author surname tokens"""
+        title = self.normalize_title(publication.get('Title', publication.get('title', '')))
+        size = self.shingle_size
+        shingles = {title[i:i + size] for i in range(max(len(title) - size + 1, 1))} if title else set()
+        for author in publication.get('Authors', publication.get('authors', [])):
+            surname = author.split(',')[0].strip().lower()
+            if surname:
+                shingles.add(f"author:{surname}")
+        return shingles
+
+    def signature(self, shingles):
+        """MinHash signature: the minimum of each permuted hash over the shingles"""
+        if not shingles:
+            return np.full(self.num_perm, np.iinfo(np.uint64).max, dtype=np.uint64)
+        hashes = np.fromiter((zlib.crc32(s.encode('utf-8')) for s in shingles), dtype=np.uint64, count=len(shingles))
+        permuted = (self.hash_a[:, None] * hashes[None, :] + self.hash_b[:, None]) % HASH_PRIME
+        return permuted.min(axis=1)
+
+    @staticmethod
+    def _title_words(publication):
+        return set(PublicationDeduplicator.normalize_title(publication.get('Title', publication.get('title', ''))).split())
+
+    @staticmethod
+    def same_title(words_a, words_b):
+        """Whether two title word sets differ only by near-identical words.
+
+        Shingle overlap stays high when a long title has one word swapped,
+        as in the volumes of a conference series, so candidates are checked
+        word by word as well.
+        """
+        only_a, only_b = words_a - words_b, words_b - words_a
+        for words, others in ((only_a, only_b), (only_b, only_a)):
+            for word in words:
+                if not any(SequenceMatcher(None, word, other).ratio() >= WORD_MATCH_RATIO for other in others):
+                    return False
+        return True
+
+    @staticmethod
+    def _completeness(publication):
+        """Prefer the record with the most populated fields as the canonical one"""
+        filled = sum(1 for value in publication.values() if value)
+        return (filled, len(publication.get('Abstract', '') or ''), len(publication.get('Authors', [])))
+
+    def find_clusters(self, publications):
+        """Group indices of near-duplicate publications, returns lists of indices"""
+        shingle_sets = [self.shingles(pub) for pub in publications]
+        title_words = [self._title_words(pub) for pub in publications]
+
+        signatures = self.signatures(shingle_sets)
+        doc_ids = np.fromiter((doc_id for doc_id, shingles in enumerate(shingle_sets) if shingles), dtype=np.int64)
+
+        parent = list(range(len(publications)))
+
+        def find(x):
+            while parent[x] != x:
+                parent[x] = parent[parent[x]]
+                x = parent[x]
+            return x
+
+        for first, second in self.candidate_pairs(signatures, doc_ids).tolist():
+            root_a, root_b = find(first), find(second)
+            # Already in one cluster, through another pair
+            if root_a == root_b:
+                continue
+            a, b = shingle_sets[first], shingle_sets[second]
+            # Confirm the candidate with the exact Jaccard similarity and the title words
+            if (len(a & b) / len(a | b) >= self.threshold
+                    and self.same_title(title_words[first], title_words[second])):
+                parent[max(root_a, root_b)] = min(root_a, root_b)
+
+        clusters = defaultdict(list)
+        for doc_id in range(len(publications)):
+            clusters[find(doc_id)].append(doc_id)
+        return sorted(clusters.values(), key=lambda members: members[0])
+
+    def signatures(self, shingle_sets, batch_size=1024):
+        """MinHash signatures of many shingle sets, one row each, hashed a batch of documents at a time"""
+        signatures = np.full((len(shingle_sets), self.num_perm), np.iinfo(np.uint64).max, dtype=np.uint64)
+        for start in range(0, len(shingle_sets), batch_size):
+            batch = shingle_sets[start:start + batch_size]
+            sizes = np.fromiter((len(shingles) for shingles in batch), dtype=np.int64, count=len(batch))
+            if not sizes.any():
+                continue
+            hashes = np.fromiter((zlib.crc32(s.encode('utf-8')) for shingles in batch for s in shingles),
+                                 dtype=np.uint64, count=int(sizes.sum()))
+            permuted = (self.hash_a[:, None] * hashes[None, :] + self.hash_b[:, None]) % HASH_PRIME
+            filled = np.flatnonzero(sizes)
+            starts = np.concatenate([[0], np.cumsum(sizes)[:-1]])[filled]
+            signatures[start + filled] = np.minimum.reduceat(permuted, starts, axis=1).T
+        return signatures
+
+    def candidate_pairs(self, signatures, doc_ids):
+        """Pairs of documents sharing a band of their signatures, worth an exact check.
+
+        Within each band the documents are grouped by their band (the LSH
+        buckets) and ordered by their whole signature inside a group, so
+        near-identical ones are neighbours, and each document is paired
+        with the next MAX_BUCKET_FANOUT of its group. A pair is only taken
+        from the first band the two share, and only if their signatures
+        agree on enough positions to estimate a similar Jaccard.
+        """
+        by_signature = doc_ids[np.lexsort(signatures[doc_ids].T[::-1])]
+        pairs = []
+        for band in range(self.bands):
+            columns = signatures[by_signature, band * self.rows:(band + 1) * self.rows]
+            # lexsort is stable, so every bucket stays in signature order
+            order = np.lexsort(columns.T[::-1])
+            docs, columns = by_signature[order], columns[order]
+            bucket = np.concatenate([[0], np.cumsum((columns[1:] != columns[:-1]).any(axis=1))])
+            for offset in range(1, MAX_BUCKET_FANOUT + 1):
+                same = np.flatnonzero(bucket[:-offset] == bucket[offset:])
+                if not len(same):
+                    break
+                first, second = docs[same], docs[same + offset]
+                # Earlier bands only, the pair shares this one
+                equal = signatures[first, :band * self.rows] == signatures[second, :band * self.rows]
+                keep = ~equal.reshape(len(equal), band, self.rows).all(axis=2).any(axis=1)
+                first, second = first[keep], second[keep]
+                estimate = (signatures[first] == signatures[second]).mean(axis=1)
+                keep = estimate >= self.threshold - ESTIMATE_MARGIN
+                pairs.append(np.stack([first[keep], second[keep]], axis=1))
+        return np.concatenate(pairs) if pairs else np.zeros((0, 2), dtype=np.int64)
+
+    def deduplicate(self, publications):
+        """Return canonical publications, each carrying 'Aliases' for the records merged into it"""
+        canonical = []
+        merged = 0
+        for members in self.find_clusters(publications):
+            best = max(members, key=lambda doc_id: self._completeness(publications[doc_id]))
+            record = dict(publications[best])
+            record['Aliases'] = [
+                {
+                    'Title': publications[doc_id].get('Title', ''),
+                    'Publication Link': publications[doc_id].get('Publication Link', ''),
+                    'Year': publications[doc_id].get('Year', '')
+                }
+                for doc_id in members if doc_id != best
+            ]
+            merged += len(members) - 1
+            canonical.append(record)
+
+        logger.info(f"Deduplicated {len(publications)} publications into {len(canonical)} ({merged} near-duplicates merged)")
+        return canonical
@@ -0,0 +1,276 @@
+import os
+import sys
+import json
+import shutil
+import argparse
+import itertools
+import tempfile
+from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+current_dir = os.path.dirname(os.path.abspath(__file__))
+sys.path.append(current_dir)
+
+METRICS = ('ndcg', 'map', 'mrr', 'recall')
+
+
+def load_qrels(path):
+    """Load TREC-style judgments: 'query_id iteration doc_key relevance' per line.
+
+    doc_key is a publication link (stable across rebuilds and deduplication)
+    or a numeric doc id.
+    """
+    qrels = defaultdict(dict)
+    with open(path, 'r', encoding='utf-8') as f:
+        for line in f:
+            parts = line.split()
+            if len(parts) < 4:
+                continue
+            query_id, _, doc_key, relevance = parts[:4]
+            qrels[query_id][doc_key] = float(relevance)
+    return dict(qrels)
+
+
+def load_queries(path):
+    """Load queries as 'query_id<TAB>query text' per line"""
+    queries = {}
+    with open(path, 'r', encoding='utf-8') as f:
+        for line in f:
+            if '\t' in line:
+                query_id, text = line.rstrip('\n').split('\t', 1)
+                queries[query_id] = text
+    return queries
+
+
+def result_keys(result):
+    """Every key a judged document may be recorded under: link, aliases and doc id"""
+    keys = [result.get('url') or result.get('Publication Link', '')]
+    keys.extend(alias.get('Publication Link', '') for alias in result.get('Aliases', []))
+    if result.get('doc_id') is not None:
+        keys.append(str(result['doc_id']))
+    return [key for key in keys if key]
+
+
+def run_queries(processor, queries, depth=100):
+    """Rank documents for every query, returns {query_id: [result keys per rank]}"""
+    run = {}
+    for query_id, text in queries.items():
+        run[query_id] = [result_keys(result) for result in processor.search(text, max_results=depth)]
+    return run
+
+
+def gain_matrix(run, qrels, query_ids, depth):
+    """Relevance of the retrieved documents as a (queries x depth) matrix"""
+    gains = np.zeros((len(query_ids), depth))
+    for row, query_id in enumerate(query_ids):
+        judged = qrels.get(query_id, {})
+        for rank, keys in enumerate(run.get(query_id, [])[:depth]):
+            gains[row, rank] = max((judged.get(key, 0.0) for key in keys), default=0.0)
+    return gains
+
+
+def ideal_matrix(qrels, query_ids, depth):
+    """Best achievable gains per query sorted in decreasing order, and relevant counts"""
+    ideal = np.zeros((len(query_ids), depth))
+    num_relevant = np.zeros(len(query_ids))
+    for row, query_id in enumerate(query_ids):
+        values = sorted((v for v in qrels.get(query_id, {}).values() if v > 0), reverse=True)
+        num_relevant[row] = len(values)
+        ideal[row, :min(len(values), depth)] = values[:depth]
+    return ideal, num_relevant
+
+
+def compute_metrics(gains, ideal, num_relevant, k=10):
+    """Vectorized nDCG@k, MAP, MRR and recall@k over all queries at once.
+
+    gains and ideal are (queries x depth) matrices, returns per-query arrays.
+    """
+    binary = gains > 0
+    has_relevant = num_relevant > 0
+    safe_relevant = np.maximum(num_relevant, 1)
+    ranks = np.arange(1, gains.shape[1] + 1)
+
+    discounts = 1.0 / np.log2(ranks[:k] + 1)
+    dcg = ((2 ** gains[:, :k] - 1) * discounts).sum(axis=1)
+    idcg = ((2 ** ideal[:, :k] - 1) * discounts).sum(axis=1)
+    ndcg = np.divide(dcg, idcg, out=np.zeros_like(dcg), where=idcg > 0)
+
+    precision_at_rank = np.cumsum(binary, axis=1) / ranks
+    average_precision = (precision_at_rank * binary).sum(axis=1) / safe_relevant
+
+    first_hit = np.argmax(binary, axis=1)
+    reciprocal_rank = np.where(binary.any(axis=1), 1.0 / (first_hit + 1), 0.0)
+
+    recall = binary[:, :k].sum(axis=1) / safe_relevant
+
+    metrics = {'ndcg': ndcg, 'map': average_precision, 'mrr': reciprocal_rank, 'recall': recall}
+    # Queries without any relevant judgment are left out of the averages
+    return {name: values[has_relevant] for name, values in metrics.items()}
+
+
+def evaluate_run(run, qrels, k=10, depth=100):
+    """Mean metrics of a run against the judgments"""
+    query_ids = sorted(qid for qid in qrels if qid in run)
+    if not query_ids:
+        return {name: 0.0 for name in METRICS}
+    ideal, num_relevant = ideal_matrix(qrels, query_ids, depth)
+    per_query = compute_metrics(gain_matrix(run, qrels, query_ids, depth), ideal, num_relevant, k=k)
+    summary = {name: float(values.mean()) if len(values) else 0.0 for name, values in per_query.items()}
+    summary['queries'] = len(per_query['ndcg'])
+    return summary
+
+
+def compare_runs(baseline, candidate, qrels, k=10, depth=100, tolerance=0.0):
+    """Compare two runs: metric deltas plus how many top-k rankings are unchanged"""
+    base_metrics = evaluate_run(baseline, qrels, k, depth)
+    new_metrics = evaluate_run(candidate, qrels, k, depth)
+    deltas = {name: new_metrics[name] - base_metrics[name] for name in METRICS}
+
+    shared = [qid for qid in baseline if qid in candidate]
+    unchanged = sum(1 for qid in shared if [keys[0] for keys in baseline[qid][:k] if keys] ==
+                    [keys[0] for keys in candidate[qid][:k] if keys])
+    return {
+        'baseline': base_metrics,
+        'candidate': new_metrics,
+        'deltas': deltas,
+        'identical_top_k': unchanged,
+        'compared_queries': len(shared),
+        'within_tolerance': all(delta >= -tolerance for delta in deltas.values())
+    }
+
+
+def save_run(run, path):
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(run, f)
+
+
+def load_run(path):
+    with open(path, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+
+# Per-worker cache of loaded query processors, keyed by index directory
+_processors = {}
+
+
+def _evaluate_setting(task):
+    """Worker: evaluate one (index, k1, b) setting"""
+    from query_processor import QueryProcessor
+
+    data_dir, index_dir, k1, b, queries, qrels, k, depth = task
+    if index_dir not in _processors:
+        _processors[index_dir] = QueryProcessor(data_dir=data_dir, index_dir=index_dir)
+    processor = _processors[index_dir]
+    processor.k1, processor.b = k1, b
+    processor.bm25_matrix = None
+    return evaluate_run(run_queries(processor, queries, depth), qrels, k, depth)
+
+
+def _build_index(task):
+    """Worker: build an index with the given field boosts"""
+    from inverted_index import InvertedIndex
+
+    data_dir, index_dir, author_weight, keyword_weight = task
+    builder = InvertedIndex(data_dir=data_dir, index_dir=index_dir,
+                            author_weight=author_weight, keyword_weight=keyword_weight)
+    return builder.build_index()
+
+
+def sweep(data_dir, queries, qrels, k1_values, b_values, author_weights, keyword_weights,
+          k=10, depth=100, workers=None):
+    """Grid search over BM25 and boosting parameters, parallelized across cores.
+
+    Field boosts change the index, so one index is built per boost pair;
+    k1 and b only affect scoring and reuse it.
+    """
+    work_dir = tempfile.mkdtemp(prefix="search_sweep_")
+    boosts = list(itertools.product(author_weights, keyword_weights))
+    index_dirs = {boost: os.path.join(work_dir, f"index_a{boost[0]}_k{boost[1]}") for boost in boosts}
+    try:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            built = list(pool.map(_build_index, [(data_dir, index_dirs[boost]) + boost for boost in boosts]))
+            settings = [
+                (boost, k1, b) for boost, ok in zip(boosts, built) if ok
+                for k1, b in itertools.product(k1_values, b_values)
+            ]
+            tasks = [(data_dir, index_dirs[boost], k1, b, queries, qrels, k, depth) for boost, k1, b in settings]
+            scores = list(pool.map(_evaluate_setting, tasks))
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+    results = [
+        dict(author_weight=boost[0], keyword_weight=boost[1], k1=k1, b=b, **metrics)
+        for (boost, k1, b), metrics in zip(settings, scores)
+    ]
+    results.sort(key=lambda r: r['ndcg'], reverse=True)
+    return results
+
+
+def _floats(text):
+    return [float(v) for v in text.split(',') if v.strip()]
+
+
+def _ints(text):
+    return [int(v) for v in text.split(',') if v.strip()]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Offline relevance evaluation of the search engine")
+    parser.add_argument('--data-dir', default='.')
+    parser.add_argument('--index-dir', default='index_data')
+    parser.add_argument('--qrels', required=True, help="TREC-style judgments file")
+    parser.add_argument('--k', type=int, default=10, help="Cutoff for nDCG and recall")
+    parser.add_argument('--depth', type=int, default=100, help="Documents retrieved per query")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    evaluate_parser = subparsers.add_parser('evaluate', help="Evaluate the current index")
+    evaluate_parser.add_argument('--queries', required=True, help="'query_id<TAB>text' file")
+    evaluate_parser.add_argument('--save-run', help="Save the ranking for later comparison")
+
+    compare_parser = subparsers.add_parser('compare', help="Compare two saved runs")
+    compare_parser.add_argument('baseline')
+    compare_parser.add_argument('candidate')
+    compare_parser.add_argument('--tolerance', type=float, default=0.0,
+                                help="Largest allowed drop of any mean metric")
+
+    sweep_parser = subparsers.add_parser('sweep', help="Grid search k1, b and field boosts")
+    sweep_parser.add_argument('--queries', required=True)
+    sweep_parser.add_argument('--k1', default='0.9,1.2,1.5,2.0')
+    sweep_parser.add_argument('--b', default='0.5,0.75,0.9')
+    sweep_parser.add_argument('--author-weight', default='2')
+    sweep_parser.add_argument('--keyword-weight', default='3')
+    sweep_parser.add_argument('--workers', type=int, default=None)
+    sweep_parser.add_argument('--output', help="Write all sweep results as JSON")
+    args = parser.parse_args()
+
+    qrels = load_qrels(args.qrels)
+
+    if args.command == 'evaluate':
+        from query_processor import QueryProcessor
+        processor = QueryProcessor(data_dir=args.data_dir, index_dir=args.index_dir)
+        run = run_queries(processor, load_queries(args.queries), args.depth)
+        if args.save_run:
+            save_run(run, args.save_run)
+        print(json.dumps(evaluate_run(run, qrels, args.k, args.depth), indent=2))
+
+    elif args.command == 'compare':
+        report = compare_runs(load_run(args.baseline), load_run(args.candidate), qrels,
+                              args.k, args.depth, args.tolerance)
+        print(json.dumps(report, indent=2))
+        sys.exit(0 if report['within_tolerance'] else 1)
+
+    elif args.command == 'sweep':
+        results = sweep(args.data_dir, load_queries(args.queries), qrels,
+                        _floats(args.k1), _floats(args.b), _ints(args.author_weight),
+                        _ints(args.keyword_weight), args.k, args.depth, args.workers)
+        if args.output:
+            with open(args.output, 'w', encoding='utf-8') as f:
+                json.dump(results, f, indent=2)
+        for result in results[:10]:
+            print(json.dumps(result))
+
+
+if __name__ == "__main__":
+    main()
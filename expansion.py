@@ -0,0 +1,132 @@
+import os
+import pickle
+import logging
+
+import numpy as np
+from scipy import sparse
+
+logger = logging.getLogger("ExpansionIndex")
+
+# Terms in fewer documents have unreliable co-occurrence statistics
+MIN_DOCUMENT_FREQUENCY = 3
+# Terms in more than this fraction of documents co-occur with everything
+MAX_DOCUMENT_FRACTION = 0.2
+# Documents two terms must share to be neighbours
+MIN_COOCCURRENCE = 2
+# Weakest normalized PMI kept
+MIN_NPMI = 0.25
+
+
+class ExpansionIndex:
+    """Precomputed query expansion neighbours from document-level term co-occurrence.
+
+    Two terms are scored by their normalized pointwise mutual information
+    over the documents, PMI(a, b) / -log p(a, b), which ranks pairs like
+    PMI but falls in (0, 1], so it can be used as the weight of an added
+    query term. Only the top_k neighbours of every term are kept, as a
+    term -> [(neighbour, weight), ...] dictionary, so expanding a query
+    is a dictionary probe per query term.
+    """
+
+    FILES = ('expansions.pkl',)
+
+    def __init__(self, top_k=5, chunk_size=2048):
+        self.top_k = top_k
+        self.chunk_size = chunk_size
+        self.neighbours = {}
+        self.built = False
+
+    def build(self, index, idf, total_documents):
+        """Compute the neighbours of the terms in idf from the postings of index"""
+        num_docs = max(total_documents, 1)
+        vocabulary = sorted(
+            term for term in idf
+            if term in index and MIN_DOCUMENT_FREQUENCY <= len(index[term]) <= MAX_DOCUMENT_FRACTION * num_docs
+        )
+
+        # Binary term-by-document matrix, a term's row holds the documents containing it
+        rows, cols = [], []
+        for term_id, term in enumerate(vocabulary):
+            doc_ids = {doc_id for doc_id, _ in index[term]}
+            rows.extend([term_id] * len(doc_ids))
+            cols.extend(doc_ids)
+        num_docs = max(num_docs, max(cols, default=-1) + 1)
+        matrix = sparse.csr_matrix(
+            (np.ones(len(rows), dtype=np.float32), (rows, cols)), shape=(len(vocabulary), num_docs)
+        )
+        document_frequency = np.asarray(matrix.sum(axis=1)).ravel()
+        transposed = matrix.T.tocsc()
+
+        self.neighbours = {}
+        for start in range(0, len(vocabulary), self.chunk_size):
+            # Co-occurrence counts of a block of terms against the vocabulary, sparse throughout
+            counts = (matrix[start:start + self.chunk_size] @ transposed).tocoo()
+            keep = (counts.data >= MIN_COOCCURRENCE) & (counts.row + start != counts.col)
+            term_ids, other_ids, together = counts.row[keep] + start, counts.col[keep], counts.data[keep]
+            if not len(together):
+                continue
+            joint = together / num_docs
+            pmi = np.log(joint / ((document_frequency[term_ids] / num_docs) * (document_frequency[other_ids] / num_docs)))
+            npmi = pmi / -np.log(joint)
+            keep = npmi >= MIN_NPMI
+            term_ids, other_ids, npmi = term_ids[keep], other_ids[keep], npmi[keep]
+
+            # Grouped by term, strongest neighbours first
+            order = np.lexsort((other_ids, -npmi, term_ids))
+            term_ids, other_ids, npmi = term_ids[order], other_ids[order], npmi[order]
+            bounds = np.flatnonzero(np.diff(term_ids)) + 1
+            for group_ids, group_others, group_npmi in zip(np.split(term_ids, bounds), np.split(other_ids, bounds),
+                                                           np.split(npmi, bounds)):
+                self.neighbours[vocabulary[group_ids[0]]] = [
+                    (vocabulary[other_id], round(weight, 4))
+                    for other_id, weight in zip(group_others[:self.top_k].tolist(), group_npmi[:self.top_k].tolist())
+                ]
+
+        self.built = True
+        logger.info(f"Computed expansion neighbours for {len(self.neighbours)} of {len(vocabulary)} terms")
+        return True
+
+    def save(self, index_dir):
+        """Save the neighbour dictionary next to the index"""
+        try:
+            path = os.path.join(index_dir, self.FILES[0])
+            with open(path + ".tmp", 'wb') as f:
+                pickle.dump(self.neighbours, f)
+            os.replace(path + ".tmp", path)
+            logger.info(f"Expansion neighbours saved to {index_dir}")
+            return True
+        except Exception as e:
+            logger.error(f"Error saving expansion neighbours: {e}")
+            return False
+
+    def load(self, index_dir):
+        """Load the neighbour dictionary, False for indexes saved without one"""
+        path = os.path.join(index_dir, self.FILES[0])
+        if not os.path.exists(path):
+            return False
+        try:
+            with open(path, 'rb') as f:
+                self.neighbours = pickle.load(f)
+            self.built = True
+            return True
+        except Exception as e:
+            logger.error(f"Error loading expansion neighbours: {e}")
+            self.neighbours, self.built = {}, False
+            return False
+
+    def is_built(self):
+        return self.built
+
+    def expand(self, query_terms, weight=1.0):
+        """Weights of the neighbour terms to add to a query, scaled by weight.
+
+        A neighbour of several query terms keeps its largest weight, and
+        the query's own terms are never added.
+        """
+        query = set(query_terms)
+        expansions = {}
+        for term in query:
+            for neighbour, score in self.neighbours.get(term, ()):
+                if neighbour not in query:
+                    expansions[neighbour] = max(expansions.get(neighbour, 0.0), weight * score)
+        return expansions
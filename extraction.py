@@ -0,0 +1,57 @@
+"""Publication details parsed from the HTML of a portal listing page.
+
+Used by the crawler on the page source of every page it visits and by
+page_archive.py on archived pages, so a selector fix applies to both
+and can be checked offline without a browser.
+"""
+import logging
+from urllib.parse import urljoin
+
+from bs4 import BeautifulSoup
+
+from dates import normalize_publication
+
+logger = logging.getLogger("PurePortalCrawler")
+
+
+def _text(element):
+    """Visible text of an element with whitespace collapsed, like Selenium's .text"""
+    return ' '.join(element.get_text(' ').split()) if element is not None else ""
+
+
+def _href(element, page_url):
+    """Absolute link of an element, resolved against the page like Selenium's get_attribute("href")"""
+    href = element.get('href') if element is not None else None
+    return urljoin(page_url, href) if href else ""
+
+
+def parse_publications(html, page_url=""):
+    """Extract the publications listed in a page's HTML, in page order"""
+    publications = []
+    soup = BeautifulSoup(html, 'lxml')
+    for container in soup.select('.result-container'):
+        try:
+            title_element = container.select_one('.title')
+            author_elements = container.select('.link.person')
+            year_element = container.select_one('.date')
+            link_element = container.select_one('.link')
+            if title_element is None or year_element is None or link_element is None:
+                raise ValueError("missing title, date or link")
+            journal_element = container.select_one('.journal')
+            abstract_element = None
+            keywords = []
+
+            # Date text like "2 Jan 2025" becomes a typed Year and an ISO Date
+            publications.append(normalize_publication({
+                "Title": _text(title_element),
+                "Authors": [_text(author) for author in author_elements],
+                "Year": _text(year_element),
+                "Publication Link": _href(link_element, page_url),
+                "Author Profile Links": [_href(author, page_url) for author in author_elements],
+                "Journal": _text(journal_element),
+                "Abstract": _text(abstract_element),
+                "Keywords": keywords
+            }))
+        except Exception as e:
+            logger.error(f"Error extracting data from a publication: {e}")
+    return publications
@@ -0,0 +1,152 @@
+import os
+import re
+import pickle
+import logging
+
+import numpy as np
+
+logger = logging.getLogger("FacetIndex")
+
+class FacetIndex:
+    """Per-document value ids for the year, author and journal facets.
+
+    Every facet keeps its distinct values sorted, so a value id orders
+    like its value, and a CSR layout of the documents' value ids:
+    ids[offsets[doc_id]:offsets[doc_id + 1]] are those of one document.
+    Counting a facet over the matched documents gathers their value ids
+    and bincounts them, the cost follows the matches rather than the
+    number of distinct values.
+    """
+
+    FACETS = ('year', 'author', 'journal')
+    FILES = ('facets.pkl',) + tuple(
+        f"facet_{facet}_{part}.npy" for facet in FACETS for part in ('offsets', 'ids')
+    )
+
+    def __init__(self):
+        self.values = {facet: [] for facet in self.FACETS}
+        self.offsets = {}
+        self.ids = {}
+
+    @staticmethod
+    def facet_values(publication):
+        """Extract the facet values of a publication"""
+        values = {'year': [], 'author': [], 'journal': []}
+
+        year = publication.get('Year', publication.get('year', ''))
+        match = re.search(r'\b(1[89]\d{2}|2\d{3})\b', str(year))
+        if match:
+            values['year'].append(match.group(1))
+
+        for author in publication.get('Authors', publication.get('authors', [])):
+            if author.strip():
+                values['author'].append(author.strip())
+
+        journal = publication.get('Journal', publication.get('journal', '')) or ''
+        journal = re.sub(r'^In:\s*', '', journal.strip()).rstrip('.').strip()
+        if journal:
+            values['journal'].append(journal)
+        return values
+
+    def build(self, publications):
+        """Collect the facet value ids of every publication"""
+        self.start()
+        for doc_id, pub in enumerate(publications):
+            self.add(doc_id, pub)
+        return self.finish()
+
+    def start(self):
+        """Begin an incremental build, documents are then passed to add() in doc id order"""
+        self._value_ids = {facet: {} for facet in self.FACETS}
+        self._rows = {facet: [] for facet in self.FACETS}
+        self._lengths = {facet: [] for facet in self.FACETS}
+
+    def add(self, doc_id, publication):
+        for facet, values in self.facet_values(publication).items():
+            value_ids = self._value_ids[facet]
+            distinct = dict.fromkeys(values)
+            for value in distinct:
+                self._rows[facet].append(value_ids.setdefault(value, len(value_ids)))
+            self._lengths[facet].append(len(distinct))
+
+    def finish(self):
+        """Renumber the value ids in value order and lay them out per document"""
+        for facet in self.FACETS:
+            value_ids = self._value_ids[facet]
+            self.values[facet] = sorted(value_ids)
+            # First-seen id -> id in value order
+            renumber = np.empty(len(value_ids), dtype=np.int32)
+            renumber[[value_ids[value] for value in self.values[facet]]] = np.arange(len(value_ids), dtype=np.int32)
+            self.ids[facet] = renumber[np.asarray(self._rows[facet], dtype=np.int64)]
+            self.offsets[facet] = np.concatenate([[0], np.cumsum(self._lengths[facet], dtype=np.int64)]).astype(np.int64)
+        self._value_ids = self._rows = self._lengths = None
+        logger.info("Built facets: " + ", ".join(f"{len(self.values[f])} {f} values" for f in self.FACETS))
+        return True
+
+    def save(self, index_dir):
+        """Save the facet values and the per-document value ids to disk"""
+        try:
+            with open(os.path.join(index_dir, self.FILES[0]), 'wb') as f:
+                pickle.dump({'values': self.values}, f)
+            for facet in self.FACETS:
+                for part, array in (('offsets', self.offsets[facet]), ('ids', self.ids[facet])):
+                    path = os.path.join(index_dir, f"facet_{facet}_{part}.npy")
+                    with open(path + ".tmp", 'wb') as f:
+                        np.save(f, array)
+                    os.replace(path + ".tmp", path)
+            logger.info(f"Facets saved to {index_dir}")
+            return True
+        except Exception as e:
+            logger.error(f"Error saving facets: {e}")
+            return False
+
+    def load(self, index_dir, mmap_mode='r'):
+        """Load the facets, False for indexes saved without them or with the older bitmaps"""
+        if not all(os.path.exists(os.path.join(index_dir, name)) for name in self.FILES):
+            logger.warning(f"No facets found at {index_dir}")
+            return False
+        try:
+            with open(os.path.join(index_dir, self.FILES[0]), 'rb') as f:
+                values = pickle.load(f)['values']
+            offsets, ids = {}, {}
+            for facet in self.FACETS:
+                offsets[facet] = np.load(os.path.join(index_dir, f"facet_{facet}_offsets.npy"), mmap_mode=mmap_mode)
+                ids[facet] = np.load(os.path.join(index_dir, f"facet_{facet}_ids.npy"), mmap_mode=mmap_mode)
+            self.values, self.offsets, self.ids = values, offsets, ids
+            return True
+        except Exception as e:
+            logger.error(f"Error loading facets: {e}")
+            return False
+
+    def is_built(self):
+        return bool(self.offsets)
+
+    def __len__(self):
+        return len(self.offsets[self.FACETS[0]]) - 1 if self.offsets else 0
+
+    def value_ids(self, facet, doc_ids):
+        """Value ids of a facet over an array of doc ids, one entry per (document, value)"""
+        offsets = self.offsets[facet]
+        starts, ends = offsets[doc_ids], offsets[doc_ids + 1]
+        lengths = ends - starts
+        # Position of every gathered entry: its document's start plus its rank within the document
+        positions = np.repeat(starts - np.cumsum(lengths) + lengths, lengths) + np.arange(lengths.sum())
+        return self.ids[facet][positions]
+
+    def counts(self, matched, limit=10):
+        """Count matched documents per facet value, keeping the top values of each facet"""
+        doc_ids = np.asarray(matched, dtype=np.int64).reshape(-1)
+        doc_ids = doc_ids[(doc_ids >= 0) & (doc_ids < len(self))]
+
+        facet_counts = {}
+        for facet in self.FACETS:
+            counts = np.bincount(self.value_ids(facet, doc_ids))
+            value_ids = np.flatnonzero(counts)
+            # Highest count first, equal counts in value order
+            top = value_ids[np.lexsort((value_ids, -counts[value_ids]))[:limit]]
+            if facet == 'year':
+                # Years read better in chronological order than by count
+                top = np.sort(top)[::-1]
+            values = self.values[facet]
+            facet_counts[facet] = [{'value': values[value_id], 'count': int(counts[value_id])} for value_id in top]
+        return facet_counts
@@ -0,0 +1,441 @@
+"""Generations of the index directory, committed atomically.
+
+    python index_store.py status
+    python index_store.py verify --generation 7
+
+Every build writes a complete index into a staging directory. Committing
+fsyncs its files, records their sizes and checksums in a manifest,
+renames the directory to gen-000007 and then points CURRENT at it with
+an atomic rename. A crash at any point leaves CURRENT on the previous
+generation, and readers, which only open the directory CURRENT names,
+see either the old or the new index and never wait for a build.
+
+A staging directory remembers the generation that was current when it
+was begun. Commits are serialized by a lock file, and a commit raises
+GenerationConflict if another one has moved CURRENT since, instead of
+silently replacing that generation's files.
+
+Readers pin the generation they load with a file in readers/ naming it,
+and collect() never removes a pinned generation, so a server loading
+files lazily keeps its generation for as long as it runs. Pins of
+processes that are gone are ignored and removed. Liveness is checked by
+pid, so readers on other hosts sharing the directory are not seen.
+
+The first open() of a generation checks the checksums of its files and
+records it in VERIFIED, later opens only compare sizes.
+"""
+import os
+import sys
+import json
+import contextlib
+import time
+import uuid
+import zlib
+import shutil
+import logging
+import argparse
+from datetime import datetime
+
+try:
+    import fcntl
+except ImportError:  # Windows, commits there are not serialized across processes
+    fcntl = None
+
+logger = logging.getLogger("IndexStore")
+
+CURRENT_FILE = "CURRENT"
+MANIFEST_FILE = "manifest.json"
+# Generation CURRENT named when a staging directory was begun, not part of the generation
+BASE_FILE = ".base"
+LOCK_FILE = ".commit.lock"
+# Newest generation whose checksums an open() has checked
+VERIFIED_FILE = "VERIFIED"
+# One pin file per reader, holding the generation it has open
+READERS_DIR = "readers"
+
+# Staging directories untouched for this long were left by a crashed build
+STALE_STAGING_SECONDS = 24 * 3600
+
+CHECKSUM_BLOCK_SIZE = 1024 * 1024
+
+# Times a writer rebases and retries a commit another commit got in before
+COMMIT_ATTEMPTS = 3
+
+
+def file_checksum(path, fsync=False):
+    """CRC-32 of a file as 8 hex digits, optionally fsyncing it while it is open"""
+    checksum = 0
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(CHECKSUM_BLOCK_SIZE), b''):
+            checksum = zlib.crc32(block, checksum)
+        if fsync:
+            os.fsync(f.fileno())
+    return f"{checksum:08x}"
+
+
+class GenerationConflict(Exception):
+    """Raised by commit when CURRENT has changed since the staging directory was begun"""
+
+
+def _fsync_directory(path):
+    """Persist renames and new entries in a directory, where the platform allows it"""
+    try:
+        fd = os.open(path, os.O_RDONLY)
+    except OSError:
+        return
+    try:
+        os.fsync(fd)
+    except OSError:
+        pass
+    finally:
+        os.close(fd)
+
+
+def _process_alive(pid):
+    """Whether a local process exists, assumed so where it can't be checked"""
+    if os.name == 'nt':
+        return True
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except OSError:
+        return True
+    return True
+
+
+def _write_durably(path, text):
+    """Write a small file under a temporary name, fsync it and rename it into place"""
+    with open(path + ".tmp", 'w', encoding='utf-8') as f:
+        f.write(text)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(path + ".tmp", path)
+
+
+class IndexStore:
+    """The committed generations of an index directory.
+
+    Generations are never modified once committed. The newest keep
+    generations and every generation a reader has pinned are kept. Directories with the files of an
+    index and no CURRENT, as written before generations, are read as is.
+    """
+
+    def __init__(self, index_dir, keep=2):
+        self.index_dir = index_dir
+        self.keep = max(keep, 1)
+
+    def path(self, generation):
+        return os.path.join(self.index_dir, f"gen-{generation:06d}")
+
+    def generation_of(self, path):
+        """Generation number of a directory open() returned, None for an index written before generations"""
+        name = os.path.basename(os.path.normpath(path))
+        return int(name[4:]) if name.startswith('gen-') and name[4:].isdigit() else None
+
+    def generations(self):
+        """Committed generation numbers, newest first"""
+        generations = []
+        if os.path.isdir(self.index_dir):
+            for name in os.listdir(self.index_dir):
+                if name.startswith('gen-') and name[4:].isdigit():
+                    generations.append(int(name[4:]))
+        return sorted(generations, reverse=True)
+
+    def current_generation(self):
+        """The generation CURRENT points at, None before the first commit"""
+        try:
+            with open(os.path.join(self.index_dir, CURRENT_FILE), 'r', encoding='utf-8') as f:
+                return int(f.read().strip())
+        except (OSError, ValueError):
+            return None
+
+    def manifest(self, generation):
+        try:
+            with open(os.path.join(self.path(generation), MANIFEST_FILE), 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def begin(self, base=None, files=None):
+        """Create a staging directory for a new generation and return its path.
+
+        With base, a directory of an earlier generation, the files of its
+        manifest (or only those named in files that exist) are hard-linked
+        into the staging directory. Linked files are shared with base, so
+        they must be replaced (written elsewhere and renamed), never
+        rewritten in place. The current generation is recorded either way,
+        commit checks it has not changed.
+        """
+        os.makedirs(self.index_dir, exist_ok=True)
+        staging = os.path.join(self.index_dir, f".staging-{uuid.uuid4().hex[:12]}")
+        os.mkdir(staging)
+        self._record_base(staging)
+        if base:
+            self._link(base, staging, files)
+        return staging
+
+    def _record_base(self, staging):
+        current = self.current_generation()
+        with open(os.path.join(staging, BASE_FILE), 'w', encoding='utf-8') as f:
+            f.write("" if current is None else f"{current}\n")
+
+    def base_generation(self, staging):
+        """The generation that was current when staging was begun or last rebased"""
+        try:
+            with open(os.path.join(staging, BASE_FILE), 'r', encoding='utf-8') as f:
+                text = f.read().strip()
+        except OSError:
+            return None
+        return int(text) if text else None
+
+    def _link(self, base, staging, files=None):
+        """Hard-link the files of base, or those named in files, into staging"""
+        names = files
+        if names is None:
+            try:
+                with open(os.path.join(base, MANIFEST_FILE), 'r', encoding='utf-8') as f:
+                    names = list(json.load(f)['files'])
+            except (OSError, ValueError, KeyError):
+                names = os.listdir(base)
+        for name in names:
+            source = os.path.join(base, name)
+            if name == MANIFEST_FILE or name.startswith('.') or not os.path.isfile(source):
+                continue
+            try:
+                os.link(source, os.path.join(staging, name))
+            except OSError:
+                shutil.copy2(source, os.path.join(staging, name))
+
+    def rebase(self, staging, files=()):
+        """Move a staging directory onto the generation that is current now.
+
+        The named files are replaced by those of the current generation,
+        for files the staging directory carries over rather than builds.
+        Returns the new base directory, None if there is none.
+        """
+        self._record_base(staging)
+        base = self.open()
+        for name in files:
+            target = os.path.join(staging, name)
+            if os.path.exists(target):
+                os.remove(target)
+        if base and files:
+            self._link(base, staging, files)
+        return base
+
+    def commit(self, staging, **info):
+        """Make a staging directory the current generation, returns the generation number.
+
+        info (document and term counts, ...) is recorded in the manifest.
+        Raises GenerationConflict, leaving staging in place to be rebased
+        or aborted, if another commit has changed CURRENT since begin.
+        """
+        base = self.base_generation(staging)
+        files = {}
+        # One pass per file checksums it and fsyncs it, all before anything is renamed
+        for name in sorted(os.listdir(staging)):
+            path = os.path.join(staging, name)
+            if name != BASE_FILE and os.path.isfile(path):
+                files[name] = {'size': os.path.getsize(path), 'crc32': file_checksum(path, fsync=True)}
+
+        with self._commit_lock():
+            current = self.current_generation()
+            if current != base:
+                raise GenerationConflict(f"index generation {current} was committed after this one was begun "
+                                         f"on {base}")
+            generation = max(self.generations() + [current or 0]) + 1
+            manifest = dict(info, generation=generation, created=datetime.now().isoformat(timespec='seconds'),
+                            files=files)
+            os.remove(os.path.join(staging, BASE_FILE))
+            _write_durably(os.path.join(staging, MANIFEST_FILE), json.dumps(manifest, indent=1))
+            _fsync_directory(staging)
+
+            os.rename(staging, self.path(generation))
+            _fsync_directory(self.index_dir)
+            _write_durably(os.path.join(self.index_dir, CURRENT_FILE), f"{generation}\n")
+            _fsync_directory(self.index_dir)
+        logger.info(f"Committed index generation {generation} with {len(files)} files")
+
+        self.collect()
+        return generation
+
+    @contextlib.contextmanager
+    def _commit_lock(self):
+        """Hold the index directory's commit lock, so checking and moving CURRENT is one step"""
+        if fcntl is None:
+            yield
+            return
+        with open(os.path.join(self.index_dir, LOCK_FILE), 'a') as f:
+            fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+
+    def abort(self, staging):
+        """Remove a staging directory that won't be committed"""
+        shutil.rmtree(staging, ignore_errors=True)
+
+    def verify(self, generation, checksums=True):
+        """Problems found in a generation, an empty list when it is intact.
+
+        Without checksums only the presence and sizes of the files are
+        checked, which costs a stat per file.
+        """
+        manifest = self.manifest(generation)
+        if manifest is None:
+            return [f"generation {generation} has no readable manifest"]
+        problems = []
+        path = self.path(generation)
+        for name, expected in manifest['files'].items():
+            file_path = os.path.join(path, name)
+            try:
+                size = os.path.getsize(file_path)
+            except OSError:
+                problems.append(f"{name} is missing")
+                continue
+            if size != expected['size']:
+                problems.append(f"{name} has {size} bytes, expected {expected['size']}")
+            elif checksums and file_checksum(file_path) != expected['crc32']:
+                problems.append(f"{name} checksum mismatch")
+        return problems
+
+    def open(self, checksums=None):
+        """Directory of the index to read: the current generation, or the newest intact one.
+
+        A damaged current generation is logged and skipped in favour of the
+        previous one, instead of failing the load. Checksums are checked on
+        the first open of a generation, True or False forces them on or off.
+        Returns index_dir itself for a directory written before
+        generations, None if there is no index.
+        """
+        current = self.current_generation()
+        if current is None:
+            legacy = any(os.path.exists(os.path.join(self.index_dir, name)) for name in ('index.pkl', 'lexicon.pkl'))
+            return self.index_dir if legacy else None
+        verified = self._verified_generation()
+        for generation in [current] + [g for g in self.generations() if g < current]:
+            full = checksums if checksums is not None else generation != verified
+            problems = self.verify(generation, full)
+            if not problems:
+                if full and generation > (verified or 0):
+                    self._record_verified(generation)
+                if generation != current:
+                    logger.warning(f"Reading index generation {generation} instead of {current}")
+                return self.path(generation)
+            logger.error(f"Index generation {generation} is damaged: {'; '.join(problems[:5])}")
+        return None
+
+    def _verified_generation(self):
+        try:
+            with open(os.path.join(self.index_dir, VERIFIED_FILE), 'r', encoding='utf-8') as f:
+                return int(f.read().strip())
+        except (OSError, ValueError):
+            return None
+
+    def _record_verified(self, generation):
+        try:
+            _write_durably(os.path.join(self.index_dir, VERIFIED_FILE), f"{generation}\n")
+        except OSError as e:
+            # A read-only index directory, the next open checks the checksums again
+            logger.warning(f"Could not record verified generation {generation}: {e}")
+
+    def pin(self, path):
+        """Keep the generation at path from being collected, returns the pin to pass to unpin.
+
+        None when there is nothing to pin (an index without generations) or
+        the generation was collected before it could be pinned, in which
+        case the caller opens the current one again.
+        """
+        generation = self.generation_of(path)
+        if generation is None:
+            return None
+        readers = os.path.join(self.index_dir, READERS_DIR)
+        os.makedirs(readers, exist_ok=True)
+        pin = os.path.join(readers, f"{os.getpid()}-{uuid.uuid4().hex[:8]}")
+        # Under the commit lock, so collect() either sees the pin or has already removed the generation
+        with self._commit_lock():
+            if not os.path.isdir(self.path(generation)):
+                return None
+            with open(pin, 'w', encoding='utf-8') as f:
+                f.write(f"{generation}\n")
+        return pin
+
+    def unpin(self, pin):
+        """Release a pin returned by pin()"""
+        if pin is not None:
+            with contextlib.suppress(OSError):
+                os.remove(pin)
+
+    def pinned_generations(self):
+        """Generations pinned by running readers, removing the pins of readers that are gone"""
+        readers = os.path.join(self.index_dir, READERS_DIR)
+        pinned = set()
+        if not os.path.isdir(readers):
+            return pinned
+        for name in os.listdir(readers):
+            path = os.path.join(readers, name)
+            pid = name.split('-', 1)[0]
+            if not pid.isdigit():
+                continue
+            if not _process_alive(int(pid)):
+                with contextlib.suppress(OSError):
+                    os.remove(path)
+                continue
+            try:
+                with open(path, 'r', encoding='utf-8') as f:
+                    pinned.add(int(f.read().strip()))
+            except (OSError, ValueError):
+                continue
+        return pinned
+
+    def collect(self):
+        """Remove unpinned generations older than the newest keep and staging directories of crashed builds"""
+        with self._commit_lock():
+            current = self.current_generation()
+            pinned = self.pinned_generations()
+            for generation in self.generations()[self.keep:]:
+                if generation != current and generation not in pinned:
+                    shutil.rmtree(self.path(generation), ignore_errors=True)
+        now = time.time()
+        for name in os.listdir(self.index_dir):
+            path = os.path.join(self.index_dir, name)
+            if name.startswith('.staging-') and now - os.path.getmtime(path) > STALE_STAGING_SECONDS:
+                shutil.rmtree(path, ignore_errors=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Inspect and verify index generations")
+    parser.add_argument('--index-dir', default='index_data')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    subparsers.add_parser('status', help="List the generations and which one is current")
+    verify_parser = subparsers.add_parser('verify', help="Check the sizes and checksums of a generation's files")
+    verify_parser.add_argument('--generation', type=int, help="Defaults to the current generation")
+    args = parser.parse_args()
+
+    store = IndexStore(args.index_dir)
+    current = store.current_generation()
+    if args.command == 'status':
+        if current is None:
+            print(f"No committed generations in {args.index_dir}")
+        for generation in store.generations():
+            manifest = store.manifest(generation) or {}
+            size = sum(entry['size'] for entry in manifest.get('files', {}).values())
+            marker = '*' if generation == current else ' '
+            print(f"{marker} {generation:6d}  {manifest.get('created', '?')}  "
+                  f"{len(manifest.get('files', {}))} files  {size / (1024 * 1024):.2f} MB")
+    elif args.command == 'verify':
+        generation = args.generation if args.generation is not None else current
+        if generation is None:
+            print(f"No committed generations in {args.index_dir}")
+            sys.exit(1)
+        problems = store.verify(generation)
+        for problem in problems:
+            print(problem)
+        print(f"Generation {generation}: {'damaged' if problems else 'intact'}")
+        sys.exit(1 if problems else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,45 +1,64 @@
 import pickle
 import os
-import re
-import nltk
+import json
+import argparse
 import logging
-from nltk.corpus import stopwords
-from nltk.stem import PorterStemmer
-from nltk.tokenize import word_tokenize
 from collections import defaultdict, Counter
+from datetime import datetime
 import math
+from analysis import Analyzer
+from similarity import SimilarityIndex
+from semantic_index import SemanticIndex
+from facets import FacetIndex
+from dates import DateIndex, normalize_publication
+from priors import StaticPriors
+from members import MemberIndex
+from expansion import ExpansionIndex
+from snippets import SnippetIndex
+from dedup import PublicationDeduplicator
+from spimi import SpimiIndexer, DiskPostings, iter_publications
+from index_store import IndexStore, GenerationConflict, COMMIT_ATTEMPTS
+from rerank import MODEL_FILE
+from query_processor import build_bm25_matrix, save_bm25_matrix
 
-# Download required NLTK resources (only first time)
-try:
-    nltk.data.find('tokenizers/punkt')
-    nltk.data.find('corpora/stopwords')
-except LookupError:
-    nltk.download('punkt')
-    nltk.download('stopwords')
-
-# Configure logging
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(levelname)s - %(message)s',
-    handlers=[
-        logging.FileHandler("index.log"),
-        logging.StreamHandler()
-    ]
-)
 logger = logging.getLogger("InvertedIndex")
 
 class InvertedIndex:
-    def __init__(self, data_dir="crawled_data", index_dir="index_data"):
+    def __init__(self, data_dir="crawled_data", index_dir="index_data", deduplicate=True,
+                 author_weight=2, keyword_weight=3, streaming=False, run_size=2_000_000):
         self.data_dir = data_dir
         self.index_dir = index_dir
+        # Streaming builds invert the crawler records in bounded memory (see build_index_streaming)
+        self.streaming = streaming
+        self.run_size = run_size
+        # How many times authors and keywords are repeated to boost them
+        self.author_weight = author_weight
+        self.keyword_weight = keyword_weight
         self.publications = []
+        self.source_documents = 0
+        self.deduplicator = PublicationDeduplicator() if deduplicate else None
         self.index = defaultdict(list)
         self.document_lengths = {}
         self.avg_document_length = 0
         self.total_documents = 0
         self.idf = {}
-        self.stemmer = PorterStemmer()
-        self.stop_words = set(stopwords.words('english'))
+        self.analyzer = Analyzer()
+        self.similarity = SimilarityIndex()
+        self.semantic = SemanticIndex()
+        self.facets = FacetIndex()
+        self.dates = DateIndex()
+        self.priors = StaticPriors()
+        self.members = MemberIndex()
+        self.expansion = ExpansionIndex()
+        self.snippets = SnippetIndex(self.analyzer)
+        # Term frequencies of publications analyzed ahead of a build, see prepare()
+        self.prepared = {}
+        # Called as progress(step, done, total) while building, may raise to abort the build
+        self.progress = None
+        # Every save commits a new generation of the index directory
+        self.store = IndexStore(index_dir)
+        # Directory the next generation is written to, see save_index()
+        self.staging = None
         
         # Create index directory if it doesn't exist
         if not os.path.exists(index_dir):
@@ -52,6 +71,16 @@ class InvertedIndex:
                 with open(f"{self.data_dir}/publications.pkl", 'rb') as f:
                     self.publications = pickle.load(f)
                 logger.info(f"Loaded {len(self.publications)} publications for indexing")
+                
+                # Older crawls store the date as shown on the portal
+                for publication in self.publications:
+                    normalize_publication(publication)
+                
+                # Collapse near-duplicates before they reach the index
+                self.source_documents = len(self.publications)
+                if self.deduplicator:
+                    self.report('dedup')
+                    self.publications = self.deduplicator.deduplicate(self.publications)
                 return True
             else:
                 logger.error(f"No publications data found at {self.data_dir}/publications.pkl")
@@ -60,30 +89,42 @@ class InvertedIndex:
             logger.error(f"Error loading publications data: {e}")
             return False
     
+    def report(self, step, done=None, total=None):
+        if self.progress:
+            self.progress(step, done, total)
+    
+    @staticmethod
+    def document_key(doc):
+        """The fields a publication's terms depend on"""
+        return (doc.get('Title'), doc.get('Abstract'), tuple(doc.get('Authors', [])), tuple(doc.get('Keywords', [])))
+    
+    def prepare(self, publications):
+        """Analyze publications before the build that will index them.
+
+        Lets a pipeline analyze crawled pages while crawling continues; the
+        build then only looks the term frequencies up. Merged duplicates
+        and publications changed since are analyzed again by the build.
+        """
+        for publication in publications:
+            self.prepared[self.document_key(publication)] = self.document_term_freqs(publication)
+    
     def preprocess_text(self, text):
         """Preprocess text for indexing"""
-        if not text:
-            return []
-        
-        # Convert to lowercase
-        text = text.lower()
-        
-        # Remove punctuation and numbers
-        text = re.sub(r'[^\w\s]', ' ', text)
-        text = re.sub(r'\d+', ' ', text)
-        
-        # Tokenize
-        tokens = word_tokenize(text)
-        
-        # Remove stop words and stem
-        tokens = [self.stemmer.stem(token) for token in tokens if token not in self.stop_words and len(token) > 2]
-        
-        return tokens
+        return self.analyzer.analyze(text)
     
     def create_document_vector(self, doc_id):
         """Create a vector representation of a document"""
         doc = self.publications[doc_id]
+        prepared = self.prepared.pop(self.document_key(doc), None) if self.prepared else None
+        term_freqs, length = prepared or self.document_term_freqs(doc)
         
+        # Store document length (number of terms)
+        self.document_lengths[doc_id] = length
+        
+        return term_freqs
+    
+    def document_term_freqs(self, doc):
+        """Return the term frequencies and length of a publication"""
         # Combine all text fields
         text = ""
         if 'Title' in doc and doc['Title']:
@@ -94,25 +135,22 @@ class InvertedIndex:
         
         # Add authors with higher weight (repeat to boost)
         for author in doc.get('Authors',[]):
-            text += author + " " + author + " "
+            text += (author + " ") * self.author_weight
         
         # Add keywords with higher weight
         for keyword in doc.get('Keywords',[]):
-            text += keyword + " " + keyword + " " + keyword + " "
+            text += (keyword + " ") * self.keyword_weight
         
         # Preprocess
         tokens = self.preprocess_text(text)
         
         # Count term frequencies
-        term_freqs = Counter(tokens)
-        
-        # Store document length (number of terms)
-        self.document_lengths[doc_id] = len(tokens)
-        
-        return term_freqs
+        return Counter(tokens), len(tokens)
     
     def build_index(self):
         """Build the inverted index from scratch"""
+        if self.streaming:
+            return self.build_index_streaming()
         if not self.load_publications():
             return False
         
@@ -124,11 +162,14 @@ class InvertedIndex:
         
         # First pass: compute document vectors and update index
         for doc_id in range(self.total_documents):
+            if doc_id % 1000 == 0:
+                self.report('index', doc_id, self.total_documents)
             term_freqs = self.create_document_vector(doc_id)
             
             # Add entries to inverted index
             for term, freq in term_freqs.items():
                 self.index[term].append((doc_id, freq))
+        self.report('index', self.total_documents, self.total_documents)
         
         # Calculate average document length
         if self.document_lengths:
@@ -141,28 +182,120 @@ class InvertedIndex:
         
         logger.info(f"Index built with {len(self.index)} terms and {self.total_documents} documents")
         
+        self.build_derived_indexes()
+        
         # Save the index
-        self.save_index()
-        return True
+        self.report('save')
+        saved = self.save_index()
+        self.prepared = {}
+        return saved
+    
+    def build_derived_indexes(self):
+        """Precompute similar publications, expansion terms, semantic embeddings and the per-document columns"""
+        self.report('similarity')
+        self.similarity.build(self.index, self.idf, self.total_documents)
+        self.expansion.build(self.index, self.idf, self.total_documents)
+        self.report('semantic')
+        self.semantic.build(self.publications)
+        self.report('columns')
+        self.facets.build(self.publications)
+        self.dates.build(self.publications)
+        self.priors.build(self.publications, self.dates.ordinals, self.data_dir)
+        self.members.build(self.publications, self.dates.ordinals, self.data_dir)
+        self.snippets.build(self.publications)
+    
+    def build_index_streaming(self):
+        """Build the index in one pass over the crawler records with bounded memory.
+
+        Postings are inverted into SPIMI runs and merged into an on-disk
+        postings file, and documents are streamed to documents.jsonl, so
+        the corpus is never held in memory. Near-duplicate detection,
+        similar publications, query expansion and the semantic index need
+        the whole corpus and are skipped.
+        """
+        logger.info("Building inverted index from streamed records...")
+        self.index = defaultdict(list)
+        self.publications = []
+        self.document_lengths = {}
+        self.facets = FacetIndex()
+        self.facets.start()
+        self.dates = DateIndex()
+        self.dates.start()
+        self.priors = StaticPriors()
+        self.priors.start(self.data_dir)
+        self.members = MemberIndex()
+        self.members.start(self.data_dir)
+        # Postings, documents and snippet offsets are written straight into the new generation
+        self.staging = self.store.begin(base=self.store.open(), files=(MODEL_FILE,))
+        self.snippets = SnippetIndex(self.analyzer)
+        self.snippets.start(spill_dir=self.staging)
+        indexer = SpimiIndexer(self.staging, run_size=self.run_size)
+        documents_path = f"{self.staging}/documents.jsonl"
+        count = 0
+        try:
+            with open(documents_path, 'w', encoding='utf-8') as documents:
+                for doc_id, publication in enumerate(iter_publications(self.data_dir)):
+                    normalize_publication(publication)
+                    term_freqs, self.document_lengths[doc_id] = self.document_term_freqs(publication)
+                    indexer.add(doc_id, term_freqs)
+                    self.facets.add(doc_id, publication)
+                    ordinal = self.dates.add(publication)
+                    self.priors.add(publication, ordinal)
+                    self.members.add(publication, ordinal)
+                    self.snippets.add(publication)
+                    documents.write(json.dumps(publication, ensure_ascii=False) + '\n')
+                    count += 1
+            if not count:
+                logger.error(f"No publications data found in {self.data_dir}")
+                indexer.finish()
+                self.store.abort(self.staging)
+                self.staging = None
+                return False
+            document_frequency = indexer.finish()
+        except Exception as e:
+            logger.error(f"Error building streaming index: {e}")
+            self.store.abort(self.staging)
+            self.staging = None
+            return False
+        
+        self.total_documents = count
+        self.source_documents = count
+        self.avg_document_length = sum(self.document_lengths.values()) / len(self.document_lengths)
+        self.idf = {term: math.log10(self.total_documents / df) for term, df in document_frequency.items()}
+        # The memory map stays valid when the staging directory is renamed on commit
+        self.index = DiskPostings(self.staging)
+        self.facets.finish()
+        self.dates.finish()
+        self.priors.finish()
+        self.members.finish()
+        self.snippets.finish()
+        logger.info(f"Index built with {len(self.index)} terms and {self.total_documents} documents")
+        
+        return self.save_index()
     
     def update_index(self):
         """Update existing index with new documents"""
+        if self.streaming:
+            # The on-disk postings are immutable, rebuild from the records instead
+            return self.build_index_streaming()
         try:
             # Load existing index
-            if os.path.exists(f"{self.index_dir}/index.pkl"):
-                with open(f"{self.index_dir}/index.pkl", 'rb') as f:
+            if self.has_index():
+                index_path = self.store.open()
+                with open(f"{index_path}/index.pkl", 'rb') as f:
                     self.index = pickle.load(f)
                 
-                with open(f"{self.index_dir}/document_lengths.pkl", 'rb') as f:
+                with open(f"{index_path}/document_lengths.pkl", 'rb') as f:
                     self.document_lengths = pickle.load(f)
                 
-                with open(f"{self.index_dir}/idf.pkl", 'rb') as f:
+                with open(f"{index_path}/idf.pkl", 'rb') as f:
                     self.idf = pickle.load(f)
                 
-                with open(f"{self.index_dir}/metadata.pkl", 'rb') as f:
+                with open(f"{index_path}/metadata.pkl", 'rb') as f:
                     metadata = pickle.load(f)
                     self.avg_document_length = metadata.get('avg_document_length', 0)
                     self.total_documents = metadata.get('total_documents', 0)
+                    self.source_documents = metadata.get('source_documents', self.total_documents)
                 
                 logger.info(f"Loaded existing index with {len(self.index)} terms and {self.total_documents} documents")
             else:
@@ -174,12 +307,19 @@ class InvertedIndex:
             if os.path.exists(f"{self.data_dir}/publications.pkl"):
                 with open(f"{self.data_dir}/publications.pkl", 'rb') as f:
                     current_pubs = pickle.load(f)
+            for publication in current_pubs:
+                normalize_publication(publication)
             
             # Check if there are new documents
-            if len(current_pubs) <= self.total_documents:
+            if len(current_pubs) <= self.source_documents:
                 logger.info("No new documents to index")
                 return True
             
+            # Merging duplicates can shift document ids, so appending is only safe without it
+            if self.deduplicator:
+                logger.info("New documents found, rebuilding deduplicated index")
+                return self.build_index()
+            
             # Update publications and index new documents
             self.publications = current_pubs
             new_docs = len(current_pubs) - self.total_documents
@@ -198,6 +338,7 @@ class InvertedIndex:
             
             # Update metadata
             self.total_documents = len(self.publications)
+            self.source_documents = len(self.publications)
             if self.document_lengths:
                 self.avg_document_length = sum(self.document_lengths.values()) / len(self.document_lengths)
             
@@ -207,63 +348,139 @@ class InvertedIndex:
             
             logger.info(f"Index updated, now contains {len(self.index)} terms and {self.total_documents} documents")
             
+            # Neighbours of existing documents may change, so recompute them all
+            self.build_derived_indexes()
+            
             # Save the updated index
-            self.save_index()
-            return True
+            self.report('save')
+            saved = self.save_index()
+            self.prepared = {}
+            return saved
             
         except Exception as e:
             logger.error(f"Error updating index: {e}")
             return False
     
+    def has_index(self):
+        """Whether an index that update_index() can add documents to has been saved"""
+        index_path = self.store.open()
+        return index_path is not None and os.path.exists(f"{index_path}/index.pkl")
+    
     def save_index(self):
-        """Save the index to disk"""
+        """Save the index to disk as a new generation of the index directory.
+
+        Nothing readers see changes until every file is written and the
+        generation is committed, so a crash or a failed save leaves the
+        previous index in place.
+        """
+        # Rerank models live in models/, one saved inside a generation by an older version carries over
+        staging = self.staging or self.store.begin(base=self.store.open(), files=(MODEL_FILE,))
+        self.staging = None
         try:
-            with open(f"{self.index_dir}/index.pkl", 'wb') as f:
-                pickle.dump(self.index, f)
+            # Streaming builds already wrote their postings and documents while indexing
+            if not isinstance(self.index, DiskPostings):
+                with open(f"{staging}/index.pkl", 'wb') as f:
+                    pickle.dump(self.index, f)
             
-            with open(f"{self.index_dir}/document_lengths.pkl", 'wb') as f:
+            with open(f"{staging}/document_lengths.pkl", 'wb') as f:
                 pickle.dump(self.document_lengths, f)
             
-            with open(f"{self.index_dir}/idf.pkl", 'wb') as f:
+            with open(f"{staging}/idf.pkl", 'wb') as f:
                 pickle.dump(self.idf, f)
             
+            # Save the indexed documents, their ids may differ from publications.pkl after deduplication
+            if not isinstance(self.index, DiskPostings):
+                with open(f"{staging}/documents.pkl", 'wb') as f:
+                    pickle.dump(self.publications, f)
+            
             # Save metadata
             metadata = {
                 'avg_document_length': self.avg_document_length,
                 'total_documents': self.total_documents,
-                'last_updated': None  # Could add timestamp here
+                'source_documents': self.source_documents,
+                'last_updated': datetime.now().isoformat(timespec='seconds')
             }
-            with open(f"{self.index_dir}/metadata.pkl", 'wb') as f:
+            with open(f"{staging}/metadata.pkl", 'wb') as f:
                 pickle.dump(metadata, f)
             
-            logger.info(f"Index saved to {self.index_dir}")
+            # Search workers map these weights read-only instead of each building them from the postings
+            matrix, term_ids = build_bm25_matrix(self.index, self.idf, self.document_lengths,
+                                                 self.avg_document_length, self.total_documents)
+            save_bm25_matrix(staging, matrix, term_ids)
+            del matrix, term_ids
+            
+            saved = [True]
+            if self.similarity.doc_term_matrix is not None:
+                saved.append(self.similarity.save(staging))
+            if self.semantic.is_loaded():
+                saved.append(self.semantic.save(staging))
+            if self.expansion.is_built():
+                saved.append(self.expansion.save(staging))
+            if self.facets.is_built():
+                saved.append(self.facets.save(staging))
+            if self.dates.is_built():
+                saved.append(self.dates.save(staging))
+            if self.priors.is_built():
+                saved.append(self.priors.save(staging))
+            if self.members.is_built():
+                saved.append(self.members.save(staging))
+            if self.snippets.is_built():
+                saved.append(self.snippets.save(staging))
+            # Lets the query engine stem without importing the stemmer
+            saved.append(self.analyzer.save(staging))
+            if not all(saved):
+                # Each part logged its own error, an incomplete generation is never committed
+                raise RuntimeError("a part of the index could not be saved")
+            
+            for attempt in range(COMMIT_ATTEMPTS):
+                try:
+                    generation = self.store.commit(staging, documents=self.total_documents, terms=len(self.index))
+                    break
+                except GenerationConflict as e:
+                    if attempt == COMMIT_ATTEMPTS - 1:
+                        raise
+                    # Everything but an older version's rerank model is built from the data, so it still stands
+                    logger.warning(f"{e}, committing on top of it")
+                    self.store.rebase(staging, files=(MODEL_FILE,))
+            logger.info(f"Index saved to {self.store.path(generation)}")
             return True
         except Exception as e:
             logger.error(f"Error saving index: {e}")
+            self.store.abort(staging)
             return False
     
     def load_index(self):
         """Load the index from disk"""
         try:
-            if os.path.exists(f"{self.index_dir}/index.pkl"):
-                with open(f"{self.index_dir}/index.pkl", 'rb') as f:
-                    self.index = pickle.load(f)
+            index_path = self.store.open()
+            if index_path is not None:
+                if os.path.exists(f"{index_path}/index.pkl"):
+                    with open(f"{index_path}/index.pkl", 'rb') as f:
+                        self.index = pickle.load(f)
+                else:
+                    self.index = DiskPostings(index_path)
                 
-                with open(f"{self.index_dir}/document_lengths.pkl", 'rb') as f:
+                with open(f"{index_path}/document_lengths.pkl", 'rb') as f:
                     self.document_lengths = pickle.load(f)
                 
-                with open(f"{self.index_dir}/idf.pkl", 'rb') as f:
+                with open(f"{index_path}/idf.pkl", 'rb') as f:
                     self.idf = pickle.load(f)
                 
-                with open(f"{self.index_dir}/metadata.pkl", 'rb') as f:
+                with open(f"{index_path}/metadata.pkl", 'rb') as f:
                     metadata = pickle.load(f)
                     self.avg_document_length = metadata.get('avg_document_length', 0)
                     self.total_documents = metadata.get('total_documents', 0)
                 
                 logger.info(f"Loaded index with {len(self.index)} terms and {self.total_documents} documents")
                 
-                # Also load publications
-                if os.path.exists(f"{self.data_dir}/publications.pkl"):
+                # Also load publications, preferring the documents stored with the index
+                if os.path.exists(f"{index_path}/documents.pkl"):
+                    with open(f"{index_path}/documents.pkl", 'rb') as f:
+                        self.publications = pickle.load(f)
+                elif os.path.exists(f"{index_path}/documents.jsonl"):
+                    with open(f"{index_path}/documents.jsonl", 'r', encoding='utf-8') as f:
+                        self.publications = [json.loads(line) for line in f if line.strip()]
+                elif os.path.exists(f"{self.data_dir}/publications.pkl"):
                     with open(f"{self.data_dir}/publications.pkl", 'rb') as f:
                         self.publications = pickle.load(f)
                 
@@ -294,10 +511,20 @@ class InvertedIndex:
 
 
 if __name__ == "__main__":
-    index_builder = InvertedIndex()
+    from log_config import configure_logging
+    configure_logging("index.log")
+    parser = argparse.ArgumentParser(description="Build or update the inverted index")
+    parser.add_argument('--streaming', action='store_true',
+                        help="Build from publications.jsonl in bounded memory with on-disk postings")
+    parser.add_argument('--run-size', type=int, default=2_000_000,
+                        help="Postings held in memory before a streaming run is flushed")
+    parser.add_argument('--rebuild', action='store_true',
+                        help="Build from scratch even if an index exists, e.g. after re-extracting publications")
+    args = parser.parse_args()
+    index_builder = InvertedIndex(streaming=args.streaming, run_size=args.run_size)
     
     # Check if index exists, update it if it does or build from scratch if not
-    if os.path.exists(f"{index_builder.index_dir}/index.pkl"):
+    if index_builder.has_index() and not args.rebuild:
         logger.info("Updating existing index...")
         index_builder.update_index()
     else:
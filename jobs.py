@@ -0,0 +1,308 @@
+import os
+import json
+import time
+import uuid
+import queue
+import logging
+import threading
+from datetime import datetime
+
+logger = logging.getLogger("Jobs")
+
+# Progress is persisted at most this often, state changes always are
+SAVE_INTERVAL = 2.0
+
+ACTIVE = ('queued', 'running')
+
+
+class JobCancelled(Exception):
+    """Raised inside a job when it has been cancelled"""
+
+
+def _time_text(timestamp):
+    return datetime.fromtimestamp(timestamp).strftime("%Y-%m-%d %H:%M:%S") if timestamp else None
+
+
+class Job:
+    """One run of a registered job kind, with per-stage progress.
+
+    Stages are reported by the job function as it goes. Several stages can
+    be active at once when the job pipelines them. A stage with a total
+    gets a fraction done and an ETA extrapolated from its rate so far.
+    """
+
+    def __init__(self, kind, params=None, job_id=None):
+        self.id = job_id or uuid.uuid4().hex[:12]
+        self.kind = kind
+        self.params = params or {}
+        self.status = 'queued'
+        self.error = None
+        self.created_at = time.time()
+        self.started_at = None
+        self.finished_at = None
+        self.stages = {}
+        self._cancel = threading.Event()
+        self._lock = threading.Lock()
+        self.on_change = None
+
+    def progress(self, stage, done=None, total=None, detail=None):
+        """Report progress of a stage, starting it on its first report"""
+        self.check_cancelled()
+        now = time.time()
+        with self._lock:
+            entry = self.stages.setdefault(stage, {'done': None, 'total': None, 'detail': None,
+                                                   'started_at': now, 'finished_at': None})
+            if done is not None:
+                entry['done'] = done
+            if total is not None:
+                entry['total'] = total
+            if detail is not None:
+                entry['detail'] = detail
+        if self.on_change:
+            self.on_change(self, False)
+
+    def finish_stage(self, stage):
+        with self._lock:
+            entry = self.stages.get(stage)
+            if entry and entry['finished_at'] is None:
+                entry['finished_at'] = time.time()
+                if entry['total'] is not None:
+                    entry['done'] = entry['total']
+        if self.on_change:
+            self.on_change(self, True)
+
+    def cancel(self):
+        self._cancel.set()
+
+    @property
+    def cancelled(self):
+        return self._cancel.is_set()
+
+    def check_cancelled(self):
+        if self._cancel.is_set():
+            raise JobCancelled(f"Job {self.id} was cancelled")
+
+    def _stage_dict(self, name, entry, now):
+        end = entry['finished_at'] or now
+        elapsed = end - entry['started_at']
+        done, total = entry['done'], entry['total']
+        fraction = eta = None
+        if total:
+            fraction = min((done or 0) / total, 1.0)
+            if done and entry['finished_at'] is None:
+                eta = round(elapsed * (total - done) / done, 1)
+        return {
+            'name': name,
+            'done': done,
+            'total': total,
+            'detail': entry['detail'],
+            'fraction': fraction,
+            'eta_seconds': eta,
+            'elapsed_seconds': round(elapsed, 1),
+            'finished': entry['finished_at'] is not None
+        }
+
+    def to_dict(self):
+        now = time.time()
+        with self._lock:
+            stages = [self._stage_dict(name, entry, now) for name, entry in self.stages.items()]
+        return {
+            'id': self.id,
+            'kind': self.kind,
+            'params': self.params,
+            'status': self.status,
+            'error': self.error,
+            'created_at': _time_text(self.created_at),
+            'started_at': _time_text(self.started_at),
+            'finished_at': _time_text(self.finished_at),
+            'elapsed_seconds': round((self.finished_at or now) - self.started_at, 1) if self.started_at else None,
+            'stages': stages
+        }
+
+    def state(self):
+        """What is persisted, enough to show the job and requeue it after a restart"""
+        with self._lock:
+            stages = {name: dict(entry) for name, entry in self.stages.items()}
+        return {'id': self.id, 'kind': self.kind, 'params': self.params, 'status': self.status,
+                'error': self.error, 'created_at': self.created_at, 'started_at': self.started_at,
+                'finished_at': self.finished_at, 'stages': stages}
+
+    @classmethod
+    def from_state(cls, state):
+        job = cls(state['kind'], state.get('params'), state['id'])
+        job.status = state.get('status', 'queued')
+        job.error = state.get('error')
+        job.created_at = state.get('created_at') or time.time()
+        job.started_at = state.get('started_at')
+        job.finished_at = state.get('finished_at')
+        job.stages = state.get('stages') or {}
+        return job
+
+
+class JobOrchestrator:
+    """Runs crawl and index jobs one at a time from a queue.
+
+    A single worker thread takes jobs in submission order, so jobs that
+    write the crawl data or the index never overlap. At most one job of a
+    kind is queued or running; submitting another returns that one.
+    Running jobs are cancelled cooperatively: they see the cancellation at
+    their next progress report. The queue and recent history are kept in
+    state_path, queued jobs are requeued after a restart and jobs that
+    were running are marked interrupted.
+    """
+
+    def __init__(self, state_path="jobs.json", history=50):
+        self.state_path = state_path
+        self.history = history
+        self.kinds = {}
+        self.jobs = {}
+        self._queue = queue.Queue()
+        self._lock = threading.Lock()
+        self._thread = None
+        self._stopping = False
+        self._saved_at = 0.0
+
+    def register(self, kind, func):
+        """Register the function run for a job kind, called as func(job, **params)"""
+        self.kinds[kind] = func
+
+    def start(self):
+        """Load the saved state and start the worker thread"""
+        with self._lock:
+            if self._thread is not None:
+                return
+            for state in self._load():
+                job = Job.from_state(state)
+                if job.status == 'running':
+                    job.status = 'interrupted'
+                    job.finished_at = job.finished_at or time.time()
+                self._track(job)
+                if job.status == 'queued' and job.kind in self.kinds:
+                    self._queue.put(job.id)
+            self._thread = threading.Thread(target=self._run, name="jobs", daemon=True)
+            self._thread.start()
+        self._save(force=True)
+
+    def submit(self, kind, **params):
+        """Queue a job, returns (job, created), created is False when one of the kind is already active"""
+        if kind not in self.kinds:
+            raise ValueError(f"Unknown job kind: {kind}")
+        with self._lock:
+            for job in self.jobs.values():
+                if job.kind == kind and job.status in ACTIVE:
+                    return job, False
+            job = Job(kind, params)
+            self._track(job)
+        self._queue.put(job.id)
+        logger.info(f"Queued {kind} job {job.id}")
+        self._save(force=True)
+        return job, True
+
+    def cancel(self, job_id):
+        """Cancel a queued or running job, False if there is no such active job"""
+        with self._lock:
+            job = self.jobs.get(job_id)
+            if job is None or job.status not in ACTIVE:
+                return False
+            job.cancel()
+            if job.status == 'queued':
+                job.status = 'cancelled'
+                job.finished_at = time.time()
+        logger.info(f"Cancelling {job.kind} job {job.id}")
+        self._save(force=True)
+        return True
+
+    def get(self, job_id):
+        return self.jobs.get(job_id)
+
+    def active(self, kind=None):
+        """The running or queued jobs, oldest first"""
+        with self._lock:
+            jobs = [job for job in self.jobs.values() if job.status in ACTIVE and kind in (None, job.kind)]
+        return sorted(jobs, key=lambda job: job.created_at)
+
+    def running(self):
+        return next((job for job in self.active() if job.status == 'running'), None)
+
+    def list(self, limit=20):
+        """Jobs newest first as dictionaries"""
+        with self._lock:
+            jobs = sorted(self.jobs.values(), key=lambda job: job.created_at, reverse=True)[:limit]
+        return [job.to_dict() for job in jobs]
+
+    def shutdown(self, timeout=5.0):
+        """Cancel the running job and stop the worker once it has finished"""
+        self._stopping = True
+        job = self.running()
+        if job:
+            job.cancel()
+        self._queue.put(None)
+        if self._thread is not None:
+            self._thread.join(timeout=timeout)
+        self._save(force=True)
+
+    def _track(self, job):
+        job.on_change = self._on_change
+        self.jobs[job.id] = job
+        # Only the newest finished jobs are kept
+        finished = sorted((j for j in self.jobs.values() if j.status not in ACTIVE), key=lambda j: j.created_at)
+        for old in finished[:max(len(finished) - self.history, 0)]:
+            del self.jobs[old.id]
+
+    def _on_change(self, job, force):
+        self._save(force=force)
+
+    def _run(self):
+        while True:
+            job_id = self._queue.get()
+            if job_id is None or self._stopping:
+                return
+            job = self.jobs.get(job_id)
+            if job is None or job.status != 'queued':
+                continue
+            self._execute(job)
+
+    def _execute(self, job):
+        job.status = 'running'
+        job.started_at = time.time()
+        self._save(force=True)
+        logger.info(f"Running {job.kind} job {job.id}")
+        try:
+            self.kinds[job.kind](job, **job.params)
+            job.check_cancelled()
+            job.status = 'succeeded'
+        except JobCancelled:
+            job.status = 'cancelled'
+        except Exception as e:
+            # A cancelled job may fail on the way out, it still counts as cancelled
+            job.status = 'cancelled' if job.cancelled else 'failed'
+            job.error = None if job.cancelled else str(e)
+            if not job.cancelled:
+                logger.exception(f"{job.kind} job {job.id} failed")
+        job.finished_at = time.time()
+        logger.info(f"{job.kind} job {job.id} {job.status} after {job.finished_at - job.started_at:.1f}s")
+        self._save(force=True)
+
+    def _load(self):
+        if not os.path.exists(self.state_path):
+            return []
+        try:
+            with open(self.state_path, 'r', encoding='utf-8') as f:
+                return json.load(f).get('jobs', [])
+        except Exception as e:
+            logger.error(f"Error loading job state: {e}")
+            return []
+
+    def _save(self, force=False):
+        now = time.monotonic()
+        if not force and now - self._saved_at < SAVE_INTERVAL:
+            return
+        with self._lock:
+            self._saved_at = now
+            states = [job.state() for job in sorted(self.jobs.values(), key=lambda job: job.created_at)]
+            try:
+                with open(self.state_path + ".tmp", 'w', encoding='utf-8') as f:
+                    json.dump({'jobs': states}, f)
+                os.replace(self.state_path + ".tmp", self.state_path)
+            except Exception as e:
+                logger.error(f"Error saving job state: {e}")
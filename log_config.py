@@ -0,0 +1,264 @@
+"""Logging setup for the entry points (app, crawler, indexer, CLIs).
+
+Library modules only create named loggers; nothing is configured at
+import time, so importing the search engine never touches log files.
+Once configured, loggers only put records on a queue, and a single
+background thread formats and writes them, so no request waits on
+console or disk I/O. Files get one JSON object per record.
+
+Also reads log files for the admin log viewer, from their end and
+following appended lines, so the cost doesn't grow with the file.
+"""
+import os
+import json
+import time
+import queue
+import atexit
+import random
+import logging
+from datetime import datetime
+from logging.handlers import RotatingFileHandler, QueueHandler, QueueListener
+
+LOG_FORMAT = '%(asctime)s - %(levelname)s - %(message)s'
+
+# Components that also write their own file, shown by the admin log viewer
+COMPONENT_LOGS = {
+    'crawler.log': ('PurePortalCrawler', 'PageArchive'),
+    'index.log': ('InvertedIndex', 'SPIMI', 'Deduplicator', 'SimilarityIndex', 'ExpansionIndex', 'SemanticIndex',
+                  'FacetIndex', 'DateIndex', 'StaticPriors', 'MemberIndex', 'SnippetIndex', 'IndexStore'),
+    'search.log': ('QueryProcessor', 'SearchPool', 'Sharding', 'Rerank')
+}
+
+# Fraction of records kept per logger, for loggers that log on every request.
+# Overridden with LOG_SAMPLING="QueryProcessor.queries=0.1,..."
+SAMPLING = {'QueryProcessor.queries': 0.01}
+
+# Log files rotate at this size, keeping LOG_BACKUPS older files (crawler.log.1, ...)
+LOG_MAX_BYTES = 10 * 1024 * 1024
+LOG_BACKUPS = 3
+
+# Bytes read at a time when tailing or following a log
+READ_BLOCK_SIZE = 64 * 1024
+
+# Attributes every LogRecord has, anything else was passed with extra= and goes into the JSON
+_RECORD_ATTRIBUTES = frozenset(logging.makeLogRecord({}).__dict__) | {'message', 'asctime', 'taskName'}
+
+_configured = False
+_listener = None
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per record with its time, level, logger, message and extra fields"""
+
+    def format(self, record):
+        entry = {
+            'time': datetime.fromtimestamp(record.created).isoformat(timespec='milliseconds'),
+            'level': record.levelname,
+            'logger': record.name,
+            'message': record.getMessage()
+        }
+        for key, value in record.__dict__.items():
+            if key not in _RECORD_ATTRIBUTES:
+                entry[key] = value
+        if record.exc_info:
+            entry['exception'] = self.formatException(record.exc_info)
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+
+class _Components(logging.Filter):
+    """Passes records of the named loggers and their children"""
+
+    def __init__(self, names):
+        super().__init__()
+        self.names = tuple(names)
+        self.prefixes = tuple(name + '.' for name in names)
+
+    def filter(self, record):
+        return record.name in self.names or record.name.startswith(self.prefixes)
+
+
+class _Sample(logging.Filter):
+    """Keeps a random fraction of the records of a logger"""
+
+    def __init__(self, rate):
+        super().__init__()
+        self.rate = rate
+
+    def filter(self, record):
+        return self.rate >= 1.0 or random.random() < self.rate
+
+
+class _EnqueueHandler(QueueHandler):
+    """Queues records as they are.
+
+    QueueHandler formats records before queueing them so they can be
+    pickled to other processes. The queue here is in-process, so
+    formatting is left to the listener thread.
+    """
+
+    def prepare(self, record):
+        return record
+
+
+def _file_handler(path):
+    return RotatingFileHandler(path, maxBytes=LOG_MAX_BYTES, backupCount=LOG_BACKUPS,
+                               encoding='utf-8', delay=True)
+
+
+def _parse_settings(text, convert):
+    """Parse "name=value,name=value" from an environment variable"""
+    settings = {}
+    for item in (text or '').split(','):
+        name, _, value = item.partition('=')
+        if name.strip() and value.strip():
+            settings[name.strip()] = convert(value.strip())
+    return settings
+
+
+def configure_logging(log_file=None, level=logging.INFO, levels=None, sampling=None):
+    """Log everything to stderr and log_file, and each component to its own file.
+
+    levels maps logger names to levels (LOG_LEVELS="Sharding=DEBUG,..."
+    adds to it) and sampling maps logger names to the fraction of their
+    records kept. Only the first call configures anything, so an entry
+    point importing another entry point keeps its own setup.
+    """
+    global _configured, _listener
+    if _configured:
+        return
+    _configured = True
+
+    console = logging.StreamHandler()
+    console.setFormatter(logging.Formatter(LOG_FORMAT))
+    handlers = [console]
+    if log_file:
+        handlers.append(_file_handler(log_file))
+    for component_file, names in COMPONENT_LOGS.items():
+        if component_file == log_file:
+            # Already written there as part of everything
+            continue
+        handler = _file_handler(component_file)
+        handler.addFilter(_Components(names))
+        handlers.append(handler)
+    for handler in handlers[1:]:
+        handler.setFormatter(JsonFormatter())
+
+    # Unbounded, so a burst is never dropped, only written a little later
+    records = queue.SimpleQueue()
+    root = logging.getLogger()
+    root.setLevel(level)
+    root.addHandler(_EnqueueHandler(records))
+
+    levels = dict(levels or {}, **_parse_settings(os.environ.get('LOG_LEVELS'), str.upper))
+    for name, component_level in levels.items():
+        logging.getLogger(name).setLevel(component_level)
+    sampling = dict(SAMPLING, **(sampling or {}), **_parse_settings(os.environ.get('LOG_SAMPLING'), float))
+    for name, rate in sampling.items():
+        # On the logger, so dropped records never reach the queue
+        logging.getLogger(name).addFilter(_Sample(rate))
+
+    _listener = QueueListener(records, *handlers, respect_handler_level=True)
+    _listener.start()
+    # Registered after logging's own exit hook, so it runs first and everything queued gets written
+    atexit.register(shutdown_logging)
+
+
+def shutdown_logging():
+    """Write every queued record and stop the writer thread.
+
+    Records logged afterwards, e.g. by later exit hooks, are written
+    directly by the same handlers.
+    """
+    global _listener
+    if _listener is None:
+        return
+    root = logging.getLogger()
+    for handler in root.handlers[:]:
+        if isinstance(handler, _EnqueueHandler):
+            root.removeHandler(handler)
+    _listener.stop()
+    for handler in _listener.handlers:
+        handler.flush()
+        root.addHandler(handler)
+    _listener = None
+
+
+def rotate_file(path, max_bytes=LOG_MAX_BYTES, backups=LOG_BACKUPS):
+    """Rotate a file written without a log handler the same way, once it reaches max_bytes"""
+    try:
+        if os.path.getsize(path) < max_bytes:
+            return False
+    except OSError:
+        return False
+    for i in range(backups - 1, 0, -1):
+        if os.path.exists(f"{path}.{i}"):
+            os.replace(f"{path}.{i}", f"{path}.{i + 1}")
+    if backups > 0:
+        os.replace(path, f"{path}.1")
+    else:
+        os.remove(path)
+    return True
+
+
+def tail_lines(path, count=500, block_size=READ_BLOCK_SIZE):
+    """Return the last count lines of a file and its size, reading blocks backwards from the end"""
+    with open(path, 'rb') as f:
+        end = f.seek(0, os.SEEK_END)
+        position = end
+        data = b''
+        # count + 1 newlines guarantee count complete lines even if the last one isn't terminated
+        while position > 0 and data.count(b'\n') <= count:
+            size = min(block_size, position)
+            position -= size
+            f.seek(position)
+            data = f.read(size) + data
+    lines = data.splitlines(keepends=True)[-count:] if count > 0 else []
+    return b''.join(lines).decode('utf-8', errors='replace'), end
+
+
+def follow(path, offset, poll_interval=0.5, heartbeat=15.0, block_size=READ_BLOCK_SIZE):
+    """Yield (offset, text) for complete lines appended to a log after offset.
+
+    When the log is rotated, what is left of the old file is read before
+    following the new one from its start. Yields (offset, '') after
+    heartbeat idle seconds, so a server can tell whether the client is
+    still there.
+    """
+    f = open(path, 'rb')
+    try:
+        if offset > os.fstat(f.fileno()).st_size:
+            # Truncated since the offset was handed out
+            offset = 0
+        f.seek(offset)
+        pending = b''
+        idle_since = time.monotonic()
+        while True:
+            data = f.read(block_size)
+            if data:
+                data = pending + data
+                end = data.rfind(b'\n') + 1
+                pending = data[end:]
+                if end:
+                    offset += end
+                    idle_since = time.monotonic()
+                    yield offset, data[:end].decode('utf-8', errors='replace')
+                continue
+
+            try:
+                current = os.stat(path)
+            except FileNotFoundError:
+                current = None
+            rotated = current is not None and current.st_ino != os.fstat(f.fileno()).st_ino
+            if rotated or (current is not None and current.st_size < offset):
+                f.close()
+                f = open(path, 'rb')
+                offset = 0
+                pending = b''
+                continue
+
+            if time.monotonic() - idle_since >= heartbeat:
+                idle_since = time.monotonic()
+                yield offset, ''
+            time.sleep(poll_interval)
+    finally:
+        f.close()
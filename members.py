@@ -0,0 +1,157 @@
+import os
+import pickle
+import logging
+from urllib.parse import urlsplit
+
+import numpy as np
+
+logger = logging.getLogger("MemberIndex")
+
+# Written by the crawler, a list of (name, profile url) pairs
+MEMBERS_FILE = "department_members.pkl"
+
+
+def profile_key(url):
+    """Comparable form of a profile url, without scheme, query, fragment or trailing slash"""
+    parts = urlsplit((url or '').strip())
+    return f"{parts.netloc.lower()}{parts.path.rstrip('/')}"
+
+
+def load_members(data_dir="."):
+    """The crawled department members as (name, profile url) pairs, [] if they were never crawled"""
+    path = os.path.join(data_dir, MEMBERS_FILE)
+    if not os.path.exists(path):
+        return []
+    try:
+        with open(path, 'rb') as f:
+            return [(str(name), str(url)) for name, url in pickle.load(f)]
+    except Exception as e:
+        logger.error(f"Error reading {path}: {e}")
+        return []
+
+
+class MemberIndex:
+    """Publications of the department members, joined on author profile links at index time.
+
+    Member ids are positions in the crawled member list. docs holds the
+    doc ids of every member's publications newest first, with
+    offsets[member_id]:offsets[member_id + 1] those of one member, and
+    bits is a membership bitset over doc ids: a bit is set when one of
+    the document's authors is a member. Listing a member's publications
+    is a slice and the members-only filter a bit test per candidate.
+    """
+
+    FILES = ('members.pkl', 'member_offsets.npy', 'member_docs.npy', 'member_bits.npy')
+
+    def __init__(self):
+        self.members = []
+        self.offsets = None
+        self.docs = None
+        self.flags = None
+
+    def build(self, publications, ordinals, data_dir="."):
+        """Join publications in doc id order against the members, ordinals come from the date column"""
+        self.start(data_dir)
+        for publication, ordinal in zip(publications, ordinals):
+            self.add(publication, ordinal)
+        return self.finish()
+
+    def start(self, data_dir="."):
+        """Begin an incremental build, documents are then passed to add() in doc id order"""
+        self.members = load_members(data_dir)
+        self._ids = {}
+        for member_id, (_, url) in enumerate(self.members):
+            self._ids.setdefault(profile_key(url), member_id)
+        self._rows = []
+        self._count = 0
+
+    def add(self, publication, ordinal):
+        """Add the next document, returns the ids of the members among its authors"""
+        links = publication.get('Author Profile Links', publication.get('author_profile_links', [])) or []
+        member_ids = list(dict.fromkeys(
+            self._ids[key] for key in map(profile_key, links) if key in self._ids
+        ))
+        for member_id in member_ids:
+            self._rows.append((member_id, self._count, ordinal))
+        self._count += 1
+        return member_ids
+
+    def finish(self):
+        rows = np.asarray(self._rows, dtype=np.int64).reshape(-1, 3)
+        member_ids, doc_ids, ordinals = rows[:, 0], rows[:, 1], rows[:, 2]
+        # By member, then newest first, same-day documents in doc id order
+        order = np.lexsort((doc_ids, -ordinals, member_ids))
+        counts = np.bincount(member_ids, minlength=len(self.members))
+        self.offsets = np.concatenate([[0], np.cumsum(counts)]).astype(np.int64)
+        self.docs = doc_ids[order].astype(np.int32)
+        self.flags = np.zeros(self._count, dtype=bool)
+        self.flags[doc_ids] = True
+        self._rows = self._ids = None
+        logger.info(f"Joined {len(self.members)} department members to {int(self.flags.sum())} "
+                    f"of {len(self.flags)} documents")
+        return True
+
+    def save(self, index_dir):
+        """Save the member list, their doc id lists and the membership bitset next to the index"""
+        try:
+            with open(os.path.join(index_dir, 'members.pkl'), 'wb') as f:
+                pickle.dump({'members': self.members, 'documents': len(self.flags)}, f)
+            arrays = (self.offsets, self.docs, np.packbits(self.flags))
+            for name, array in zip(self.FILES[1:], arrays):
+                path = os.path.join(index_dir, name)
+                with open(path + ".tmp", 'wb') as f:
+                    np.save(f, array)
+                os.replace(path + ".tmp", path)
+            logger.info(f"Member index saved to {index_dir}")
+            return True
+        except Exception as e:
+            logger.error(f"Error saving member index: {e}")
+            return False
+
+    def load(self, index_dir):
+        """Load the member index, False for indexes saved without one"""
+        if not all(os.path.exists(os.path.join(index_dir, name)) for name in self.FILES):
+            return False
+        try:
+            with open(os.path.join(index_dir, 'members.pkl'), 'rb') as f:
+                info = pickle.load(f)
+            offsets, docs, bits = (np.load(os.path.join(index_dir, name)) for name in self.FILES[1:])
+            self.members = info['members']
+            self.offsets, self.docs = offsets, docs
+            self.flags = np.unpackbits(bits, count=info['documents']).astype(bool)
+            return True
+        except Exception as e:
+            logger.error(f"Error loading member index: {e}")
+            self.members, self.offsets, self.docs, self.flags = [], None, None, None
+            return False
+
+    def is_built(self):
+        return self.flags is not None
+
+    def __len__(self):
+        return 0 if self.flags is None else len(self.flags)
+
+    def member(self, member_id):
+        """(name, profile url) of a member id, None if there is no such member"""
+        return self.members[member_id] if 0 <= member_id < len(self.members) else None
+
+    def publication_counts(self):
+        """Number of indexed publications of every member, by member id"""
+        return np.diff(self.offsets)
+
+    def doc_ids(self, member_id):
+        """Doc ids of a member's publications, newest first"""
+        if not 0 <= member_id < len(self.members):
+            return self.docs[:0]
+        return self.docs[self.offsets[member_id]:self.offsets[member_id + 1]]
+
+    def contains(self, doc_ids):
+        """Boolean mask of the doc ids with a department member among their authors"""
+        doc_ids = np.asarray(doc_ids, dtype=np.int64)
+        mask = np.zeros(len(doc_ids), dtype=bool)
+        inside = doc_ids < len(self)
+        mask[inside] = self.flags[doc_ids[inside]]
+        return mask
+
+    def is_member_document(self, doc_id):
+        return bool(self.flags[doc_id]) if doc_id < len(self) else False
@@ -0,0 +1,197 @@
+import os
+import time
+import bisect
+import threading
+from contextlib import contextmanager
+
+# Latency buckets in seconds, from 100us to 10s
+DEFAULT_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01,
+                   0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+class Histogram:
+    """Fixed-bucket histogram, cheap to update and to render in Prometheus format"""
+
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def quantile(self, q):
+        """Estimate a quantile as the upper bound of the bucket that contains it"""
+        if not self.count:
+            return 0.0
+        target = q * self.count
+        seen = 0
+        for bound, count in zip(self.buckets, self.counts):
+            seen += count
+            if seen >= target:
+                return bound
+        # Beyond the last bucket, report its bound rather than infinity
+        return self.buckets[-1]
+
+
+class _NullStage:
+    """Context manager returned when metrics are disabled, does nothing"""
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+_NULL_STAGE = _NullStage()
+
+
+class _Stage:
+    __slots__ = ('registry', 'name', 'start')
+
+    def __init__(self, registry, name):
+        self.registry = registry
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.registry.record_stage(self.name, time.perf_counter() - self.start)
+        return False
+
+
+class MetricsRegistry:
+    """Per-request stage timings and counters for the search hot path.
+
+    A request trace collects stage durations in thread-local storage and
+    is folded into the histograms when the request finishes.
+    """
+
+    def __init__(self, enabled=True):
+        self.enabled = enabled
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self.histograms = {}
+        self.counters = {}
+
+    def stage(self, name):
+        """Time a block of code as one search stage"""
+        if not self.enabled:
+            return _NULL_STAGE
+        return _Stage(self, name)
+
+    def record_stage(self, name, seconds):
+        trace = getattr(self._local, 'trace', None)
+        if trace is not None:
+            trace[name] = trace.get(name, 0.0) + seconds
+        else:
+            self.observe('search_stage_seconds', seconds, stage=name)
+
+    def increment(self, name, amount=1):
+        if not self.enabled:
+            return
+        trace = getattr(self._local, 'counts', None)
+        if trace is not None:
+            trace[name] = trace.get(name, 0) + amount
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + amount
+
+    def observe(self, name, value, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            histogram = self.histograms.get(key)
+            if histogram is None:
+                histogram = self.histograms[key] = Histogram()
+            histogram.observe(value)
+
+    def start_request(self):
+        if not self.enabled:
+            return
+        self._local.trace = {}
+        self._local.counts = {}
+        self._local.start = time.perf_counter()
+
+    def finish_request(self, endpoint='search'):
+        """Fold the current trace into the histograms and return it"""
+        trace = getattr(self._local, 'trace', None)
+        if not self.enabled or trace is None:
+            return None
+        total = time.perf_counter() - self._local.start
+        counts = self._local.counts
+        self._local.trace = None
+        self._local.counts = None
+
+        for name, seconds in trace.items():
+            self.observe('search_stage_seconds', seconds, stage=name)
+        self.observe('search_request_seconds', total, endpoint=endpoint)
+        return {'stages': trace, 'counts': counts, 'total': total}
+
+    @contextmanager
+    def request(self, endpoint='search'):
+        self.start_request()
+        try:
+            yield
+        finally:
+            self.finish_request(endpoint)
+
+    def reset(self):
+        with self._lock:
+            self.histograms = {}
+            self.counters = {}
+
+    def render_prometheus(self):
+        """Render all metrics in the Prometheus text exposition format"""
+        with self._lock:
+            histograms = sorted(self.histograms.items())
+            counters = sorted(self.counters.items())
+
+        lines = []
+        described = set()
+        for (name, labels), histogram in histograms:
+            if name not in described:
+                lines.append(f"# TYPE {name} histogram")
+                described.add(name)
+            label_text = ','.join(f'{key}="{value}"' for key, value in labels)
+            prefix = label_text + ',' if label_text else ''
+            cumulative = 0
+            for bound, count in zip(histogram.buckets, histogram.counts):
+                cumulative += count
+                lines.append(f'{name}_bucket{{{prefix}le="{bound}"}} {cumulative}')
+            lines.append(f'{name}_bucket{{{prefix}le="+Inf"}} {histogram.count}')
+            suffix = f"{{{label_text}}}" if label_text else ''
+            lines.append(f"{name}_sum{suffix} {histogram.sum}")
+            lines.append(f"{name}_count{suffix} {histogram.count}")
+        for name, value in counters:
+            lines.append(f"# TYPE {name}_total counter")
+            lines.append(f"{name}_total {value}")
+        lines.append(f"search_metrics_enabled {int(self.enabled)}")
+        return '\n'.join(lines) + '\n'
+
+    def summary(self):
+        """Per-stage count, mean and estimated percentiles in milliseconds for the admin page"""
+        with self._lock:
+            histograms = list(self.histograms.items())
+            counters = dict(self.counters)
+
+        stages = {}
+        for (name, labels), histogram in histograms:
+            label = dict(labels).get('stage') or dict(labels).get('endpoint')
+            key = label if name == 'search_stage_seconds' else f"request:{label}"
+            stages[key] = {
+                'count': histogram.count,
+                'mean_ms': round(histogram.sum / histogram.count * 1000, 3) if histogram.count else 0,
+                'p50_ms': round(histogram.quantile(0.5) * 1000, 3),
+                'p95_ms': round(histogram.quantile(0.95) * 1000, 3),
+                'p99_ms': round(histogram.quantile(0.99) * 1000, 3)
+            }
+        return {'enabled': self.enabled, 'stages': stages, 'counters': counters}
+
+
+# Shared registry, disable with SEARCH_METRICS=0
+metrics = MetricsRegistry(enabled=os.environ.get('SEARCH_METRICS', '1') != '0')
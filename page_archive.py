@@ -0,0 +1,252 @@
+"""Compressed, append-only archive of the pages the crawler fetched.
+
+    python page_archive.py list
+    python page_archive.py reextract --workers 8
+
+Pages are stored as WARC-style records, one gzip member each, in
+pages.warc.gz, with a JSON lines index of their urls and byte ranges in
+pages.idx. reextract parses the archived pages of a crawl in parallel
+and writes publications.pkl, publications.jsonl and publications.csv as
+the crawl would have, so a selector fix in extraction.py can be applied
+in seconds without crawling again.
+"""
+import os
+import csv
+import sys
+import json
+import zlib
+import uuid
+import pickle
+import logging
+import argparse
+from datetime import datetime, timezone
+from concurrent.futures import ProcessPoolExecutor
+
+from spimi import RECORDS_FILE, append_records
+from log_config import configure_logging
+
+logger = logging.getLogger("PageArchive")
+
+ARCHIVE_FILE = "pages.warc.gz"
+INDEX_FILE = "pages.idx"
+
+# Records parsed per worker task when re-extracting
+REEXTRACT_CHUNK = 16
+
+
+def _record(url, html, fetched_at, headers):
+    """A WARC/1.0 resource record holding a page's HTML"""
+    body = html.encode('utf-8')
+    lines = [
+        "WARC/1.0",
+        "WARC-Type: resource",
+        f"WARC-Record-ID: <urn:uuid:{uuid.uuid4()}>",
+        f"WARC-Date: {fetched_at}",
+        f"WARC-Target-URI: {url}",
+        "Content-Type: text/html; charset=utf-8",
+    ] + [f"X-Crawl-{name.capitalize()}: {value}" for name, value in headers.items()] + [
+        f"Content-Length: {len(body)}"
+    ]
+    return ("\r\n".join(lines) + "\r\n\r\n").encode('utf-8') + body + b"\r\n\r\n"
+
+
+def _parse_record(data):
+    """Headers and HTML of an uncompressed record"""
+    head, _, rest = data.partition(b"\r\n\r\n")
+    headers = {}
+    for line in head.decode('utf-8').split("\r\n")[1:]:
+        name, _, value = line.partition(": ")
+        headers[name] = value
+    length = int(headers.get('Content-Length', len(rest)))
+    return headers, rest[:length].decode('utf-8', errors='replace')
+
+
+class PageArchive:
+    """Append-only archive of fetched pages with a url index.
+
+    Each record is its own gzip member, so a record is read by seeking
+    to its offset and decompressing only its bytes, and the archive as
+    a whole is still a valid .warc.gz. The index is appended after the
+    record; records left out of it by a crash are recovered from the
+    archive when it is opened, and a record cut short is dropped.
+    """
+
+    def __init__(self, data_dir="."):
+        self.path = os.path.join(data_dir, ARCHIVE_FILE)
+        self.index_path = os.path.join(data_dir, INDEX_FILE)
+        self.entries = []
+        self._load_index()
+        self._recover()
+
+    def _load_index(self):
+        if not os.path.exists(self.index_path):
+            return
+        with open(self.index_path, 'r', encoding='utf-8') as f:
+            for line in f:
+                try:
+                    self.entries.append(json.loads(line))
+                except ValueError:
+                    # A line cut short by a crash, its record is recovered below
+                    break
+
+    def _recover(self):
+        """Index the complete records after the last indexed one and drop a partial last record"""
+        end = self.entries[-1]['offset'] + self.entries[-1]['length'] if self.entries else 0
+        if not os.path.exists(self.path) or os.path.getsize(self.path) == end:
+            return
+        recovered = []
+        with open(self.path, 'rb') as f:
+            f.seek(end)
+            data = f.read()
+        position = 0
+        while position < len(data):
+            decompressor = zlib.decompressobj(16 + zlib.MAX_WBITS)
+            try:
+                record = decompressor.decompress(data[position:])
+            except zlib.error:
+                break
+            if not decompressor.eof:
+                break
+            length = len(data) - position - len(decompressor.unused_data)
+            headers, _ = _parse_record(record)
+            recovered.append(self._entry(headers, end + position, length))
+            position += length
+        if end + position < os.path.getsize(self.path):
+            logger.warning(f"Dropping {os.path.getsize(self.path) - end - position} bytes of a partial record")
+            with open(self.path, 'r+b') as f:
+                f.truncate(end + position)
+        # Rewritten rather than appended, the index may end with a partial line
+        self.entries.extend(recovered)
+        with open(self.index_path + ".tmp", 'w', encoding='utf-8') as f:
+            for entry in self.entries:
+                f.write(json.dumps(entry, ensure_ascii=False) + '\n')
+        os.replace(self.index_path + ".tmp", self.index_path)
+        if recovered:
+            logger.info(f"Recovered {len(recovered)} unindexed records")
+
+    @staticmethod
+    def _entry(headers, offset, length):
+        entry = {'url': headers.get('WARC-Target-URI', ''), 'date': headers.get('WARC-Date', ''),
+                 'offset': offset, 'length': length}
+        for name, value in headers.items():
+            if name.startswith('X-Crawl-'):
+                key = name[len('X-Crawl-'):].lower()
+                entry[key] = int(value) if key == 'page' else value
+        return entry
+
+    def append(self, url, html, **headers):
+        """Archive a page, headers (crawl, kind, page) are stored with it and in the index"""
+        fetched_at = datetime.now(timezone.utc).strftime("%Y-%m-%dT%H:%M:%SZ")
+        member = zlib.compressobj(6, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+        data = member.compress(_record(url, html, fetched_at, headers)) + member.flush()
+        with open(self.path, 'ab') as f:
+            offset = f.tell()
+            f.write(data)
+        entry = dict(headers, url=url, date=fetched_at, offset=offset, length=len(data))
+        with open(self.index_path, 'a', encoding='utf-8') as f:
+            f.write(json.dumps(entry, ensure_ascii=False) + '\n')
+        self.entries.append(entry)
+        return entry
+
+    def read(self, entry):
+        """The HTML of an indexed record"""
+        return read_record(self.path, entry)
+
+    def get(self, url):
+        """The HTML of the latest archived copy of a url, None if it was never archived"""
+        for entry in reversed(self.entries):
+            if entry['url'] == url:
+                return self.read(entry)
+        return None
+
+    def crawls(self):
+        """Crawl ids in the archive, oldest first"""
+        return list(dict.fromkeys(entry.get('crawl') for entry in self.entries if entry.get('crawl')))
+
+    def pages(self, crawl=None, kind='publications'):
+        """Index entries of the pages of a kind from one crawl (the latest by default), in fetch order"""
+        if crawl is None:
+            crawls = self.crawls()
+            crawl = crawls[-1] if crawls else None
+        return [entry for entry in self.entries if entry.get('crawl') == crawl and entry.get('kind') == kind]
+
+    def __len__(self):
+        return len(self.entries)
+
+
+def read_record(path, entry):
+    with open(path, 'rb') as f:
+        f.seek(entry['offset'])
+        data = f.read(entry['length'])
+    return _parse_record(zlib.decompress(data, 16 + zlib.MAX_WBITS))[1]
+
+
+def _extract_pages(task):
+    """Worker: parse the publications of a chunk of archived pages"""
+    from extraction import parse_publications
+
+    path, entries = task
+    return [parse_publications(read_record(path, entry), entry['url']) for entry in entries]
+
+
+def reextract(data_dir=".", crawl=None, workers=None):
+    """Parse the archived pages of a crawl again and rewrite the publication files, returns the publications"""
+    archive = PageArchive(data_dir)
+    entries = archive.pages(crawl)
+    if not entries:
+        logger.error(f"No archived publication pages in {archive.path}")
+        return None
+
+    chunks = [entries[i:i + REEXTRACT_CHUNK] for i in range(0, len(entries), REEXTRACT_CHUNK)]
+    publications = []
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        # map keeps the chunks in page order
+        for pages in pool.map(_extract_pages, [(archive.path, chunk) for chunk in chunks]):
+            for page in pages:
+                publications.extend(page)
+    logger.info(f"Extracted {len(publications)} publications from {len(entries)} archived pages")
+    if not publications:
+        return publications
+
+    pkl_path = os.path.join(data_dir, "publications.pkl")
+    with open(pkl_path + ".tmp", 'wb') as f:
+        pickle.dump(publications, f)
+    os.replace(pkl_path + ".tmp", pkl_path)
+
+    records_path = os.path.join(data_dir, RECORDS_FILE)
+    open(records_path + ".tmp", 'w', encoding='utf-8').close()
+    append_records(records_path + ".tmp", publications)
+    os.replace(records_path + ".tmp", records_path)
+
+    with open(os.path.join(data_dir, "publications.csv"), "w", newline="", encoding="utf-8") as f:
+        writer = csv.DictWriter(f, fieldnames=list(publications[0].keys()))
+        writer.writeheader()
+        writer.writerows(publications)
+    logger.info(f"Publications saved to {pkl_path}")
+    return publications
+
+
+def main():
+    configure_logging("crawler.log")
+    parser = argparse.ArgumentParser(description="Inspect the page archive and re-extract publications from it")
+    parser.add_argument('--data-dir', default='.')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    subparsers.add_parser('list', help="List the archived crawls")
+    reextract_parser = subparsers.add_parser('reextract', help="Rewrite the publication files from archived pages")
+    reextract_parser.add_argument('--crawl', help="Crawl id, defaults to the latest crawl")
+    reextract_parser.add_argument('--workers', type=int, default=None, help="Parser processes, defaults to the core count")
+    args = parser.parse_args()
+
+    if args.command == 'list':
+        archive = PageArchive(args.data_dir)
+        for crawl in archive.crawls():
+            pages = archive.pages(crawl)
+            print(f"{crawl}  {len(pages)} publication pages  {pages[0]['date'] if pages else ''}")
+        print(f"{len(archive)} records, {os.path.getsize(archive.path) / (1024 * 1024) if os.path.exists(archive.path) else 0:.2f} MB")
+    elif args.command == 'reextract':
+        if reextract(args.data_dir, args.crawl, args.workers) is None:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,146 @@
+import os
+import json
+import math
+import logging
+
+import numpy as np
+
+from dates import DateIndex
+from facets import FacetIndex
+
+logger = logging.getLogger("StaticPriors")
+
+# Optional inputs read from the data directory at index time
+JOURNAL_TIERS_FILE = "journal_tiers.json"  # {"Journal name": tier}, tier 1 is the best
+CLICK_COUNTS_FILE = "click_counts.json"    # {"publication link": clicks}
+
+# Co-author counts above this earn no further prior
+COAUTHOR_CAP = 20
+
+
+def _load_json(path, default):
+    if not os.path.exists(path):
+        return default
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except Exception as e:
+        logger.error(f"Error reading {path}: {e}")
+        return default
+
+
+class StaticPriors:
+    """Query-independent document scores stored as a column next to the index.
+
+    Every document gets components in [0, 1] for recency, co-author count,
+    journal tier and click-through count. Its prior is their weighted sum,
+    so priors are in [0, 1] as well and are added to BM25 scores scaled by
+    the query processor's prior_weight.
+    """
+
+    COMPONENTS = ('recency', 'coauthors', 'journal', 'clicks')
+    WEIGHTS = {'recency': 0.5, 'coauthors': 0.1, 'journal': 0.2, 'clicks': 0.2}
+    FILES = ('priors.npy',)
+
+    def __init__(self, weights=None):
+        self.weights = dict(self.WEIGHTS, **(weights or {}))
+        self.components = None
+        self.values = None
+        self.max_value = 0.0
+
+    def build(self, publications, ordinals, data_dir="."):
+        """Compute the priors of publications in doc id order, ordinals come from the date column"""
+        self.start(data_dir)
+        for publication, ordinal in zip(publications, ordinals):
+            self.add(publication, ordinal)
+        return self.finish()
+
+    def start(self, data_dir="."):
+        """Begin an incremental build, documents are then passed to add() in doc id order"""
+        tiers = _load_json(os.path.join(data_dir, JOURNAL_TIERS_FILE), {})
+        self._tiers = {name.strip().lower(): int(tier) for name, tier in tiers.items() if int(tier) > 0}
+        self._clicks = _load_json(os.path.join(data_dir, CLICK_COUNTS_FILE), {})
+        self._ordinals = []
+        self._rows = []
+
+    def add(self, publication, ordinal):
+        authors = publication.get('Authors', publication.get('authors', []))
+        journals = FacetIndex.facet_values(publication)['journal']
+        tier = self._tiers.get(journals[0].lower()) if journals else None
+        link = publication.get('Publication Link', publication.get('url', ''))
+        self._ordinals.append(ordinal)
+        self._rows.append((
+            0.0,
+            min(math.log1p(len(authors)) / math.log1p(COAUTHOR_CAP), 1.0),
+            1.0 / tier if tier else 0.0,
+            float(self._clicks.get(link, 0))
+        ))
+
+    def finish(self):
+        components = np.asarray(self._rows, dtype=np.float32).reshape(-1, len(self.COMPONENTS))
+        components[:, 0] = DateIndex.recency(np.asarray(self._ordinals, dtype=np.int32))
+        clicks = components[:, 3]
+        if len(clicks) and clicks.max() > 0:
+            components[:, 3] = np.log1p(clicks) / np.log1p(clicks.max())
+        self._set_components(components)
+        self._rows = self._ordinals = self._tiers = self._clicks = None
+        logger.info(f"Built static priors for {len(components)} documents")
+        return True
+
+    @classmethod
+    def combine(cls, components, weights):
+        """Weighted sums of rows of components, weights by component name.
+
+        Summed column by column rather than with a matrix product, whose
+        summation order depends on the BLAS build and the row count, so a
+        shard holding some of the rows computes bit-identical priors.
+        """
+        values = np.zeros(len(components), dtype=np.float64)
+        for column, name in enumerate(cls.COMPONENTS):
+            values += components[:, column].astype(np.float64) * weights[name]
+        return values
+
+    def _set_components(self, components):
+        self.components = components
+        self.values = self.combine(components, self.weights)
+        self.max_value = float(self.values.max()) if len(self.values) else 0.0
+
+    def save(self, index_dir):
+        """Save the prior components next to the index"""
+        try:
+            path = os.path.join(index_dir, self.FILES[0])
+            with open(path + ".tmp", 'wb') as f:
+                np.save(f, self.components)
+            os.replace(path + ".tmp", path)
+            logger.info(f"Static priors saved to {index_dir}")
+            return True
+        except Exception as e:
+            logger.error(f"Error saving static priors: {e}")
+            return False
+
+    def load(self, index_dir):
+        """Load the prior components, False for indexes saved without them"""
+        path = os.path.join(index_dir, self.FILES[0])
+        if not os.path.exists(path):
+            return False
+        try:
+            self._set_components(np.load(path))
+            return True
+        except Exception as e:
+            logger.error(f"Error loading static priors: {e}")
+            self.components = self.values = None
+            return False
+
+    def is_built(self):
+        return self.values is not None
+
+    def __len__(self):
+        return 0 if self.values is None else len(self.values)
+
+    def of(self, doc_ids):
+        """Priors of an array of doc ids, 0 for ids past the column"""
+        doc_ids = np.asarray(doc_ids, dtype=np.int64)
+        priors = np.zeros(len(doc_ids), dtype=np.float64)
+        inside = doc_ids < len(self)
+        priors[inside] = self.values[doc_ids[inside]]
+        return priors
@@ -0,0 +1,145 @@
+import os
+import sys
+import json
+import time
+import logging
+import threading
+from collections import Counter, deque
+from datetime import datetime
+
+from log_config import rotate_file
+
+logger = logging.getLogger("Profiler")
+
+
+class SamplingProfiler:
+    """Samples the stacks of all other threads and writes collapsed stacks.
+
+    The output has one 'thread;outer_frame;...;inner_frame count' line per
+    distinct stack, the format flamegraph.pl and speedscope read.
+    """
+
+    def __init__(self, output_dir="profiles"):
+        self.output_dir = output_dir
+        self._lock = threading.Lock()
+        self._thread = None
+        self._stop = threading.Event()
+        self.stacks = Counter()
+        self.samples = 0
+        self.started_at = None
+        self.ends_at = None
+        self.interval = None
+        self.last_output = None
+
+    def is_running(self):
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self, duration=30.0, interval=0.005):
+        """Start sampling for duration seconds, returns False if already running"""
+        with self._lock:
+            if self.is_running():
+                return False
+            self.stacks = Counter()
+            self.samples = 0
+            self.interval = interval
+            self.started_at = time.time()
+            self.ends_at = self.started_at + duration
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name="SamplingProfiler", daemon=True)
+            self._thread.start()
+        logger.info(f"Profiler started for {duration}s at {interval * 1000:.1f}ms intervals")
+        return True
+
+    def stop(self):
+        """Stop sampling early, the collected samples are still written"""
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=5.0)
+
+    @staticmethod
+    def _frame_label(frame):
+        code = frame.f_code
+        return f"{os.path.basename(code.co_filename)}:{code.co_name}"
+
+    def _sample(self, own_id, names):
+        for thread_id, frame in sys._current_frames().items():
+            if thread_id == own_id:
+                continue
+            labels = []
+            while frame is not None:
+                labels.append(self._frame_label(frame))
+                frame = frame.f_back
+            labels.append(names.get(thread_id, f"thread-{thread_id}"))
+            self.stacks[';'.join(reversed(labels))] += 1
+        self.samples += 1
+
+    def _run(self):
+        own_id = threading.get_ident()
+        try:
+            while not self._stop.is_set() and time.time() < self.ends_at:
+                names = {thread.ident: thread.name for thread in threading.enumerate()}
+                self._sample(own_id, names)
+                self._stop.wait(self.interval)
+        finally:
+            self.ends_at = time.time()
+            self._write()
+
+    def _write(self):
+        try:
+            os.makedirs(self.output_dir, exist_ok=True)
+            path = os.path.join(self.output_dir, f"profile-{datetime.now():%Y%m%d-%H%M%S}.collapsed")
+            with open(path, 'w', encoding='utf-8') as f:
+                for stack, count in self.stacks.most_common():
+                    f.write(f"{stack} {count}\n")
+            self.last_output = path
+            logger.info(f"Profiler wrote {self.samples} samples to {path}")
+        except Exception as e:
+            logger.error(f"Error writing profile: {e}")
+
+    def status(self):
+        return {
+            'running': self.is_running(),
+            'samples': self.samples,
+            'started_at': datetime.fromtimestamp(self.started_at).strftime("%Y-%m-%d %H:%M:%S") if self.started_at else None,
+            'seconds_left': max(0.0, round(self.ends_at - time.time(), 1)) if self.is_running() else 0.0,
+            'interval_ms': self.interval * 1000 if self.interval else None,
+            'output': self.last_output
+        }
+
+
+class SlowQueryLog:
+    """Keeps queries slower than a threshold with their stage timings and postings sizes"""
+
+    def __init__(self, threshold_ms=100.0, max_entries=200, log_file="slow_queries.log"):
+        self.threshold_ms = threshold_ms
+        self.log_file = log_file
+        self.entries = deque(maxlen=max_entries)
+        self._lock = threading.Lock()
+
+    def is_slow(self, elapsed_seconds):
+        return self.threshold_ms is not None and elapsed_seconds * 1000 >= self.threshold_ms
+
+    def record(self, query, elapsed_seconds, trace=None, postings_sizes=None, params=None):
+        """Record a slow query in memory and append it to the slow query log file"""
+        entry = {
+            'time': datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+            'query': query,
+            'params': params or {},
+            'total_ms': round(elapsed_seconds * 1000, 3),
+            'stages_ms': {name: round(seconds * 1000, 3) for name, seconds in ((trace or {}).get('stages') or {}).items()},
+            'counts': (trace or {}).get('counts') or {},
+            'postings_sizes': postings_sizes or {}
+        }
+        with self._lock:
+            self.entries.append(entry)
+            try:
+                rotate_file(self.log_file)
+                with open(self.log_file, 'a', encoding='utf-8') as f:
+                    f.write(json.dumps(entry) + '\n')
+            except Exception as e:
+                logger.error(f"Error writing slow query log: {e}")
+        return entry
+
+    def recent(self, limit=50):
+        with self._lock:
+            return list(self.entries)[-limit:][::-1]
@@ -0,0 +1,124 @@
+import os
+import json
+import time
+import uuid
+import queue
+import logging
+import threading
+from datetime import datetime
+
+logger = logging.getLogger("QueryLog")
+
+
+class QueryLog:
+    """Append-only JSON lines log of searches and result clicks.
+
+    Requests only put events on a bounded queue, a background thread writes
+    them in batches, so logging never blocks a search on disk I/O. When the
+    queue is full events are dropped and counted rather than waiting.
+    """
+
+    def __init__(self, path="query_log.jsonl", batch_size=256, flush_interval=1.0, max_queue=10000):
+        self.path = path
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.events = queue.Queue(maxsize=max_queue)
+        self.stats = {'written': 0, 'dropped': 0, 'batches': 0}
+        self._thread = None
+        self._start_lock = threading.Lock()
+
+    def start(self):
+        with self._start_lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name="query-log", daemon=True)
+                self._thread.start()
+
+    def _put(self, event):
+        if self._thread is None:
+            self.start()
+        try:
+            self.events.put_nowait(event)
+        except queue.Full:
+            self.stats['dropped'] += 1
+
+    def log_query(self, query, params, results, elapsed_seconds):
+        """Log a search and its ranked results, returns the query id clicks refer to"""
+        query_id = uuid.uuid4().hex
+        self._put({
+            'type': 'query',
+            'query_id': query_id,
+            'time': datetime.now().isoformat(timespec='milliseconds'),
+            'query': query,
+            'params': params,
+            'results': [{'doc_id': result.get('doc_id'), 'url': result.get('url', '')} for result in results],
+            'elapsed_ms': round(elapsed_seconds * 1000, 3)
+        })
+        return query_id
+
+    def log_click(self, query_id, doc_id, url, rank):
+        """Log a click on the result at rank (0-based) of a logged search"""
+        self._put({
+            'type': 'click',
+            'query_id': query_id,
+            'time': datetime.now().isoformat(timespec='milliseconds'),
+            'doc_id': doc_id,
+            'url': url,
+            'rank': rank
+        })
+
+    def _write(self, batch):
+        try:
+            with open(self.path, 'a', encoding='utf-8') as f:
+                f.write(''.join(json.dumps(event, ensure_ascii=False) + '\n' for event in batch))
+            self.stats['written'] += len(batch)
+            self.stats['batches'] += 1
+        except Exception as e:
+            logger.error(f"Error writing query log: {e}")
+
+    def _run(self):
+        batch = []
+        deadline = time.monotonic() + self.flush_interval
+        while True:
+            try:
+                event = self.events.get(timeout=max(deadline - time.monotonic(), 0))
+            except queue.Empty:
+                event = None
+            stop = event is _STOP
+            if event is not None and not stop:
+                batch.append(event)
+            # Write a full batch at once, or whatever arrived within the flush interval
+            if stop or len(batch) >= self.batch_size or time.monotonic() >= deadline:
+                if batch:
+                    self._write(batch)
+                    batch = []
+                deadline = time.monotonic() + self.flush_interval
+            if stop:
+                return
+
+    def close(self, timeout=5.0):
+        """Write the queued events and stop the writer thread"""
+        if self._thread is None or not self._thread.is_alive():
+            return
+        self.events.put(_STOP)
+        self._thread.join(timeout=timeout)
+
+    def status(self):
+        return dict(self.stats, pending=self.events.qsize(), path=self.path)
+
+
+# Queued by close() to tell the writer thread to finish
+_STOP = object()
+
+
+def read_events(path):
+    """Yield the events of a query log file"""
+    if not os.path.exists(path):
+        return
+    with open(path, 'r', encoding='utf-8') as f:
+        for line in f:
+            if line.strip():
+                try:
+                    yield json.loads(line)
+                except json.JSONDecodeError:
+                    # A crash can leave a partly written last line
+                    continue
@@ -1,53 +1,131 @@
 import pickle
 import os
-import re
-import nltk
 import logging
 import math
-from nltk.corpus import stopwords
-from nltk.stem import PorterStemmer
-from nltk.tokenize import word_tokenize
-from collections import defaultdict, Counter
-import tkinter as tk
-from tkinter import ttk
-import webbrowser
-from datetime import datetime
-
-# Download required NLTK resources (only first time)
-try:
-    nltk.data.find('tokenizers/punkt')
-    nltk.data.find('corpora/stopwords')
-except LookupError:
-    nltk.download('punkt')
-    nltk.download('stopwords')
-
-# Configure logging
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(levelname)s - %(message)s',
-    handlers=[
-        logging.FileHandler("search.log"),
-        logging.StreamHandler()
-    ]
-)
+import heapq
+import json
+import weakref
+from collections import defaultdict
+import numpy as np
+from scipy import sparse
+from analysis import Analyzer, QUERY_MEMO_SIZE
+from similarity import SimilarityIndex
+from semantic_index import SemanticIndex
+from facets import FacetIndex
+from dates import DateIndex, parse_year_range
+from priors import StaticPriors
+from members import MemberIndex
+from expansion import ExpansionIndex
+from snippets import SnippetIndex, SNIPPET_CHARS
+from rerank import Reranker
+from metrics import metrics
+from spimi import DiskPostings
+from index_store import IndexStore, COMMIT_ATTEMPTS
+
 logger = logging.getLogger("QueryProcessor")
+# Records logged on every search, log_config keeps only a sample of them
+query_logger = logging.getLogger("QueryProcessor.queries")
+
+# Publications formatted per step of an export
+EXPORT_CHUNK = 1000
+
+# BM25 parameters the index build saves its weight matrix with
+BM25_K1 = 1.2  # Term frequency normalization
+BM25_B = 0.75  # Document length normalization
+
+def load_postings(index_path):
+    """The postings of an index generation, as a dict or memory-mapped for streaming builds"""
+    if os.path.exists(f"{index_path}/index.pkl"):
+        with open(f"{index_path}/index.pkl", 'rb') as f:
+            return pickle.load(f)
+    # Streaming builds keep postings on disk, decoded per term on access
+    return DiskPostings(index_path)
+
+def build_bm25_matrix(index, idf, document_lengths, avg_document_length, total_documents, k1=BM25_K1, b=BM25_B):
+    """A sparse term-by-document matrix of BM25 weights and its term ids, from the index statistics"""
+    term_ids = {}
+    blocks = []
+    for term, postings in index.items():
+        term_ids[term] = len(term_ids)
+        blocks.append(np.asarray(postings, dtype=np.int64).reshape(-1, 2))
+    lengths = np.asarray([len(block) for block in blocks], dtype=np.int64)
+    postings = np.concatenate(blocks) if blocks else np.zeros((0, 2), dtype=np.int64)
+    indices, freqs = postings[:, 0], postings[:, 1].astype(np.float64)
+    num_docs = max(total_documents, int(indices.max()) + 1 if len(indices) else 0)
+
+    doc_lengths = np.full(num_docs, avg_document_length, dtype=np.float64)
+    for doc_id, length in document_lengths.items():
+        doc_lengths[doc_id] = length
+    avg_length = avg_document_length or 1.0
+    length_norm = k1 * (1 - b + b * (doc_lengths / avg_length))
+
+    idfs = np.repeat(np.asarray([idf.get(term, 0) for term in term_ids], dtype=np.float64), lengths)
+    weights = idfs * (freqs * (k1 + 1)) / (freqs + length_norm[indices])
+    indptr = np.concatenate([[0], np.cumsum(lengths)]).astype(np.int64)
+    matrix = sparse.csr_matrix((weights, indices, indptr), shape=(len(term_ids), num_docs))
+    return matrix, term_ids
+
+def save_bm25_matrix(index_dir, matrix, term_ids, k1=BM25_K1, b=BM25_B):
+    """Write a BM25 matrix as .npy files next to the index, so query processes can mmap it"""
+    # 32-bit indices when they fit, scipy would otherwise copy mmap'd arrays to downcast
+    index_dtype = np.int32 if max(matrix.shape[1], matrix.nnz) < 2 ** 31 else np.int64
+    arrays = {
+        'bm25_data.npy': matrix.data.astype(np.float64, copy=False),
+        'bm25_indices.npy': matrix.indices.astype(index_dtype, copy=False),
+        'bm25_indptr.npy': matrix.indptr.astype(index_dtype, copy=False)
+    }
+    for name, array in arrays.items():
+        path = os.path.join(index_dir, name)
+        with open(path + ".tmp", 'wb') as f:
+            np.save(f, array)
+        os.replace(path + ".tmp", path)
+    # Written last, load_bm25_matrix takes a matrix older than the metadata as stale
+    with open(os.path.join(index_dir, "bm25_terms.pkl"), 'wb') as f:
+        pickle.dump({'term_ids': term_ids, 'k1': k1, 'b': b, 'shape': matrix.shape}, f)
+    logger.info(f"Saved BM25 matrix to {index_dir}")
 
 class QueryProcessor:
     def __init__(self, data_dir="crawled_data", index_dir="index_data"):
         self.data_dir = data_dir
         self.index_dir = index_dir
+        # Generation of the index directory that was loaded, see IndexStore
+        self.store = IndexStore(index_dir)
+        self.index_path = index_dir
+        # Released when the next generation is loaded or the processor goes away
+        self._pin = None
         self.publications = []
         self.index = defaultdict(list)
         self.document_lengths = {}
         self.avg_document_length = 0
         self.total_documents = 0
         self.idf = {}
-        self.stemmer = PorterStemmer()
-        self.stop_words = set(stopwords.words('english'))
+        # Same analysis as indexing, stems saved with the index avoid loading the stemmer
+        self.analyzer = Analyzer(memo_size=QUERY_MEMO_SIZE)
         
         # BM25 parameters
-        self.k1 = 1.2  # Term frequency normalization
-        self.b = 0.75  # Document length normalization
+        self.k1 = BM25_K1
+        self.b = BM25_B
+        # Scale of the static document priors (recency, co-authors, journal, clicks) added to BM25
+        self.prior_weight = 1.0
+        # Scale of the co-occurrence weight of terms added by query expansion
+        self.expansion_weight = 0.3
+        
+        # Term-by-document BM25 weight matrix used by search_many, built lazily
+        self.term_ids = {}
+        self.bm25_matrix = None
+        self.similarity = SimilarityIndex()
+        self.semantic = SemanticIndex()
+        self.facets = FacetIndex()
+        self.dates = DateIndex()
+        self.priors = StaticPriors()
+        self.members = MemberIndex()
+        self.expansion = ExpansionIndex()
+        self.snippets = SnippetIndex(self.analyzer)
+        # Click-trained model rescoring the top candidates, trained with rerank.py
+        self.reranker = None
+        # Largest term frequency of each term, for the score bounds used to prune ranking
+        self.max_term_freqs = {}
+        self.min_document_length = None
         
         # Load the index and publications
         self.load_data()
@@ -58,48 +136,132 @@ class QueryProcessor:
     
     def load_data(self):
         """Load the index and publications data"""
+        # Invalidate the batch scoring matrix and score bounds, they belong to the previous index
+        self.term_ids = {}
+        self.bm25_matrix = None
+        self.max_term_freqs = {}
+        self.min_document_length = None
         try:
-            # Load index
-            if os.path.exists(f"{self.index_dir}/index.pkl"):
-                with open(f"{self.index_dir}/index.pkl", 'rb') as f:
-                    self.index = pickle.load(f)
+            # Load index, all files come from the same committed generation
+            index_path = self.open_generation()
+            if index_path is not None:
+                self.index_path = index_path
+                self.index = load_postings(self.index_path)
                 
-                with open(f"{self.index_dir}/document_lengths.pkl", 'rb') as f:
+                with open(f"{self.index_path}/document_lengths.pkl", 'rb') as f:
                     self.document_lengths = pickle.load(f)
                 
-                with open(f"{self.index_dir}/idf.pkl", 'rb') as f:
+                with open(f"{self.index_path}/idf.pkl", 'rb') as f:
                     self.idf = pickle.load(f)
                 
-                with open(f"{self.index_dir}/metadata.pkl", 'rb') as f:
+                with open(f"{self.index_path}/metadata.pkl", 'rb') as f:
                     metadata = pickle.load(f)
                     self.avg_document_length = metadata.get('avg_document_length', 0)
                     self.total_documents = metadata.get('total_documents', 0)
                 
                 logger.info(f"Loaded index with {len(self.index)} terms and {self.total_documents} documents")
+                
+                self.load_optional_indexes()
             else:
                 logger.error(f"No index found at {self.index_dir}")
                 return False
+            return self.load_publications()
+        except Exception as e:
+            logger.error(f"Error loading data: {e}")
+            return False
+
+    def open_generation(self):
+        """Open the current generation and pin it for as long as it is in use, see IndexStore.pin"""
+        for _ in range(COMMIT_ATTEMPTS):
+            index_path = self.store.open()
+            pin = self.store.pin(index_path) if index_path is not None else None
+            # An index without generations has nothing to pin, otherwise retry if it was collected meanwhile
+            if pin is not None or index_path is None or self.store.generation_of(index_path) is None:
+                break
+        if self._pin is not None:
+            self._pin()
+        self._pin = weakref.finalize(self, self.store.unpin, pin)
+        return index_path
+
+    def load_optional_indexes(self):
+        """Load the stems, similarity, semantic, facet, date, prior, member, expansion and snippet indexes and the rerank model"""
+        self.analyzer.load(self.index_path)
+        # Similar publications are optional, older indexes don't have them
+        self.similarity = SimilarityIndex()
+        self.similarity.load(self.index_path)
+        self.semantic = SemanticIndex()
+        self.semantic.load(self.index_path)
+        self.facets = FacetIndex()
+        self.facets.load(self.index_path)
+        self.dates = DateIndex()
+        self.dates.load(self.index_path)
+        self.priors = StaticPriors()
+        self.priors.load(self.index_path)
+        self.members = MemberIndex()
+        self.members.load(self.index_path)
+        self.expansion = ExpansionIndex()
+        self.expansion.load(self.index_path)
+        self.snippets = SnippetIndex(self.analyzer)
+        self.snippets.load(self.index_path)
+        self.reranker = Reranker.load(self.index_dir, self.index_path)
+
+    def date_index(self):
+        """The date column, built from the publications for indexes saved without one"""
+        if len(self.dates) != len(self.publications):
+            self.dates.build(self.publications)
+        return self.dates
+
+    def facet_index(self):
+        """The facet value ids, built from the publications for indexes saved without them"""
+        if self.publications and len(self.facets) != len(self.publications):
+            self.facets.build(self.publications)
+        return self.facets
+
+    def static_priors(self):
+        """The static prior column, built from the publications for indexes saved without one"""
+        if len(self.priors) != len(self.publications):
+            self.priors.build(self.publications, self.date_index().ordinals, self.data_dir)
+        return self.priors
+
+    def member_index(self):
+        """The department member join, built from the publications for indexes saved without one"""
+        if len(self.members) != len(self.publications):
+            self.members.build(self.publications, self.date_index().ordinals, self.data_dir)
+        return self.members
+
+    def prior_scores(self, doc_ids):
+        """Weighted static priors of an array of doc ids, added to their BM25 scores"""
+        if not self.prior_weight:
+            return np.zeros(len(doc_ids))
+        return self.prior_weight * self.static_priors().of(doc_ids)
+
+    def load_publications(self):
+        """Load the publications the index doc ids refer to"""
+        # Documents stored with the index match its (possibly deduplicated) doc ids
+        pub_path = f"{self.index_path}/documents.pkl"
+        if not os.path.exists(pub_path) and os.path.exists(f"{self.index_path}/documents.jsonl"):
+            with open(f"{self.index_path}/documents.jsonl", 'r', encoding='utf-8') as f:
+                self.publications = [json.loads(line) for line in f if line.strip()]
+            logger.info(f"Loaded {len(self.publications)} publications")
+            return True
+        if not os.path.exists(pub_path):
             pub_path = f"{self.data_dir}/publications.pkl"
-            # Load publications
-            if os.path.exists(pub_path):
-                file_size = os.path.getsize(pub_path) / (1024 * 1024)
+        # Load publications
+        if os.path.exists(pub_path):
+            file_size = os.path.getsize(pub_path) / (1024 * 1024)
 
-                if file_size > 100 and self.use_partial_loading:
-                    logger.info(f"Publication file is large ({file_size:.2f} MB), using partial loading")
-                    self.load_publications_metadata(pub_path)
-                else:
-                    with open(pub_path, 'rb') as f:
-                        self.publications = pickle.load(f)
-                    logger.info(f"Loaded {len(self.publications)} publications")
-                
+            if file_size > 100 and self.use_partial_loading:
+                logger.info(f"Publication file is large ({file_size:.2f} MB), using partial loading")
+                self.load_publications_metadata(pub_path)
             else:
-                logger.error(f"No publications data found at {pub_path}")
-                return False
-            
+                with open(pub_path, 'rb') as f:
+                    self.publications = pickle.load(f)
+                logger.info(f"Loaded {len(self.publications)} publications")
             return True
-        except Exception as e:
-            logger.error(f"Error loading data: {e}")
-            return False
+
+        logger.error(f"No publications data found at {pub_path}")
+        return False
+
     def load_publications_metadata(self, path):
         """Load just essential metadata for efficient memory usage"""
         try:
@@ -125,47 +287,101 @@ class QueryProcessor:
             logger.info(f"Error loading publication metadata: {e}")
     
     def preprocess_query(self, query_text):
-        """Preprocess the query similar to document preprocessing"""
-        # Convert to lowercase
-        query_text = query_text.lower()
-        
-        # Remove punctuation and numbers
-        query_text = re.sub(r'[^\w\s]', ' ', query_text)
-        query_text = re.sub(r'\d+', ' ', query_text)
-        
-        # Tokenize
-        tokens = word_tokenize(query_text)
-        
-        # Remove stop words and stem
-        tokens = [self.stemmer.stem(token) for token in tokens if token not in self.stop_words and len(token) > 2]
-        
-        return tokens
+        """Preprocess the query the same way documents are preprocessed"""
+        return self.analyzer.analyze(query_text)
     
-    def search(self, query_text, max_results=10):
-        """Search for publications matching the query"""
+    def search(self, query_text, max_results=10, year_range=None, sort='relevance', recency_weight=0.0,
+               members_only=False, expand=False, member_id=None):
+        """Search for publications matching the query.
+
+        year_range is an inclusive (start, end) year pair, either end may be
+        None. sort='date' orders the matches newest first instead of by score,
+        recency_weight > 0 boosts recent publications and members_only keeps
+        publications with a department member among their authors, member_id
+        those of one member. expand adds the query terms' co-occurrence
+        neighbours at a lower weight.
+        """
         if not self.index or not self.publications:
             logger.error("Index or publications not loaded")
             return []
         
         # Preprocess the query
-        query_terms = self.preprocess_query(query_text)
+        with metrics.stage('preprocess'):
+            query_terms = self.preprocess_query(query_text)
         
         if not query_terms:
-            logger.info("Empty query after preprocessing")
+            query_logger.info("Empty query after preprocessing: %s", query_text)
             return []
+        scored_terms, term_weights = self.expand_query(query_terms) if expand else (query_terms, None)
+        
+        # Sort documents by score, fetching extra candidates for the rerank model
+        reranking = self.reranker is not None and sort != 'date'
+        depth = max(max_results, self.reranker.depth) if reranking else max_results
+        if year_range or sort == 'date' or recency_weight or members_only or member_id is not None:
+            ranked_docs = self.rank_by_date(scored_terms, depth, year_range, sort, recency_weight, members_only,
+                                            term_weights, member_id)
+        else:
+            ranked_docs = self.rank_bm25(scored_terms, limit=depth, term_weights=term_weights)
+        if reranking:
+            with metrics.stage('rerank'):
+                ranked_docs = self.reranker.rerank(self, query_terms, ranked_docs, max_results)
         
-        logger.info(f"Searching for: {' '.join(query_terms)}")
+        # Get the top results
+        top_results = []
+        with metrics.stage('materialize'):
+            for doc_id, score in ranked_docs:
+                if doc_id < len(self.publications):
+                    top_results.append(self._format_result(doc_id, score))
+        
+        # One sampled record per query, formatted later by the logging thread
+        query_logger.info("Found %d results for: %s", len(top_results), query_text,
+                          extra={'terms': query_terms, 'results': len(top_results)})
+        return top_results
+
+    def expansion_index(self):
+        """The expansion neighbours, computed from the postings for indexes saved without them.
+
+        Only postings held in memory are used, on-disk and sharded indexes
+        without neighbours search unexpanded.
+        """
+        if not self.expansion.is_built() and isinstance(self.index, dict) and self.index:
+            self.expansion.build(self.index, self.idf, self.total_documents)
+        return self.expansion
+
+    def expand_query(self, query_terms):
+        """The query terms followed by their expansion neighbours, and the weights of the added terms"""
+        if not self.expansion_weight:
+            return query_terms, None
+        with metrics.stage('expand'):
+            term_weights = self.expansion_index().expand(query_terms, self.expansion_weight)
+        return list(query_terms) + list(term_weights), term_weights
+
+    def term_idfs(self, query_terms, term_weights=None):
+        """(term, weighted idf) of the indexed query terms in scoring order.
+
+        Every scorer, the shard servers included, adds term contributions
+        in this order, largest idf first, so their float sums are identical.
+        term_weights scales the idf of some terms, expansion terms count
+        for less than the query's own, the others weigh 1.
+        """
+        term_weights = term_weights or {}
+        term_idfs = [(term, self.idf.get(term, 0) * term_weights.get(term, 1.0))
+                     for term in query_terms if term in self.index]
+        return sorted(term_idfs, key=lambda item: (-item[1], item[0]))
+
+    def bm25_scores(self, query_terms, term_weights=None):
+        """Calculate BM25 scores for each document matching the query terms"""
+        # Fetch the postings and IDF of every query term
+        with metrics.stage('postings'):
+            term_postings = [(idf, self.index[term]) for term, idf in self.term_idfs(query_terms, term_weights)]
+        if metrics.enabled:
+            metrics.increment('search_postings_decoded', sum(len(postings) for _, postings in term_postings))
         
-        # Calculate BM25 scores for each document
         scores = defaultdict(float)
-        
-        for term in query_terms:
-            if term in self.index:
-                # Get the IDF for this term
-                idf = self.idf.get(term, 0)
-                
+        with metrics.stage('scoring'):
+            for idf, postings in term_postings:
                 # Iterate through each document containing this term
-                for doc_id, term_freq in self.index[term]:
+                for doc_id, term_freq in postings:
                     # Get document length
                     doc_length = self.document_lengths.get(doc_id, self.avg_document_length)
                     
@@ -174,292 +390,478 @@ class QueryProcessor:
                     denominator = term_freq + self.k1 * (1 - self.b + self.b * (doc_length / self.avg_document_length))
                     scores[doc_id] += idf * (numerator / denominator)
         
-        # Sort documents by score
-        ranked_docs = sorted(scores.items(), key=lambda x: x[1], reverse=True)
+        return scores
+    
+    def rank_bm25(self, query_terms, limit=None, term_weights=None):
+        """Return (doc_id, score) pairs sorted by descending score, the top limit if given.
+
+        A document's score is its BM25 score plus its weighted static prior.
+        """
+        if limit is not None:
+            return self.rank_max_score(query_terms, limit, term_weights)
+        scores = self.bm25_scores(query_terms, term_weights)
+        with metrics.stage('topk'):
+            return self._top_scores(scores, None)
+
+    def _top_scores(self, scores, limit):
+        """Add the priors to BM25 scores and return the best (doc_id, score) pairs"""
+        if not scores:
+            return []
+        doc_ids = np.fromiter(scores.keys(), dtype=np.int64, count=len(scores))
+        values = np.fromiter(scores.values(), dtype=np.float64, count=len(scores)) + self.prior_scores(doc_ids)
+        # Equal scores in doc id order, as the shard coordinator merges them
+        order = np.lexsort((doc_ids, -values))[:limit]
+        return list(zip(doc_ids[order].tolist(), values[order].tolist()))
+
+    def _kth_score(self, scores, k):
+        """k-th best score with priors among the scored documents"""
+        doc_ids = np.fromiter(scores.keys(), dtype=np.int64, count=len(scores))
+        values = np.fromiter(scores.values(), dtype=np.float64, count=len(scores)) + self.prior_scores(doc_ids)
+        return np.partition(values, len(values) - k)[len(values) - k]
+
+    def term_upper_bound(self, term, idf):
+        """Largest BM25 contribution a term can make to any document's score"""
+        max_freq = self.max_term_freqs.get(term)
+        if max_freq is None:
+            max_freq = self.max_term_freqs[term] = max((freq for _, freq in self.index[term]), default=0)
+        if self.min_document_length is None:
+            self.min_document_length = min(self.document_lengths.values(), default=0)
+        # The shortest document gets the largest length normalization
+        avg_length = self.avg_document_length or 1.0
+        norm = self.k1 * (1 - self.b + self.b * (self.min_document_length / avg_length))
+        return idf * (max_freq * (self.k1 + 1)) / (max_freq + norm) if max_freq else 0.0
+
+    def rank_max_score(self, query_terms, limit, term_weights=None):
+        """Top limit documents by BM25 plus prior, pruning with per-term score bounds.
+
+        Terms are scored in term_idfs order, whose largest idfs also have
+        the largest upper bounds. Once the bounds
+        of the remaining terms plus the largest prior can't lift an unseen
+        document above the current k-th best score, those terms only update
+        documents that are already candidates.
+        """
+        with metrics.stage('postings'):
+            # A term's bound scales with its weight like its idf does
+            term_postings = [(term, idf, self.index[term]) for term, idf in self.term_idfs(query_terms, term_weights)]
+        if metrics.enabled:
+            metrics.increment('search_postings_decoded', sum(len(postings) for _, _, postings in term_postings))
+        if limit <= 0 or not term_postings:
+            return []
+
+        scores = {}
+        with metrics.stage('scoring'):
+            # Bounds grow with idf, so the scoring order also tries the largest bounds first
+            bounded = [(self.term_upper_bound(term, idf), idf, postings) for term, idf, postings in term_postings]
+            remaining = sum(bound for bound, _, _ in bounded)
+            max_prior = self.prior_weight * self.static_priors().max_value if self.prior_weight else 0.0
+            essential = True
+            for position, (bound, idf, postings) in enumerate(bounded):
+                if essential and len(scores) >= limit:
+                    # Candidates only gain score from here on, so the k-th best can only rise
+                    essential = remaining + max_prior >= self._kth_score(scores, limit)
+                    if not essential and metrics.enabled:
+                        metrics.increment('search_terms_pruned', len(bounded) - position)
+                remaining -= bound
+                for doc_id, term_freq in postings:
+                    if not essential and doc_id not in scores:
+                        continue
+                    doc_length = self.document_lengths.get(doc_id, self.avg_document_length)
+                    numerator = term_freq * (self.k1 + 1)
+                    denominator = term_freq + self.k1 * (1 - self.b + self.b * (doc_length / self.avg_document_length))
+                    scores[doc_id] = scores.get(doc_id, 0.0) + idf * (numerator / denominator)
+
+        with metrics.stage('topk'):
+            return self._top_scores(scores, limit)
+
+    def rank_by_date(self, query_terms, limit, year_range=None, sort='relevance', recency_weight=0.0,
+                     members_only=False, term_weights=None, member_id=None):
+        """Rank with the date column: filter to a year range or to members, boost recent documents or sort by date"""
+        doc_ids, values = self.ranked_arrays(query_terms, year_range, sort, recency_weight, members_only, term_weights,
+                                             member_id)
+        return list(zip(doc_ids[:limit].tolist(), values[:limit].tolist()))
+
+    def ranked_arrays(self, query_terms, year_range=None, sort='relevance', recency_weight=0.0, members_only=False,
+                      term_weights=None, member_id=None):
+        """Doc ids and scores of every match, best first, as arrays rather than a list of pairs"""
+        scores = self.bm25_scores(query_terms, term_weights)
+        if not scores:
+            return np.zeros(0, dtype=np.int64), np.zeros(0)
+        dates = self.date_index()
+        with metrics.stage('topk'):
+            doc_ids = np.fromiter(scores.keys(), dtype=np.int64, count=len(scores))
+            values = np.fromiter(scores.values(), dtype=np.float64, count=len(scores)) + self.prior_scores(doc_ids)
+            ordinals = dates.ordinals_of(doc_ids)
+            if year_range:
+                keep = dates.in_range(ordinals, year_range)
+                doc_ids, values, ordinals = doc_ids[keep], values[keep], ordinals[keep]
+            if members_only:
+                keep = self.member_index().contains(doc_ids)
+                doc_ids, values, ordinals = doc_ids[keep], values[keep], ordinals[keep]
+            if member_id is not None:
+                keep = np.isin(doc_ids, self.member_index().doc_ids(member_id))
+                doc_ids, values, ordinals = doc_ids[keep], values[keep], ordinals[keep]
+            if recency_weight:
+                # Recent documents keep up to (1 + weight) times their score, undated ones keep theirs
+                values = values * (1.0 + recency_weight * dates.recency(ordinals))
+            if sort == 'date':
+                # Newest first, same-day documents by score
+                order = np.lexsort((-values, -ordinals.astype(np.int64)))
+            else:
+                # Equal scores in doc id order, like rank_bm25
+                order = np.lexsort((doc_ids, -values))
+            return doc_ids[order], values[order]
+    
+    def semantic_search(self, query_text, max_results=10):
+        """Search for publications by embedding similarity instead of keywords"""
+        if not self.semantic.is_loaded() or not self.publications:
+            logger.error("Semantic index or publications not loaded")
+            return []
         
-        # Get the top results
-        top_results = []
-        for doc_id, score in ranked_docs[:max_results]:
-            if doc_id < len(self.publications):
-                result = self.publications[doc_id].copy()
-                result['score'] = score
-
-                #Normalize publication field names for consistent output
-                if 'Title' in result and 'title' not in result:
-                    result['title'] = result['Title']
-                if 'Authors' in result and 'authors' not in result:
-                    result['authors'] = result['Authors']
-                if 'Year' in result and 'year' not in result:
-                    result['year'] = result['Year']
-                if 'Abstract' in result and 'abstract' not in result:
-                    result['abstract'] = result['Abstract']
-                if 'Publication Link' in result and 'url' not in result:
-                    result['url'] = result['Publication Link']
-                if 'Keywords' in result and 'keywords' not in result:
-                    result['keywords'] = result['Keywords'] 
-                top_results.append(result)
+        results = [
+            self._format_result(doc_id, score)
+            for doc_id, score in self.semantic.search(query_text, max_results)
+            if doc_id < len(self.publications)
+        ]
+        query_logger.info("Found %d semantic results for: %s", len(results), query_text,
+                          extra={'mode': 'semantic', 'results': len(results)})
+        return results
+    
+    def hybrid_search(self, query_text, max_results=10, candidates=100, rrf_k=60):
+        """Search with BM25 and vector retrieval fused by reciprocal rank"""
+        if not self.semantic.is_loaded():
+            return self.search(query_text, max_results)
+        if not self.index or not self.publications:
+            logger.error("Index or publications not loaded")
+            return []
         
-        logger.info(f"Found {len(top_results)} results")
-        return top_results
+        query_terms = self.preprocess_query(query_text)
+        keyword_ranking = self.rank_bm25(query_terms, limit=candidates) if query_terms else []
+        vector_ranking = self.semantic.search(query_text, candidates)
+        
+        # Reciprocal rank fusion needs no score calibration between the two rankers
+        fused = defaultdict(float)
+        for ranking in (keyword_ranking, vector_ranking):
+            for rank, (doc_id, _) in enumerate(ranking):
+                fused[doc_id] += 1.0 / (rrf_k + rank + 1)
+        
+        ranked_docs = sorted(fused.items(), key=lambda x: x[1], reverse=True)
+        results = [
+            self._format_result(doc_id, score)
+            for doc_id, score in ranked_docs[:max_results]
+            if doc_id < len(self.publications)
+        ]
+        query_logger.info("Found %d hybrid results for: %s", len(results), query_text,
+                          extra={'mode': 'hybrid', 'results': len(results)})
+        return results
+    
+    def snippet_index(self):
+        """The snippet offsets, built from the publications for indexes saved without them"""
+        if len(self.snippets) != len(self.publications):
+            self.snippets.build(self.publications)
+        return self.snippets
     
-    def search_by_author(self, author_name, max_results=10):
-        """Search for publications by a specific author"""
+    def add_snippets(self, results, query_text, max_chars=SNIPPET_CHARS):
+        """Add the best abstract passage and the title and snippet highlight spans to results"""
+        snippets = self.snippet_index()
+        weights = snippets.query_weights(self.preprocess_query(query_text), self.idf) if query_text else {}
+        with metrics.stage('snippets'):
+            for result in results:
+                doc_id = result['doc_id']
+                result['snippet'] = snippets.snippet(doc_id, result.get('abstract', result.get('Abstract', '')), weights,
+                                                     max_chars)
+                result['title_highlights'] = snippets.highlights(doc_id, result.get('title', result.get('Title', '')),
+                                                                 weights)
+        return results
+    
+    def _format_result(self, doc_id, score):
+        """Copy a publication and normalize its field names for output"""
+        result = self.publications[doc_id].copy()
+        result['doc_id'] = doc_id
+        result['score'] = score
+
+        #Normalize publication field names for consistent output
+        if 'Title' in result and 'title' not in result:
+            result['title'] = result['Title']
+        if 'Authors' in result and 'authors' not in result:
+            result['authors'] = result['Authors']
+        if 'Year' in result and 'year' not in result:
+            result['year'] = result['Year']
+        if 'Abstract' in result and 'abstract' not in result:
+            result['abstract'] = result['Abstract']
+        if 'Publication Link' in result and 'url' not in result:
+            result['url'] = result['Publication Link']
+        if 'Keywords' in result and 'keywords' not in result:
+            result['keywords'] = result['Keywords']
+        return result
+
+    def build_bm25_matrix(self):
+        """Build a sparse term-by-document matrix of BM25 term weights.
+
+        Each postings list is decoded exactly once here, so scoring a batch
+        of queries becomes a single sparse matrix product.
+        """
+        self.bm25_matrix, self.term_ids = build_bm25_matrix(
+            self.index, self.idf, self.document_lengths, self.avg_document_length,
+            self.total_documents, self.k1, self.b
+        )
+        logger.info(f"Built BM25 matrix with {len(self.term_ids)} terms and {self.bm25_matrix.shape[1]} documents")
+        return self.bm25_matrix
+
+    def load_bm25_matrix(self, mmap_mode='r'):
+        """Load a saved BM25 matrix, returns False if it is missing or stale"""
+        terms_path = os.path.join(self.index_path, "bm25_terms.pkl")
+        # Metadata is written by every kind of index build, after the postings
+        index_path = os.path.join(self.index_path, "metadata.pkl")
+        if not os.path.exists(terms_path) or not os.path.exists(index_path):
+            return False
+        if os.path.getmtime(terms_path) < os.path.getmtime(index_path):
+            return False
+        try:
+            with open(terms_path, 'rb') as f:
+                saved = pickle.load(f)
+            if saved['k1'] != self.k1 or saved['b'] != self.b:
+                return False
+            data, indices, indptr = (
+                np.load(os.path.join(self.index_path, name), mmap_mode=mmap_mode)
+                for name in ('bm25_data.npy', 'bm25_indices.npy', 'bm25_indptr.npy')
+            )
+            self.bm25_matrix = sparse.csr_matrix((data, indices, indptr), shape=saved['shape'], copy=False)
+            self.term_ids = saved['term_ids']
+        except Exception as e:
+            logger.error(f"Error loading BM25 matrix: {e}")
+            return False
+        logger.info(f"Loaded BM25 matrix with {len(self.term_ids)} terms from {self.index_path}")
+        return True
+
+    def iter_search_many(self, queries, max_results=10, batch_size=256):
+        """Score many queries together, yielding (position, results) in input order.
+
+        Queries are processed in batches: each batch becomes a sparse
+        query-by-term matrix whose product with the BM25 matrix gives the
+        scores of every query at once, so terms shared by several queries
+        are only looked up once per batch.
+        """
+        if not self.index or not self.publications:
+            logger.error("Index or publications not loaded")
+            for position in range(len(queries)):
+                yield position, []
+            return
+
+        if self.bm25_matrix is None:
+            metrics.increment('bm25_matrix_cache_misses')
+            self.build_bm25_matrix()
+        else:
+            metrics.increment('bm25_matrix_cache_hits')
+
+        for start in range(0, len(queries), batch_size):
+            batch = queries[start:start + batch_size]
+
+            # Sparse query-by-term matrix, repeated terms count once per occurrence
+            rows, cols = [], []
+            batch_terms = [self.preprocess_query(query_text or '') for query_text in batch]
+            for row, query_terms in enumerate(batch_terms):
+                for term in query_terms:
+                    term_id = self.term_ids.get(term)
+                    if term_id is not None:
+                        rows.append(row)
+                        cols.append(term_id)
+            query_matrix = sparse.csr_matrix(
+                (np.ones(len(rows)), (rows, cols)),
+                shape=(len(batch), self.bm25_matrix.shape[0])
+            )
+            scores = (query_matrix @ self.bm25_matrix).tocsr()
+            depth = max(max_results, self.reranker.depth) if self.reranker is not None else max_results
+
+            for row in range(len(batch)):
+                begin, end = scores.indptr[row], scores.indptr[row + 1]
+                doc_ids = scores.indices[begin:end]
+                doc_scores = scores.data[begin:end] + self.prior_scores(doc_ids)
+
+                # Partial selection of the top results, then sort only those
+                if max_results <= 0:
+                    top = np.arange(0)
+                elif len(doc_scores) > depth:
+                    top = np.argpartition(-doc_scores, depth - 1)[:depth]
+                else:
+                    top = np.arange(len(doc_scores))
+                top = top[np.lexsort((doc_ids[top], -doc_scores[top]))]
+                ranked = list(zip(doc_ids[top].tolist(), doc_scores[top].tolist()))
+                if self.reranker is not None and ranked:
+                    with metrics.stage('rerank'):
+                        ranked = self.reranker.rerank(self, batch_terms[row], ranked, max_results)
+
+                results = [
+                    self._format_result(doc_id, score)
+                    for doc_id, score in ranked[:max_results] if doc_id < len(self.publications)
+                ]
+                yield start + row, results
+
+    def search_many(self, queries, max_results=10, batch_size=256):
+        """Search for many queries at once, returning one result list per query"""
+        logger.info(f"Batch searching {len(queries)} queries")
+        results = [[] for _ in queries]
+        for position, query_results in self.iter_search_many(queries, max_results, batch_size):
+            results[position] = query_results
+        return results
+    
+    def get_publication(self, doc_id):
+        """A publication by doc id in result form, None if there is no such document"""
+        if not 0 <= doc_id < len(self.publications):
+            return None
+        return self._format_result(doc_id, 0.0)
+    
+    def find_similar(self, doc_id, max_results=10):
+        """Return publications most similar to the given document"""
+        if not self.publications:
+            logger.error("Publications not loaded")
+            return []
+        
+        return [
+            self._format_result(similar_id, score)
+            for similar_id, score in self.similarity.get_similar(doc_id, max_results)
+            if similar_id < len(self.publications)
+        ]
+    
+    def matching_doc_ids(self, query_text):
+        """Sorted array of every document containing at least one query term"""
+        blocks = []
+        for term in set(self.preprocess_query(query_text)):
+            term_id = self.term_ids.get(term) if self.bm25_matrix is not None else None
+            if term_id is not None:
+                # The matrix row already holds the term's doc ids as an array
+                indptr = self.bm25_matrix.indptr
+                blocks.append(self.bm25_matrix.indices[indptr[term_id]:indptr[term_id + 1]])
+            else:
+                postings = self.index.get(term, [])
+                blocks.append(np.fromiter((doc_id for doc_id, _ in postings), dtype=np.int64, count=len(postings)))
+        if not blocks:
+            return np.zeros(0, dtype=np.int64)
+        return np.unique(np.concatenate(blocks).astype(np.int64, copy=False))
+
+    def postings_sizes(self, query_text):
+        """Return the postings list length of every query term"""
+        return {term: len(self.index.get(term, [])) for term in self.preprocess_query(query_text)}
+
+    def facet_counts(self, doc_ids, limit=10):
+        """Count the matched documents per year, author and journal"""
+        facets = self.facet_index()
+        if not facets.is_built():
+            return {}
+        return facets.counts(doc_ids, limit=limit)
+    
+    def search_by_author(self, author_name, max_results=10, year_range=None, members_only=False):
+        """Search for publications by a specific author, most recent first"""
         if not self.publications:
             logger.error("Publications not loaded")
             return []
         
         author_name = author_name.lower()
-        results = []
+        dates = self.date_index()
+        members = self.member_index()
+        matches = []
         
         for doc_id, pub in enumerate(self.publications):
+            if members_only and not members.is_member_document(doc_id):
+                continue
             for pub_author in pub.get('authors',pub.get('Authors',[])):
                 if author_name in pub_author.lower():
-                    result = pub.copy()
-                    result['score'] = 1.0  # Default score for author matches
-
-                    if 'Title' in result and 'title' not in result:
-                        result['title'] = result['Title']
-                    if 'Authors' in result and 'authors' not in result:
-                        result['authors'] = result['Authors']
-                    if 'Year' in result and 'year' not in result:
-                        result['year'] = result['Year']
-                    if 'Abstract' in result and 'abstract' not in result:
-                        result['abstract'] = result['Abstract']
-                    if 'Publication Link' in result and 'url' not in result:
-                        result['url'] = result['Publication Link']
-                    if 'Keywords' in result and 'keywords' not in result:
-                        result['keywords'] = result['Keywords'] 
-                    results.append(result)
+                    if not year_range or dates.contains(doc_id, year_range):
+                        matches.append(doc_id)
                     break
         
-        # Sort by year (most recent first)
-        results.sort(key=lambda x: x.get('year', 0) if 'Year' in x else x.get('year', 0), reverse=True)
-        
-        return results[:max_results]
+        # Sort by date (most recent first), undated publications last
+        matches = heapq.nlargest(max_results, matches, key=lambda doc_id: (dates.ordinal(doc_id), -doc_id))
+        return [self._format_result(doc_id, 1.0) for doc_id in matches]  # Default score for author matches
     
-    def search_by_year(self, year, max_results=10):
-        """Search for publications from a specific year"""
+    def search_by_year(self, year, max_results=10, members_only=False):
+        """Search for publications from a year or a (start, end) year range, most recent first"""
         if not self.publications:
             logger.error("Publications not loaded")
             return []
         
         try:
-            year = int(year)
-            results = []
-            
-            for doc_id, pub in enumerate(self.publications):
-                if pub.get('year', pub.get('Year')) == year:
-                    result = pub.copy()
-                    result['score'] = 1.0  # Default score for year matches
-
-                    if 'Title' in result and 'title' not in result:
-                        result['title'] = result['Title']
-                    if 'Authors' in result and 'authors' not in result:
-                        result['authors'] = result['Authors']
-                    if 'Year' in result and 'year' not in result:
-                        result['year'] = result['Year']
-                    if 'Abstract' in result and 'abstract' not in result:
-                        result['abstract'] = result['Abstract']
-                    if 'Publication Link' in result and 'url' not in result:
-                        result['url'] = result['Publication Link']
-                    if 'Keywords' in result and 'keywords' not in result:
-                        result['keywords'] = result['Keywords'] 
-                    results.append(result)
-            
-            return results[:max_results]
+            year_range = year if isinstance(year, tuple) else parse_year_range(year)
         except ValueError:
             logger.error(f"Invalid year format: {year}")
             return []
-
-
-class SearchUI:
-    def __init__(self, root):
-        self.root = root
-        self.root.title("CU Economics Publications Search")
-        self.root.geometry("1000x600")
-        
-        self.query_processor = QueryProcessor()
-        
-        # Create UI elements
-        self.create_ui()
-    
-    def create_ui(self):
-        """Create the UI elements"""
-        # Frame for the search bar and buttons
-        search_frame = ttk.Frame(self.root, padding="10")
-        search_frame.pack(fill=tk.X)
-        
-        # Search bar
-        ttk.Label(search_frame, text="Search:").grid(column=0, row=0, sticky=tk.W, padx=5)
-        self.search_entry = ttk.Entry(search_frame, width=50)
-        self.search_entry.grid(column=1, row=0, sticky=(tk.W, tk.E), padx=5)
-        self.search_entry.bind("<Return>", self.on_search)
-        
-        # Search button
-        search_button = ttk.Button(search_frame, text="Search", command=self.on_search)
-        search_button.grid(column=2, row=0, padx=5)
-        
-        # Advanced search options
-        ttk.Label(search_frame, text="Filter:").grid(column=0, row=1, sticky=tk.W, padx=5, pady=5)
         
-        # Author filter
-        ttk.Label(search_frame, text="Author:").grid(column=1, row=1, sticky=tk.W, padx=5, pady=5)
-        self.author_entry = ttk.Entry(search_frame, width=20)
-        self.author_entry.grid(column=1, row=1, sticky=(tk.W, tk.E), padx=(50, 5), pady=5)
-        
-        # Year filter
-        ttk.Label(search_frame, text="Year:").grid(column=2, row=1, sticky=tk.W, padx=5, pady=5)
-        self.year_entry = ttk.Entry(search_frame, width=10)
-        self.year_entry.grid(column=2, row=1, sticky=(tk.W, tk.E), padx=(40, 5), pady=5)
-        
-        # Results frame
-        results_frame = ttk.Frame(self.root, padding="10")
-        results_frame.pack(fill=tk.BOTH, expand=True)
-        
-        # Results count
-        self.results_count = ttk.Label(results_frame, text="Enter a search query to begin")
-        self.results_count.pack(anchor=tk.W, pady=(0, 10))
-        
-        # Results list with scrollbar
-        self.results_tree = ttk.Treeview(results_frame, columns=("title", "authors", "year"), show="headings")
-        self.results_tree.heading("title", text="Title")
-        self.results_tree.heading("authors", text="Authors")
-        self.results_tree.heading("year", text="Year")
-        
-        self.results_tree.column("title", width=400, anchor=tk.W)
-        self.results_tree.column("authors", width=300, anchor=tk.W)
-        self.results_tree.column("year", width=70, anchor=tk.CENTER)
-        
-        scrollbar = ttk.Scrollbar(results_frame, orient=tk.VERTICAL, command=self.results_tree.yview)
-        self.results_tree.configure(yscrollcommand=scrollbar.set)
-        
-        self.results_tree.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
-        scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
-        
-        # Bind double-click event to open publication
-        self.results_tree.bind("<Double-1>", self.on_result_double_click)
-        
-        # Details frame
-        self.details_frame = ttk.LabelFrame(self.root, text="Publication Details", padding="10")
-        self.details_frame.pack(fill=tk.X, padx=10, pady=10)
-        
-        # Initially hide the details
-        self.details_title = ttk.Label(self.details_frame, text="", wraplength=980)
-        self.details_title.pack(anchor=tk.W, pady=2)
-        
-        self.details_authors = ttk.Label(self.details_frame, text="")
-        self.details_authors.pack(anchor=tk.W, pady=2)
-        
-        self.details_year = ttk.Label(self.details_frame, text="")
-        self.details_year.pack(anchor=tk.W, pady=2)
-        
-        self.details_abstract = ttk.Label(self.details_frame, text="", wraplength=980)
-        self.details_abstract.pack(anchor=tk.W, pady=2)
-        
-        # Link buttons frame
-        self.links_frame = ttk.Frame(self.details_frame)
-        self.links_frame.pack(anchor=tk.W, pady=5)
-        
-        self.pub_link_button = ttk.Button(self.links_frame, text="Open Publication Page", state=tk.DISABLED)
-        self.pub_link_button.pack(side=tk.LEFT, padx=5)
-        
-        # Status bar
-        self.status_bar = ttk.Label(self.root, text=f"Ready | Index contains {self.query_processor.total_documents} publications", relief=tk.SUNKEN, anchor=tk.W)
-        self.status_bar.pack(side=tk.BOTTOM, fill=tk.X)
-    
-    def on_search(self, event=None):
-        """Handle search button click or Enter key"""
-        query = self.search_entry.get().strip()
-        author = self.author_entry.get().strip()
-        year = self.year_entry.get().strip()
-        
-        # Clear existing results
-        for i in self.results_tree.get_children():
-            self.results_tree.delete(i)
-        
-        # Clear details
-        self.clear_details()
-        
-        if not query and not author and not year:
-            self.results_count.config(text="Please enter a search query, author name, or year")
-            return
-        
-        # Perform the search
-        results = []
-        
-        if query:
-            results = self.query_processor.search(query)
-        elif author:
-            results = self.query_processor.search_by_author(author)
-        elif year:
-            results = self.query_processor.search_by_year(year)
-        
-        # Filter results if multiple criteria
-        if author and (query or year):
-            results = [r for r in results if any(author.lower() in a.lower() for a in r['authors'])]
-        
-        if year and (query or author):
-            try:
-                year_int = int(year)
-                results = [r for r in results if r.get('year') == year_int]
-            except ValueError:
-                pass
-        
-        # Update results count
-        self.results_count.config(text=f"Found {len(results)} publications")
-        
-        # Populate the results tree
-        self.search_results = results  # Store for later use
-        
-        for i, result in enumerate(results):
-            title = result.get('title', 'No title')
-            authors = ', '.join(result.get('authors', ['Unknown']))
-            year = result.get('year', '')
-            
-            self.results_tree.insert('', tk.END, iid=str(i), values=(title, authors, year))
-        
-        # Update status
-        self.status_bar.config(text=f"Search completed | {len(results)} results found")
+        doc_ids = self.date_index().doc_ids_between(year_range)
+        if members_only:
+            doc_ids = doc_ids[self.member_index().contains(doc_ids)]
+        doc_ids = doc_ids[:max_results]
+        return [
+            self._format_result(doc_id, 1.0)  # Default score for year matches
+            for doc_id in doc_ids.tolist()
+            if doc_id < len(self.publications)
+        ]
+
     
-    def on_result_double_click(self, event):
-        """Handle double-click on a result"""
-        selected_item = self.results_tree.selection()
-        if not selected_item:
+    def iter_export(self, query_text='', year_range=None, sort='relevance', recency_weight=0.0,
+                    members_only=False, member_id=None, expand=False, chunk_size=EXPORT_CHUNK):
+        """Yield every matching publication in result form, best first, or newest first without a query.
+
+        Only the ranked doc ids and scores are held as arrays; publications
+        are formatted a chunk at a time as the caller consumes them, so an
+        export of the whole corpus never builds its results in memory.
+        """
+        if not self.publications:
+            logger.error("Publications not loaded")
             return
-        
-        # Get the selected result
-        result_index = int(selected_item[0])
-        if result_index < len(self.search_results):
-            result = self.search_results[result_index]
-            self.display_details(result)
-    
-    def display_details(self, publication):
-        """Display publication details"""
-        # Update labels
-        self.details_title.config(text=f"Title: {publication.get('title', 'No title')}")
-        self.details_authors.config(text=f"Authors: {', '.join(publication.get('authors', ['Unknown']))}")
-        self.details_year.config(text=f"Year: {publication.get('year', 'Unknown')}")
-        
-        abstract = publication.get('abstract', 'No abstract available')
-        self.details_abstract.config(text=f"Abstract: {abstract}")
-        
-        # Update link button
-        pub_url = publication.get('url')
-        if pub_url:
-            self.pub_link_button.config(state=tk.NORMAL, command=lambda: webbrowser.open(pub_url))
+        if query_text:
+            query_terms = self.preprocess_query(query_text)
+            if not query_terms:
+                return
+            scored_terms, term_weights = self.expand_query(query_terms) if expand else (query_terms, None)
+            doc_ids, scores = self.ranked_arrays(scored_terms, year_range, sort, recency_weight, members_only,
+                                                 term_weights, member_id)
         else:
-            self.pub_link_button.config(state=tk.DISABLED)
+            dates = self.date_index()
+            if member_id is not None:
+                doc_ids = self.member_index().doc_ids(member_id)
+                if year_range:
+                    doc_ids = doc_ids[dates.in_range(dates.ordinals_of(doc_ids), year_range)]
+            elif year_range:
+                doc_ids = dates.doc_ids_between(year_range)
+            else:
+                # Undated publications sort first, so they come last here
+                doc_ids = dates.order[::-1]
+            if members_only:
+                doc_ids = doc_ids[self.member_index().contains(doc_ids)]
+            scores = None
+        
+        for start in range(0, len(doc_ids), chunk_size):
+            chunk = doc_ids[start:start + chunk_size].tolist()
+            chunk_scores = scores[start:start + chunk_size].tolist() if scores is not None else [1.0] * len(chunk)
+            for doc_id, score in zip(chunk, chunk_scores):
+                if doc_id < len(self.publications):
+                    yield self._format_result(doc_id, score)
+    
+    def department_members(self):
+        """Every department member with their id and number of indexed publications"""
+        members = self.member_index()
+        counts = members.publication_counts().tolist()
+        return [
+            {'member_id': member_id, 'name': name, 'profile_url': url, 'publications': count}
+            for member_id, ((name, url), count) in enumerate(zip(members.members, counts))
+        ]
     
-    def clear_details(self):
-        """Clear publication details"""
-        self.details_title.config(text="")
-        self.details_authors.config(text="")
-        self.details_year.config(text="")
-        self.details_abstract.config(text="")
-        self.pub_link_button.config(state=tk.DISABLED)
+    def member_publications(self, member_id, max_results=10, year_range=None):
+        """Publications of a department member, most recent first, None if there is no such member"""
+        members = self.member_index()
+        if members.member(member_id) is None:
+            return None
+        doc_ids = members.doc_ids(member_id)
+        if year_range:
+            dates = self.date_index()
+            doc_ids = doc_ids[dates.in_range(dates.ordinals_of(doc_ids), year_range)]
+        return [
+            self._format_result(doc_id, 1.0)  # Default score for member listings
+            for doc_id in doc_ids[:max_results].tolist()
+            if doc_id < len(self.publications)
+        ]
 
 
 if __name__ == "__main__":
-    root = tk.Tk()
-    app = SearchUI(root)
-    root.mainloop()
\ No newline at end of file
+    # The desktop search window lives in search_ui.py
+    from search_ui import main
+    main()
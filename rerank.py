@@ -0,0 +1,265 @@
+"""Learning-to-rank from the query and click log.
+
+    python rerank.py train --log query_log.jsonl --model linear
+    python rerank.py clicks --log query_log.jsonl
+
+train fits a small model on clicked versus skipped results and saves it
+in the models directory of the index, named after the index generation
+it was trained on, where QueryProcessor picks up the newest to rerank
+the BM25 top-N. Models live outside the generations, so training never
+commits a generation and never causes one a server has open to be
+collected. clicks writes the click counts the static priors read at the
+next index build.
+"""
+import os
+import sys
+import json
+import pickle
+import logging
+import argparse
+from bisect import bisect_left
+from collections import Counter, defaultdict
+from datetime import datetime
+
+import numpy as np
+
+from priors import CLICK_COUNTS_FILE, StaticPriors
+from query_log import read_events
+from log_config import configure_logging
+
+logger = logging.getLogger("Rerank")
+
+# Models trained before they were kept outside the generations
+MODEL_FILE = "rerank_model.pkl"
+MODELS_DIR = "models"
+# Older models kept after training, readers load theirs into memory
+KEEP_MODELS = 3
+
+
+def model_path(index_dir, generation):
+    """Path of the model trained on an index generation, 0 for an index without generations"""
+    return os.path.join(index_dir, MODELS_DIR, f"rerank-{generation or 0:06d}.pkl")
+
+
+def saved_models(index_dir):
+    """Paths of the saved models, the one trained on the newest generation first"""
+    directory = os.path.join(index_dir, MODELS_DIR)
+    if not os.path.isdir(directory):
+        return []
+    names = [name for name in os.listdir(directory) if name.startswith('rerank-') and name.endswith('.pkl')]
+    return [os.path.join(directory, name) for name in sorted(names, reverse=True)]
+
+
+def term_frequencies(index, query_terms, doc_ids):
+    """Term-by-candidate matrix of term frequencies, read from the sorted postings by binary search"""
+    frequencies = np.zeros((len(query_terms), len(doc_ids)), dtype=np.float64)
+    for row, term in enumerate(query_terms):
+        postings = index.get(term)
+        if not postings:
+            continue
+        for column, doc_id in enumerate(doc_ids):
+            position = bisect_left(postings, (doc_id,))
+            if position < len(postings) and postings[position][0] == doc_id:
+                frequencies[row, column] = postings[position][1]
+    return frequencies
+
+
+class Reranker:
+    """Rescores the top-N candidates of a ranking with a model trained on clicks"""
+
+    FEATURES = ('score', 'bm25', 'prior') + StaticPriors.COMPONENTS + (
+        'log_length', 'coverage', 'max_term_weight', 'reciprocal_rank')
+
+    def __init__(self, model, depth=50):
+        self.model = model
+        # Only this many candidates are rescored, which bounds the added latency
+        self.depth = depth
+
+    def features(self, processor, query_terms, ranked):
+        """Feature matrix of ranked (doc_id, score) candidates, one row per candidate"""
+        doc_ids = np.fromiter((doc_id for doc_id, _ in ranked), dtype=np.int64, count=len(ranked))
+        scores = np.fromiter((score for _, score in ranked), dtype=np.float64, count=len(ranked))
+        priors = processor.prior_scores(doc_ids)
+
+        static = processor.static_priors()
+        components = np.zeros((len(doc_ids), len(StaticPriors.COMPONENTS)))
+        inside = doc_ids < len(static)
+        components[inside] = static.components[doc_ids[inside]]
+
+        avg_length = processor.avg_document_length or 1.0
+        lengths = np.fromiter((processor.document_lengths.get(doc_id, avg_length) for doc_id in doc_ids.tolist()),
+                              dtype=np.float64, count=len(doc_ids))
+        terms = list(dict.fromkeys(query_terms))
+        frequencies = term_frequencies(processor.index, terms, doc_ids.tolist())
+        idfs = np.asarray([processor.idf.get(term, 0) for term in terms], dtype=np.float64)[:, None]
+        norm = processor.k1 * (1 - processor.b + processor.b * (lengths / avg_length))
+        weights = idfs * frequencies * (processor.k1 + 1) / (frequencies + norm)
+
+        return np.column_stack([
+            scores,
+            scores - priors,
+            priors,
+            components,
+            np.log1p(lengths),
+            (frequencies > 0).mean(axis=0) if terms else np.zeros(len(doc_ids)),
+            weights.max(axis=0) if terms else np.zeros(len(doc_ids)),
+            1.0 / (np.arange(len(doc_ids)) + 1)
+        ])
+
+    def rerank(self, processor, query_terms, ranked, limit):
+        """Reorder the ranked candidates by model score, returning the top limit"""
+        if len(ranked) < 2:
+            return ranked[:limit]
+        model_scores = self.model.decision_function(self.features(processor, query_terms, ranked))
+        # Stable, so candidates the model can't tell apart keep their first-stage order
+        order = np.argsort(-model_scores, kind='stable')[:limit]
+        return [(ranked[i][0], float(model_scores[i])) for i in order.tolist()]
+
+    def save(self, path, **info):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # Written under a temporary name and renamed, a reader never sees half a model
+        with open(path + ".tmp", 'wb') as f:
+            pickle.dump(dict(info, model=self.model, depth=self.depth, features=self.FEATURES), f)
+        os.replace(path + ".tmp", path)
+
+    @classmethod
+    def load(cls, index_dir, index_path=None):
+        """Load the newest rerank model, None if there is none or it used other features.
+
+        index_path is the generation being read, for a model saved inside
+        it by an older version.
+        """
+        paths = saved_models(index_dir)
+        if not paths and index_path is not None:
+            paths = [os.path.join(index_path, MODEL_FILE)]
+        if not paths or not os.path.exists(paths[0]):
+            return None
+        try:
+            with open(paths[0], 'rb') as f:
+                saved = pickle.load(f)
+        except Exception as e:
+            logger.error(f"Error loading rerank model: {e}")
+            return None
+        if tuple(saved.get('features', ())) != cls.FEATURES:
+            logger.warning("Rerank model was trained on different features, retrain it")
+            return None
+        logger.info(f"Loaded rerank model trained on {saved.get('queries', '?')} queries")
+        return cls(saved['model'], saved.get('depth', 50))
+
+
+def clicked_searches(events):
+    """Pair every logged search that got clicks with the set of clicked urls"""
+    searches = {}
+    clicks = defaultdict(set)
+    for event in events:
+        if event.get('type') == 'query' and event.get('query'):
+            searches[event['query_id']] = event
+        elif event.get('type') == 'click' and event.get('url'):
+            clicks[event['query_id']].add(event['url'])
+    return [(searches[query_id], urls) for query_id, urls in clicks.items() if query_id in searches]
+
+
+def click_counts(events):
+    """Clicks per publication url"""
+    return Counter(event['url'] for event in events if event.get('type') == 'click' and event.get('url'))
+
+
+def write_click_counts(events, data_dir="."):
+    """Write the click counts the static priors read at the next index build"""
+    counts = click_counts(events)
+    path = os.path.join(data_dir, CLICK_COUNTS_FILE)
+    with open(path + ".tmp", 'w', encoding='utf-8') as f:
+        json.dump(counts, f)
+    os.replace(path + ".tmp", path)
+    logger.info(f"Wrote click counts for {len(counts)} publications to {path}")
+    return counts
+
+
+def training_data(processor, searches, depth=50):
+    """Features and click labels of the current top-depth candidates of each clicked search"""
+    extractor = Reranker(None, depth)
+    features, labels = [], []
+    for search, clicked in searches:
+        query_terms = processor.preprocess_query(search['query'])
+        if not query_terms:
+            continue
+        ranked = processor.rank_bm25(query_terms, limit=depth)
+        urls = [processor.publications[doc_id].get('Publication Link', '') if doc_id < len(processor.publications) else ''
+                for doc_id, _ in ranked]
+        search_labels = [url in clicked for url in urls]
+        # Searches whose clicked results are no longer retrieved teach nothing
+        if not any(search_labels) or all(search_labels):
+            continue
+        features.append(extractor.features(processor, query_terms, ranked))
+        labels.extend(search_labels)
+    if not features:
+        return None, None
+    return np.vstack(features), np.asarray(labels, dtype=np.int8)
+
+
+def make_model(kind='linear'):
+    if kind == 'gbdt':
+        from sklearn.ensemble import GradientBoostingClassifier
+        return GradientBoostingClassifier(n_estimators=100, max_depth=3, learning_rate=0.1)
+    from sklearn.linear_model import LogisticRegression
+    from sklearn.pipeline import make_pipeline
+    from sklearn.preprocessing import StandardScaler
+    return make_pipeline(StandardScaler(), LogisticRegression(class_weight='balanced', max_iter=1000))
+
+
+def train(log_path, data_dir=".", index_dir="index_data", kind='linear', depth=50):
+    """Train a rerank model from the query log and save it with the index"""
+    from query_processor import QueryProcessor
+
+    events = list(read_events(log_path))
+    write_click_counts(events, data_dir)
+    searches = clicked_searches(events)
+    logger.info(f"Read {len(events)} events, {len(searches)} searches with clicks")
+
+    processor = QueryProcessor(data_dir=data_dir, index_dir=index_dir)
+    # Features are extracted from the first-stage ranking, never from a previous model
+    processor.reranker = None
+    features, labels = training_data(processor, searches, depth)
+    if features is None:
+        logger.error("No searches with clicks on retrieved results, nothing to train on")
+        return None
+
+    model = make_model(kind)
+    model.fit(features, labels)
+    reranker = Reranker(model, depth)
+    # Saved beside the generations, named after the one it was trained on
+    generation = processor.store.generation_of(processor.index_path)
+    path = model_path(index_dir, generation)
+    reranker.save(path, queries=len(searches), kind=kind, generation=generation,
+                  trained_at=datetime.now().isoformat())
+    for old_path in saved_models(index_dir)[KEEP_MODELS:]:
+        os.remove(old_path)
+    logger.info(f"Saved rerank model to {path}")
+    logger.info(f"Trained {kind} rerank model on {len(labels)} candidates, {int(labels.sum())} clicked")
+    return reranker
+
+
+def main():
+    configure_logging()
+    parser = argparse.ArgumentParser(description="Train the click rerank model")
+    parser.add_argument('--log', default='query_log.jsonl')
+    parser.add_argument('--data-dir', default='.')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    train_parser = subparsers.add_parser('train', help="Train and save a rerank model")
+    train_parser.add_argument('--index-dir', default='index_data')
+    train_parser.add_argument('--model', choices=('linear', 'gbdt'), default='linear')
+    train_parser.add_argument('--depth', type=int, default=50, help="Candidates rescored per query")
+
+    subparsers.add_parser('clicks', help="Only write the click counts used by the static priors")
+    args = parser.parse_args()
+
+    if args.command == 'train':
+        if train(args.log, args.data_dir, args.index_dir, args.model, args.depth) is None:
+            sys.exit(1)
+    elif args.command == 'clicks':
+        write_click_counts(read_events(args.log), args.data_dir)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,168 @@
+import os
+import time
+import asyncio
+import logging
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+
+from index_store import IndexStore
+
+logger = logging.getLogger("SearchPool")
+
+
+class Overloaded(Exception):
+    """Raised when too many searches are already queued"""
+
+
+class DeadlineExceeded(Exception):
+    """Raised when a search does not finish before its deadline"""
+
+
+# Per-worker query processor, created by the pool initializer
+_processor = None
+
+
+def _init_worker(data_dir, index_dir):
+    """Load the index in a worker, every worker holds its own copy of what isn't memory-mapped"""
+    global _processor
+    from query_processor import QueryProcessor
+    from metrics import metrics
+
+    # Stage timings are recorded by the serving process, not the workers
+    metrics.enabled = False
+    _processor = QueryProcessor(data_dir=data_dir, index_dir=index_dir)
+
+
+def _ensure_bm25_matrix():
+    """Map the BM25 matrix the index build saved, read-only.
+
+    Committed generations are never written to: for one saved without a
+    matrix, or with other BM25 parameters, the worker builds its own in
+    memory.
+    """
+    if _processor.bm25_matrix is None and not _processor.load_bm25_matrix():
+        logger.warning(f"No BM25 matrix saved in {_processor.index_path}, building one per worker")
+        _processor.build_bm25_matrix()
+    return _processor.bm25_matrix.shape
+
+
+def _run_search(query, mode, max_results, with_facets, with_snippets, deadline):
+    """Worker: score one query, skipped when it waited in the queue past its deadline"""
+    if time.time() > deadline:
+        return None
+    if mode == 'semantic':
+        results = _processor.semantic_search(query, max_results)
+    elif mode == 'hybrid':
+        results = _processor.hybrid_search(query, max_results)
+    else:
+        _ensure_bm25_matrix()
+        results = _processor.search_many([query], max_results)[0]
+    if with_snippets:
+        _processor.add_snippets(results, query)
+
+    facets = {}
+    if with_facets:
+        facets = _processor.facet_counts(_processor.matching_doc_ids(query))
+    return {'results': results, 'facets': facets}
+
+
+class SearchPool:
+    """Runs searches in worker processes so scoring never holds the server's GIL.
+
+    Workers map the BM25 matrix the index build saved, so its pages are
+    shared through the page cache, as are the postings of streaming builds.
+    Everything else a QueryProcessor loads (pickled postings, publications,
+    the optional indexes) is a private copy per worker, so memory grows by
+    roughly one index per worker. At most max_pending searches are admitted
+    at once, and each one has a deadline after which the caller gets
+    DeadlineExceeded instead of waiting.
+    """
+
+    def __init__(self, data_dir=".", index_dir="index_data", workers=None, max_pending=None, timeout=2.0):
+        self.data_dir = data_dir
+        self.index_dir = index_dir
+        self.workers = workers or max(2, (os.cpu_count() or 2) // 2)
+        self.max_pending = max_pending or self.workers * 4
+        self.timeout = timeout
+        self.executor = None
+        self.store = IndexStore(index_dir)
+        self.generation = None
+        self.checked_at = 0.0
+        self.reloading = False
+        self.pending = 0
+        self.stats = {'completed': 0, 'rejected': 0, 'timeouts': 0, 'errors': 0, 'reloads': 0}
+
+    def start(self):
+        """Start the worker processes and map the BM25 matrix before taking traffic"""
+        # Spawned workers don't inherit the web server's threads and locks
+        context = multiprocessing.get_context('spawn')
+        executor = ProcessPoolExecutor(max_workers=self.workers, mp_context=context,
+                                       initializer=_init_worker, initargs=(self.data_dir, self.index_dir))
+        self.generation = self.store.current_generation()
+        try:
+            shape = executor.submit(_ensure_bm25_matrix).result()
+            logger.info(f"Search pool started with {self.workers} workers, BM25 matrix {shape}")
+        except Exception as e:
+            logger.error(f"Error preparing BM25 matrix for the search pool: {e}")
+        old_executor, self.executor = self.executor, executor
+        if old_executor is not None:
+            # Searches already running on the old workers finish against the old index
+            old_executor.shutdown(wait=False, cancel_futures=False)
+
+    async def refresh(self):
+        """Restart the workers in the background once a new index generation is committed"""
+        now = time.time()
+        if self.reloading or now - self.checked_at < 1.0:
+            return False
+        self.checked_at = now
+        # Generations are complete when committed, so there is nothing to wait for
+        generation = self.store.current_generation()
+        if generation is None or generation == self.generation:
+            return False
+        self.reloading = True
+        try:
+            await asyncio.get_running_loop().run_in_executor(None, self.start)
+            self.stats['reloads'] += 1
+        finally:
+            self.reloading = False
+        return True
+
+    def shutdown(self):
+        if self.executor is not None:
+            self.executor.shutdown(wait=True, cancel_futures=True)
+            self.executor = None
+
+    async def search(self, query, mode='keyword', max_results=10, with_facets=True, with_snippets=True,
+                     timeout=None):
+        """Score a query in a worker, raising Overloaded or DeadlineExceeded"""
+        if self.pending >= self.max_pending:
+            self.stats['rejected'] += 1
+            raise Overloaded(f"{self.pending} searches already pending")
+
+        timeout = self.timeout if timeout is None else timeout
+        deadline = time.time() + timeout
+        loop = asyncio.get_running_loop()
+        self.pending += 1
+        try:
+            future = loop.run_in_executor(self.executor, _run_search, query, mode,
+                                          max_results, with_facets, with_snippets, deadline)
+            try:
+                output = await asyncio.wait_for(future, timeout)
+            except asyncio.TimeoutError:
+                output = None
+            if output is None:
+                self.stats['timeouts'] += 1
+                raise DeadlineExceeded(f"Search did not finish within {timeout * 1000:.0f}ms")
+            self.stats['completed'] += 1
+            return output
+        except DeadlineExceeded:
+            raise
+        except Exception:
+            self.stats['errors'] += 1
+            raise
+        finally:
+            self.pending -= 1
+
+    def status(self):
+        return dict(self.stats, workers=self.workers, pending=self.pending,
+                    max_pending=self.max_pending, timeout_ms=self.timeout * 1000)
@@ -0,0 +1,210 @@
+"""Desktop search window: python search_ui.py
+
+Optional Tkinter frontend over QueryProcessor, the web app doesn't import it.
+"""
+import tkinter as tk
+from tkinter import ttk
+import webbrowser
+
+from query_processor import QueryProcessor
+from dates import parse_year_range
+from log_config import configure_logging
+
+
+class SearchUI:
+    def __init__(self, root):
+        self.root = root
+        self.root.title("CU Economics Publications Search")
+        self.root.geometry("1000x600")
+        
+        self.query_processor = QueryProcessor()
+        
+        # Create UI elements
+        self.create_ui()
+    
+    def create_ui(self):
+        """Create the UI elements"""
+        # Frame for the search bar and buttons
+        search_frame = ttk.Frame(self.root, padding="10")
+        search_frame.pack(fill=tk.X)
+        
+        # Search bar
+        ttk.Label(search_frame, text="Search:").grid(column=0, row=0, sticky=tk.W, padx=5)
+        self.search_entry = ttk.Entry(search_frame, width=50)
+        self.search_entry.grid(column=1, row=0, sticky=(tk.W, tk.E), padx=5)
+        self.search_entry.bind("<Return>", self.on_search)
+        
+        # Search button
+        search_button = ttk.Button(search_frame, text="Search", command=self.on_search)
+        search_button.grid(column=2, row=0, padx=5)
+        
+        # Advanced search options
+        ttk.Label(search_frame, text="Filter:").grid(column=0, row=1, sticky=tk.W, padx=5, pady=5)
+        
+        # Author filter
+        ttk.Label(search_frame, text="Author:").grid(column=1, row=1, sticky=tk.W, padx=5, pady=5)
+        self.author_entry = ttk.Entry(search_frame, width=20)
+        self.author_entry.grid(column=1, row=1, sticky=(tk.W, tk.E), padx=(50, 5), pady=5)
+        
+        # Year filter
+        ttk.Label(search_frame, text="Year:").grid(column=2, row=1, sticky=tk.W, padx=5, pady=5)
+        self.year_entry = ttk.Entry(search_frame, width=10)
+        self.year_entry.grid(column=2, row=1, sticky=(tk.W, tk.E), padx=(40, 5), pady=5)
+        
+        # Results frame
+        results_frame = ttk.Frame(self.root, padding="10")
+        results_frame.pack(fill=tk.BOTH, expand=True)
+        
+        # Results count
+        self.results_count = ttk.Label(results_frame, text="Enter a search query to begin")
+        self.results_count.pack(anchor=tk.W, pady=(0, 10))
+        
+        # Results list with scrollbar
+        self.results_tree = ttk.Treeview(results_frame, columns=("title", "authors", "year"), show="headings")
+        self.results_tree.heading("title", text="Title")
+        self.results_tree.heading("authors", text="Authors")
+        self.results_tree.heading("year", text="Year")
+        
+        self.results_tree.column("title", width=400, anchor=tk.W)
+        self.results_tree.column("authors", width=300, anchor=tk.W)
+        self.results_tree.column("year", width=70, anchor=tk.CENTER)
+        
+        scrollbar = ttk.Scrollbar(results_frame, orient=tk.VERTICAL, command=self.results_tree.yview)
+        self.results_tree.configure(yscrollcommand=scrollbar.set)
+        
+        self.results_tree.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
+        scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
+        
+        # Bind double-click event to open publication
+        self.results_tree.bind("<Double-1>", self.on_result_double_click)
+        
+        # Details frame
+        self.details_frame = ttk.LabelFrame(self.root, text="Publication Details", padding="10")
+        self.details_frame.pack(fill=tk.X, padx=10, pady=10)
+        
+        # Initially hide the details
+        self.details_title = ttk.Label(self.details_frame, text="", wraplength=980)
+        self.details_title.pack(anchor=tk.W, pady=2)
+        
+        self.details_authors = ttk.Label(self.details_frame, text="")
+        self.details_authors.pack(anchor=tk.W, pady=2)
+        
+        self.details_year = ttk.Label(self.details_frame, text="")
+        self.details_year.pack(anchor=tk.W, pady=2)
+        
+        self.details_abstract = ttk.Label(self.details_frame, text="", wraplength=980)
+        self.details_abstract.pack(anchor=tk.W, pady=2)
+        
+        # Link buttons frame
+        self.links_frame = ttk.Frame(self.details_frame)
+        self.links_frame.pack(anchor=tk.W, pady=5)
+        
+        self.pub_link_button = ttk.Button(self.links_frame, text="Open Publication Page", state=tk.DISABLED)
+        self.pub_link_button.pack(side=tk.LEFT, padx=5)
+        
+        # Status bar
+        self.status_bar = ttk.Label(self.root, text=f"Ready | Index contains {self.query_processor.total_documents} publications", relief=tk.SUNKEN, anchor=tk.W)
+        self.status_bar.pack(side=tk.BOTTOM, fill=tk.X)
+    
+    def on_search(self, event=None):
+        """Handle search button click or Enter key"""
+        query = self.search_entry.get().strip()
+        author = self.author_entry.get().strip()
+        year = self.year_entry.get().strip()
+        
+        # Clear existing results
+        for i in self.results_tree.get_children():
+            self.results_tree.delete(i)
+        
+        # Clear details
+        self.clear_details()
+        
+        if not query and not author and not year:
+            self.results_count.config(text="Please enter a search query, author name, or year")
+            return
+        
+        year_range = None
+        if year:
+            try:
+                year_range = parse_year_range(year)
+            except ValueError:
+                self.results_count.config(text="Enter a year like 2020 or a range like 2019..2024")
+                return
+        
+        # Perform the search
+        results = []
+        
+        if query:
+            results = self.query_processor.search(query, year_range=year_range)
+        elif author:
+            results = self.query_processor.search_by_author(author, year_range=year_range)
+        elif year:
+            results = self.query_processor.search_by_year(year_range)
+        
+        # Filter results if multiple criteria
+        if author and query:
+            results = [r for r in results if any(author.lower() in a.lower() for a in r['authors'])]
+        
+        # Update results count
+        self.results_count.config(text=f"Found {len(results)} publications")
+        
+        # Populate the results tree
+        self.search_results = results  # Store for later use
+        
+        for i, result in enumerate(results):
+            title = result.get('title', 'No title')
+            authors = ', '.join(result.get('authors', ['Unknown']))
+            year = result.get('year', '')
+            
+            self.results_tree.insert('', tk.END, iid=str(i), values=(title, authors, year))
+        
+        # Update status
+        self.status_bar.config(text=f"Search completed | {len(results)} results found")
+    
+    def on_result_double_click(self, event):
+        """Handle double-click on a result"""
+        selected_item = self.results_tree.selection()
+        if not selected_item:
+            return
+        
+        # Get the selected result
+        result_index = int(selected_item[0])
+        if result_index < len(self.search_results):
+            result = self.search_results[result_index]
+            self.display_details(result)
+    
+    def display_details(self, publication):
+        """Display publication details"""
+        # Update labels
+        self.details_title.config(text=f"Title: {publication.get('title', 'No title')}")
+        self.details_authors.config(text=f"Authors: {', '.join(publication.get('authors', ['Unknown']))}")
+        self.details_year.config(text=f"Year: {publication.get('year', 'Unknown')}")
+        
+        abstract = publication.get('abstract', 'No abstract available')
+        self.details_abstract.config(text=f"Abstract: {abstract}")
+        
+        # Update link button
+        pub_url = publication.get('url')
+        if pub_url:
+            self.pub_link_button.config(state=tk.NORMAL, command=lambda: webbrowser.open(pub_url))
+        else:
+            self.pub_link_button.config(state=tk.DISABLED)
+    
+    def clear_details(self):
+        """Clear publication details"""
+        self.details_title.config(text="")
+        self.details_authors.config(text="")
+        self.details_year.config(text="")
+        self.details_abstract.config(text="")
+        self.pub_link_button.config(state=tk.DISABLED)
+
+
+def main():
+    configure_logging("search.log")
+    root = tk.Tk()
+    SearchUI(root)
+    root.mainloop()
+
+
+if __name__ == "__main__":
+    main()
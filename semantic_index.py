@@ -0,0 +1,168 @@
+import os
+import pickle
+import logging
+import numpy as np
+from scipy import sparse
+
+logger = logging.getLogger("SemanticIndex")
+
+class SemanticIndex:
+    """LSA embeddings of titles and abstracts behind an IVF nearest neighbour index"""
+
+    FILES = ('semantic_model.pkl', 'semantic_centroids.npy', 'semantic_vectors.npy',
+             'semantic_doc_ids.npy', 'semantic_offsets.npy')
+
+    def __init__(self, dimensions=128, kmeans_iterations=10, n_probe=4, seed=42):
+        self.dimensions = dimensions
+        self.kmeans_iterations = kmeans_iterations
+        self.n_probe = n_probe
+        self.seed = seed
+        self.vectorizer = None
+        self.svd = None
+        self.model_path = None
+        self.centroids = None
+        self.vectors = None
+        self.doc_ids = None
+        self.list_offsets = None
+
+    @staticmethod
+    def document_text(publication):
+        """Text embedded for a publication: its title and abstract"""
+        title = publication.get('Title', publication.get('title', '')) or ''
+        abstract = publication.get('Abstract', publication.get('abstract', '')) or ''
+        return f"{title} {abstract}"
+
+    @staticmethod
+    def _normalize(vectors):
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        return vectors / norms
+
+    def _assign(self, vectors, centroids, chunk_size=65536):
+        """Nearest centroid of every vector, computed in chunks to bound memory"""
+        return np.concatenate([
+            np.argmax(vectors[start:start + chunk_size] @ centroids.T, axis=1)
+            for start in range(0, len(vectors), chunk_size)
+        ])
+
+    def _kmeans(self, vectors, n_lists, max_training_points=256):
+        """Spherical k-means on unit vectors, returns centroids and assignments"""
+        rng = np.random.default_rng(self.seed)
+        # Train on a sample of up to 256 points per list, then assign everything
+        sample_size = min(len(vectors), n_lists * max_training_points)
+        sample = vectors[rng.choice(len(vectors), sample_size, replace=False)]
+        centroids = sample[rng.choice(len(sample), n_lists, replace=False)].copy()
+        for _ in range(self.kmeans_iterations):
+            assignments = self._assign(sample, centroids)
+            # Sum the members of every list with one sparse product, empty lists keep their centroid
+            membership = sparse.csr_matrix(
+                (np.ones(len(sample), dtype=np.float32), (assignments, np.arange(len(sample)))),
+                shape=(n_lists, len(sample))
+            )
+            sums = np.asarray(membership @ sample)
+            filled = np.bincount(assignments, minlength=n_lists) > 0
+            centroids[filled] = sums[filled]
+            centroids = self._normalize(centroids)
+        return centroids, self._assign(vectors, centroids)
+
+    def build(self, publications):
+        """Embed all publications offline and build the inverted file lists"""
+        texts = [self.document_text(pub) for pub in publications]
+        if not texts:
+            logger.warning("No publications to embed")
+            return False
+
+        # scikit-learn is slow to import and only needed to build or embed
+        from sklearn.feature_extraction.text import TfidfVectorizer
+        from sklearn.decomposition import TruncatedSVD
+
+        self.vectorizer = TfidfVectorizer(stop_words='english', sublinear_tf=True)
+        tfidf = self.vectorizer.fit_transform(texts)
+        components = max(1, min(self.dimensions, tfidf.shape[1] - 1, len(texts) - 1))
+        self.svd = TruncatedSVD(n_components=components, random_state=self.seed)
+        vectors = self._normalize(self.svd.fit_transform(tfidf)).astype(np.float32)
+
+        # Roughly sqrt(N) lists keeps both the centroid scan and the probed lists short
+        n_lists = max(1, min(len(vectors), int(np.sqrt(len(vectors)))))
+        self.centroids, assignments = self._kmeans(vectors, n_lists)
+        self.centroids = self.centroids.astype(np.float32)
+
+        # Store vectors grouped by list so each list is one contiguous slice
+        order = np.argsort(assignments, kind='stable')
+        self.vectors = vectors[order]
+        self.doc_ids = order.astype(np.int32)
+        counts = np.bincount(assignments, minlength=n_lists)
+        self.list_offsets = np.concatenate([[0], np.cumsum(counts)]).astype(np.int64)
+
+        logger.info(f"Built semantic index with {len(vectors)} vectors, {components} dimensions and {n_lists} lists")
+        return True
+
+    def save(self, index_dir):
+        """Save the embedding model and the IVF arrays to disk"""
+        try:
+            with open(f"{index_dir}/semantic_model.pkl", 'wb') as f:
+                pickle.dump({'vectorizer': self.vectorizer, 'svd': self.svd}, f)
+            np.save(f"{index_dir}/semantic_centroids.npy", self.centroids)
+            np.save(f"{index_dir}/semantic_vectors.npy", self.vectors)
+            np.save(f"{index_dir}/semantic_doc_ids.npy", self.doc_ids)
+            np.save(f"{index_dir}/semantic_offsets.npy", self.list_offsets)
+            logger.info(f"Semantic index saved to {index_dir}")
+            return True
+        except Exception as e:
+            logger.error(f"Error saving semantic index: {e}")
+            return False
+
+    def load(self, index_dir):
+        """Load the model and memory-map the vector arrays"""
+        try:
+            if not os.path.exists(f"{index_dir}/semantic_model.pkl"):
+                logger.warning(f"No semantic index found at {index_dir}")
+                return False
+            # Unpickling the model imports scikit-learn, so it waits for the first query
+            self.model_path = f"{index_dir}/semantic_model.pkl"
+            self.vectorizer = self.svd = None
+            self.centroids = np.load(f"{index_dir}/semantic_centroids.npy")
+            self.vectors = np.load(f"{index_dir}/semantic_vectors.npy", mmap_mode='r')
+            self.doc_ids = np.load(f"{index_dir}/semantic_doc_ids.npy", mmap_mode='r')
+            self.list_offsets = np.load(f"{index_dir}/semantic_offsets.npy")
+            logger.info(f"Loaded semantic index with {len(self.doc_ids)} vectors")
+            return True
+        except Exception as e:
+            logger.error(f"Error loading semantic index: {e}")
+            return False
+
+    def is_loaded(self):
+        return self.vectors is not None
+
+    def embed(self, text):
+        """Embed a query into the same unit-length LSA space as the documents"""
+        if self.vectorizer is None:
+            with open(self.model_path, 'rb') as f:
+                model = pickle.load(f)
+            self.vectorizer = model['vectorizer']
+            self.svd = model['svd']
+        vector = self.svd.transform(self.vectorizer.transform([text]))
+        return self._normalize(vector).astype(np.float32)[0]
+
+    def search(self, query_text, max_results=10, n_probe=None):
+        """Return (doc_id, cosine similarity) pairs for the nearest documents"""
+        if not self.is_loaded() or max_results <= 0:
+            return []
+        query = self.embed(query_text)
+        if not query.any():
+            return []
+
+        # Only scan the lists whose centroids are closest to the query
+        n_probe = min(n_probe or self.n_probe, len(self.centroids))
+        lists = np.argsort(-(self.centroids @ query))[:n_probe]
+        candidates = np.concatenate([
+            np.arange(self.list_offsets[l], self.list_offsets[l + 1]) for l in lists
+        ])
+        if len(candidates) == 0:
+            return []
+
+        scores = np.asarray(self.vectors[candidates]) @ query
+        k = min(max_results, len(scores))
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top], kind='stable')]
+        return [(int(self.doc_ids[candidates[i]]), float(scores[i])) for i in top]
@@ -0,0 +1,412 @@
+import os
+import sys
+import math
+import time
+import heapq
+import pickle
+import secrets
+import logging
+import argparse
+import threading
+import multiprocessing
+from collections.abc import Mapping
+from itertools import islice
+from multiprocessing.connection import Listener, Client, AuthenticationError
+
+current_dir = os.path.dirname(os.path.abspath(__file__))
+sys.path.append(current_dir)
+
+import numpy as np
+
+from query_processor import QueryProcessor, load_postings
+from priors import StaticPriors
+from index_store import IndexStore
+from metrics import metrics
+from log_config import configure_logging
+
+logger = logging.getLogger("Sharding")
+
+# Connections exchange pickles, so anyone holding the key can run code in a shard
+SHARD_KEY_ENV = 'SEARCH_SHARD_KEY'
+
+# Only for Unix sockets, which are created readable by their owner alone
+UNIX_SOCKET_AUTHKEY = b'search-shards'
+
+
+def shard_authkey(address, authkey=None):
+    """The key to serve or connect to address with.
+
+    TCP addresses need an explicit key or SEARCH_SHARD_KEY, any host that
+    can reach the port could otherwise connect with a well-known key.
+    """
+    if authkey is None and os.environ.get(SHARD_KEY_ENV):
+        authkey = os.environ[SHARD_KEY_ENV].encode()
+    if authkey is None:
+        if isinstance(address, tuple):
+            raise ValueError(f"Set {SHARD_KEY_ENV} to serve or reach shards over TCP ({address[0]}:{address[1]})")
+        authkey = UNIX_SOCKET_AUTHKEY
+    return authkey
+
+
+def build_shards(index_dir="index_data", shard_dir="shards", num_shards=4):
+    """Partition a built index into num_shards document shards.
+
+    Documents go to shard doc_id % num_shards and keep their global ids,
+    so the coordinator can merge shard results without remapping. Each
+    shard stores only local postings and lengths, global statistics are
+    combined by the coordinator when it connects.
+    """
+    index_path = IndexStore(index_dir).open()
+    if index_path is None:
+        raise FileNotFoundError(f"No index found at {index_dir}")
+    index = load_postings(index_path)
+    with open(f"{index_path}/document_lengths.pkl", 'rb') as f:
+        document_lengths = pickle.load(f)
+    with open(f"{index_path}/metadata.pkl", 'rb') as f:
+        total_documents = pickle.load(f).get('total_documents', 0)
+    priors = StaticPriors()
+    has_priors = priors.load(index_path)
+
+    shard_postings = [{} for _ in range(num_shards)]
+    for term, postings in index.items():
+        for doc_id, term_freq in postings:
+            shard_postings[doc_id % num_shards].setdefault(term, []).append((doc_id, term_freq))
+
+    paths = []
+    for shard_id in range(num_shards):
+        path = os.path.join(shard_dir, f"shard_{shard_id}")
+        os.makedirs(path, exist_ok=True)
+        lengths = {doc_id: length for doc_id, length in document_lengths.items() if doc_id % num_shards == shard_id}
+        with open(f"{path}/postings.pkl", 'wb') as f:
+            pickle.dump(shard_postings[shard_id], f)
+        with open(f"{path}/document_lengths.pkl", 'wb') as f:
+            pickle.dump(lengths, f)
+        if has_priors:
+            # Row doc_id // num_shards holds the prior components of doc_id
+            np.save(f"{path}/priors.npy", priors.components[shard_id::num_shards])
+        with open(f"{path}/shard.pkl", 'wb') as f:
+            pickle.dump({
+                'shard_id': shard_id,
+                'num_shards': num_shards,
+                'documents': len(range(shard_id, total_documents, num_shards))
+            }, f)
+        paths.append(path)
+    logger.info(f"Partitioned {total_documents} documents into {num_shards} shards in {shard_dir}")
+    return paths
+
+
+class ShardServer:
+    """Serves one document shard: local BM25 scoring with statistics sent by the coordinator"""
+
+    def __init__(self, shard_path):
+        self.shard_path = shard_path
+        with open(f"{shard_path}/postings.pkl", 'rb') as f:
+            self.index = pickle.load(f)
+        with open(f"{shard_path}/document_lengths.pkl", 'rb') as f:
+            self.document_lengths = pickle.load(f)
+        with open(f"{shard_path}/shard.pkl", 'rb') as f:
+            self.info = pickle.load(f)
+        self.priors = None
+        if os.path.exists(f"{shard_path}/priors.npy"):
+            self.priors = np.load(f"{shard_path}/priors.npy")
+
+    def stats(self):
+        """Local statistics the coordinator sums into global IDF and average length"""
+        return {
+            'document_frequency': {term: len(postings) for term, postings in self.index.items()},
+            'documents': self.info['documents'],
+            'total_length': sum(self.document_lengths.values()),
+            'length_entries': len(self.document_lengths)
+        }
+
+    def search(self, query_terms, idfs, avg_document_length, k1, b, limit, prior_weights=None):
+        """Top limit (score, doc_id) pairs of this shard, best first.
+
+        Terms come in QueryProcessor.term_idfs order and the arithmetic is
+        the same as QueryProcessor.bm25_scores, so with global statistics
+        every score equals the unsharded one bit for bit. prior_weights is
+        (prior_weight, StaticPriors weights), None for pure BM25.
+        """
+        scores = {}
+        for term, idf in zip(query_terms, idfs):
+            for doc_id, term_freq in self.index.get(term, []):
+                doc_length = self.document_lengths.get(doc_id, avg_document_length)
+                numerator = term_freq * (k1 + 1)
+                denominator = term_freq + k1 * (1 - b + b * (doc_length / avg_document_length))
+                scores[doc_id] = scores.get(doc_id, 0.0) + idf * (numerator / denominator)
+        if prior_weights is not None and self.priors is not None and scores:
+            rows = np.fromiter(scores.keys(), dtype=np.int64, count=len(scores)) // self.info['num_shards']
+            priors = np.zeros(len(rows))
+            inside = rows < len(self.priors)
+            prior_weight, weights = prior_weights
+            priors[inside] = prior_weight * StaticPriors.combine(self.priors[rows[inside]], weights)
+            scores = {doc_id: score + prior for (doc_id, score), prior in zip(scores.items(), priors.tolist())}
+        return heapq.nsmallest(limit, ((-score, doc_id) for doc_id, score in scores.items()))
+
+    def handle(self, request):
+        op = request[0]
+        if op == 'search':
+            return self.search(*request[1:])
+        if op == 'postings':
+            return self.index.get(request[1], [])
+        if op == 'stats':
+            return self.stats()
+        if op == 'ping':
+            return self.info
+        raise ValueError(f"Unknown shard request: {op}")
+
+    def _serve_connection(self, conn):
+        with conn:
+            while True:
+                try:
+                    request = conn.recv()
+                except (EOFError, OSError):
+                    return
+                try:
+                    conn.send(('ok', self.handle(request)))
+                except Exception as e:
+                    conn.send(('error', str(e)))
+
+    def serve(self, address, authkey=None):
+        """Accept coordinator connections forever, one thread per connection"""
+        authkey = shard_authkey(address, authkey)
+        # A Unix socket is created owner-only, this process does nothing else with its umask
+        previous_umask = os.umask(0o077)
+        try:
+            listener = Listener(address, authkey=authkey)
+        finally:
+            os.umask(previous_umask)
+        with listener:
+            logger.info(f"Shard {self.info['shard_id']} serving on {listener.address}")
+            while True:
+                try:
+                    conn = listener.accept()
+                except (AuthenticationError, OSError, EOFError) as e:
+                    # A client with the wrong key must not stop the shard
+                    logger.warning(f"Rejected shard connection: {e}")
+                    continue
+                threading.Thread(target=self._serve_connection, args=(conn,), daemon=True).start()
+
+
+def serve_shard(shard_path, address, authkey=None):
+    ShardServer(shard_path).serve(address, authkey)
+
+
+def parse_address(text):
+    """'host:port' for TCP, anything else is a Unix socket path"""
+    host, _, port = text.rpartition(':')
+    if host and port.isdigit():
+        return (host, int(port))
+    return text
+
+
+def start_local_shards(shard_dir="shards", num_shards=None, socket_dir=None, authkey=None):
+    """Start one server process per shard on Unix sockets, returns (processes, addresses, authkey).
+
+    Without an authkey a random one is made for this run, pass it on to
+    ShardedQueryProcessor.
+    """
+    authkey = authkey or secrets.token_bytes(32)
+    if num_shards is None:
+        num_shards = len([name for name in os.listdir(shard_dir)
+                          if name.startswith("shard_") and os.path.isdir(os.path.join(shard_dir, name))])
+    socket_dir = socket_dir or shard_dir
+    context = multiprocessing.get_context('spawn')
+    processes, addresses = [], []
+    for shard_id in range(num_shards):
+        address = os.path.join(os.path.abspath(socket_dir), f"shard_{shard_id}.sock")
+        if os.path.exists(address):
+            os.remove(address)
+        process = context.Process(target=serve_shard, args=(os.path.join(shard_dir, f"shard_{shard_id}"), address, authkey),
+                                  name=f"shard-{shard_id}", daemon=True)
+        process.start()
+        processes.append(process)
+        addresses.append(address)
+    return processes, addresses, authkey
+
+
+class ShardedPostings(Mapping):
+    """Read-only term -> postings view gathered from every shard on access"""
+
+    def __init__(self, processor, document_frequency):
+        self.processor = processor
+        self.document_frequency = document_frequency
+
+    def __getitem__(self, term):
+        if term not in self.document_frequency:
+            raise KeyError(term)
+        postings = [entry for shard_postings in self.processor.broadcast(('postings', term)) for entry in shard_postings]
+        return sorted(postings)
+
+    def __contains__(self, term):
+        return term in self.document_frequency
+
+    def __iter__(self):
+        return iter(self.document_frequency)
+
+    def __len__(self):
+        return len(self.document_frequency)
+
+
+class ShardedQueryProcessor(QueryProcessor):
+    """Query processor that scatters BM25 scoring to shard servers and merges their top-k.
+
+    Publications, facets and the semantic index are loaded from index_dir
+    as usual, only the inverted index lives in the shards.
+    """
+
+    def __init__(self, addresses, data_dir=".", index_dir="index_data", authkey=None, connect_timeout=30.0):
+        self.addresses = addresses
+        self.authkey = authkey
+        self.connect_timeout = connect_timeout
+        self._idle = []
+        self._idle_lock = threading.Lock()
+        super().__init__(data_dir=data_dir, index_dir=index_dir)
+
+    def _connect(self):
+        """Open one connection per shard, waiting for shards that are still starting"""
+        connections = []
+        deadline = time.time() + self.connect_timeout
+        for address in self.addresses:
+            while True:
+                try:
+                    connections.append(Client(address, authkey=shard_authkey(address, self.authkey)))
+                    break
+                except (FileNotFoundError, ConnectionRefusedError):
+                    if time.time() > deadline:
+                        raise
+                    time.sleep(0.1)
+        return connections
+
+    def broadcast(self, request):
+        """Send a request to every shard at once and gather the replies in shard order"""
+        with self._idle_lock:
+            connections = self._idle.pop() if self._idle else None
+        if connections is None:
+            connections = self._connect()
+        try:
+            for conn in connections:
+                conn.send(request)
+            replies = [conn.recv() for conn in connections]
+        except Exception:
+            for conn in connections:
+                conn.close()
+            raise
+        with self._idle_lock:
+            self._idle.append(connections)
+
+        for status, value in replies:
+            if status != 'ok':
+                raise RuntimeError(f"Shard error: {value}")
+        return [value for _, value in replies]
+
+    def load_data(self):
+        """Combine the shard statistics into global ones and load the publications"""
+        self.term_ids = {}
+        self.bm25_matrix = None
+        try:
+            stats = self.broadcast(('stats',))
+        except Exception as e:
+            logger.error(f"Error connecting to shards: {e}")
+            return False
+
+        document_frequency = {}
+        for shard_stats in stats:
+            for term, frequency in shard_stats['document_frequency'].items():
+                document_frequency[term] = document_frequency.get(term, 0) + frequency
+        self.total_documents = sum(shard_stats['documents'] for shard_stats in stats)
+        length_entries = sum(shard_stats['length_entries'] for shard_stats in stats)
+        total_length = sum(shard_stats['total_length'] for shard_stats in stats)
+        self.avg_document_length = total_length / length_entries if length_entries else 0
+        # Same formula as InvertedIndex.build_index, over the whole collection
+        self.idf = {term: math.log10(self.total_documents / frequency)
+                    for term, frequency in document_frequency.items()}
+        self.index = ShardedPostings(self, document_frequency)
+        logger.info(f"Connected to {len(self.addresses)} shards with {len(self.index)} terms "
+                    f"and {self.total_documents} documents")
+
+        try:
+            self.index_path = self.open_generation() or self.index_dir
+            self.load_optional_indexes()
+            return self.load_publications()
+        except Exception as e:
+            logger.error(f"Error loading data: {e}")
+            return False
+
+    def load_optional_indexes(self):
+        super().load_optional_indexes()
+        # Rerank features read term frequencies from the postings, which live in the shards
+        self.reranker = None
+
+    def rank_bm25(self, query_terms, limit=None, term_weights=None):
+        """Scatter the query to every shard and merge their sorted top-k lists"""
+        prior_weights = (self.prior_weight, self.priors.weights) if self.prior_weight else None
+        return self._scatter(query_terms, limit, prior_weights, term_weights)
+
+    def _scatter(self, query_terms, limit, prior_weights, term_weights=None):
+        # Term weights scale the idfs, so the shards score expanded queries unchanged
+        term_idfs = self.term_idfs(query_terms, term_weights)
+        if not term_idfs:
+            return []
+        limit = self.total_documents if limit is None else limit
+        terms = [term for term, _ in term_idfs]
+        idfs = [idf for _, idf in term_idfs]
+        with metrics.stage('scoring'):
+            shard_results = self.broadcast(('search', terms, idfs, self.avg_document_length,
+                                            self.k1, self.b, limit, prior_weights))
+        with metrics.stage('topk'):
+            merged = islice(heapq.merge(*shard_results), limit)
+            return [(doc_id, -negative_score) for negative_score, doc_id in merged]
+
+    def bm25_scores(self, query_terms, term_weights=None):
+        # Pure BM25, callers add the priors themselves
+        return dict(self._scatter(query_terms, None, None, term_weights))
+
+    def postings_sizes(self, query_text):
+        return {term: self.index.document_frequency.get(term, 0) for term in self.preprocess_query(query_text)}
+
+    def iter_search_many(self, queries, max_results=10, batch_size=256):
+        # Shards have no term-by-document matrix, score the queries one by one
+        for position, query_text in enumerate(queries):
+            yield position, self.search(query_text or '', max_results)
+
+
+def main():
+    configure_logging()
+    parser = argparse.ArgumentParser(description="Sharded scatter-gather search")
+    parser.add_argument('--shard-dir', default='shards')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    build_parser = subparsers.add_parser('build', help="Partition the built index into shards")
+    build_parser.add_argument('--index-dir', default='index_data')
+    build_parser.add_argument('--shards', type=int, default=4)
+
+    serve_parser = subparsers.add_parser('serve', help="Serve one shard")
+    serve_parser.add_argument('shard', type=int)
+    serve_parser.add_argument('--address', required=True, help="host:port or Unix socket path")
+
+    search_parser = subparsers.add_parser('search', help="Start local shards and run queries through them")
+    search_parser.add_argument('queries', nargs='+')
+    search_parser.add_argument('--data-dir', default='.')
+    search_parser.add_argument('--index-dir', default='index_data')
+    args = parser.parse_args()
+
+    if args.command == 'build':
+        build_shards(args.index_dir, args.shard_dir, args.shards)
+    elif args.command == 'serve':
+        serve_shard(os.path.join(args.shard_dir, f"shard_{args.shard}"), parse_address(args.address))
+    elif args.command == 'search':
+        processes, addresses, authkey = start_local_shards(args.shard_dir)
+        try:
+            processor = ShardedQueryProcessor(addresses, data_dir=args.data_dir, index_dir=args.index_dir,
+                                              authkey=authkey)
+            for query in args.queries:
+                for result in processor.search(query):
+                    print(f"{result['score']:.4f}\t{result['doc_id']}\t{result.get('title', '')}")
+        finally:
+            for process in processes:
+                process.terminate()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,125 @@
+import os
+import pickle
+import logging
+import numpy as np
+from scipy import sparse
+
+logger = logging.getLogger("SimilarityIndex")
+
+class SimilarityIndex:
+    """Precomputed "more like this" neighbours over L2-normalized TF-IDF vectors"""
+
+    FILES = ('doc_term_matrix.npz', 'similar_ids.npy', 'similar_scores.npy', 'vocabulary.pkl')
+
+    def __init__(self, top_k=10, chunk_size=1024):
+        self.top_k = top_k
+        self.chunk_size = chunk_size
+        self.vocabulary = {}
+        self.doc_term_matrix = None
+        self.neighbour_ids = None
+        self.neighbour_scores = None
+
+    def build_matrix(self, index, idf, total_documents):
+        """Build a CSR document-term matrix with L2-normalized TF-IDF rows"""
+        self.vocabulary = {term: term_id for term_id, term in enumerate(sorted(index))}
+
+        rows, cols, values = [], [], []
+        for term, postings in index.items():
+            term_id = self.vocabulary[term]
+            weight = idf.get(term, 0)
+            for doc_id, term_freq in postings:
+                rows.append(doc_id)
+                cols.append(term_id)
+                values.append(term_freq * weight)
+
+        num_docs = max([total_documents] + [doc_id + 1 for doc_id in rows])
+        matrix = sparse.csr_matrix(
+            (np.asarray(values, dtype=np.float32), (rows, cols)),
+            shape=(num_docs, len(self.vocabulary))
+        )
+        matrix.eliminate_zeros()
+
+        # L2-normalize each row so a dot product is the cosine similarity
+        norms = np.sqrt(np.asarray(matrix.multiply(matrix).sum(axis=1)).ravel())
+        norms[norms == 0] = 1.0
+        self.doc_term_matrix = sparse.csr_matrix(sparse.diags(1.0 / norms) @ matrix, dtype=np.float32)
+        return self.doc_term_matrix
+
+    def compute_neighbours(self):
+        """Compute the top-k most similar documents for every document"""
+        matrix = self.doc_term_matrix
+        num_docs = matrix.shape[0]
+        k = min(self.top_k, max(num_docs - 1, 0))
+
+        self.neighbour_ids = np.full((num_docs, self.top_k), -1, dtype=np.int32)
+        self.neighbour_scores = np.zeros((num_docs, self.top_k), dtype=np.float32)
+        if k == 0:
+            return
+
+        transposed = matrix.T.tocsc()
+        # Cap each dense block at about 16M similarities however large the corpus gets
+        chunk_size = max(1, min(self.chunk_size, (1 << 24) // num_docs))
+        for start in range(0, num_docs, chunk_size):
+            end = min(start + chunk_size, num_docs)
+            # Sparse chunk-by-corpus product, densified one chunk at a time to bound memory
+            similarities = (matrix[start:end] @ transposed).toarray()
+            similarities[np.arange(end - start), np.arange(start, end)] = 0
+
+            top = np.argpartition(-similarities, k - 1, axis=1)[:, :k]
+            top_scores = np.take_along_axis(similarities, top, axis=1)
+            order = np.argsort(-top_scores, axis=1, kind='stable')
+            top = np.take_along_axis(top, order, axis=1)
+            top_scores = np.take_along_axis(top_scores, order, axis=1)
+
+            # Documents sharing no terms are not neighbours
+            top[top_scores <= 0] = -1
+            self.neighbour_ids[start:end, :k] = top
+            self.neighbour_scores[start:end, :k] = np.maximum(top_scores, 0)
+
+        logger.info(f"Computed {k} neighbours for {num_docs} documents")
+
+    def build(self, index, idf, total_documents):
+        """Build the matrix and precompute neighbours for all documents"""
+        self.build_matrix(index, idf, total_documents)
+        self.compute_neighbours()
+        return True
+
+    def save(self, index_dir):
+        """Save the matrix, vocabulary and neighbour tables to disk"""
+        try:
+            sparse.save_npz(f"{index_dir}/doc_term_matrix.npz", self.doc_term_matrix)
+            np.save(f"{index_dir}/similar_ids.npy", self.neighbour_ids)
+            np.save(f"{index_dir}/similar_scores.npy", self.neighbour_scores)
+            with open(f"{index_dir}/vocabulary.pkl", 'wb') as f:
+                pickle.dump(self.vocabulary, f)
+            logger.info(f"Similarity index saved to {index_dir}")
+            return True
+        except Exception as e:
+            logger.error(f"Error saving similarity index: {e}")
+            return False
+
+    def load(self, index_dir, load_matrix=False):
+        """Load the neighbour tables (memory-mapped) and optionally the matrix"""
+        try:
+            if not os.path.exists(f"{index_dir}/similar_ids.npy"):
+                logger.warning(f"No similarity index found at {index_dir}")
+                return False
+            self.neighbour_ids = np.load(f"{index_dir}/similar_ids.npy", mmap_mode='r')
+            self.neighbour_scores = np.load(f"{index_dir}/similar_scores.npy", mmap_mode='r')
+            if load_matrix:
+                self.doc_term_matrix = sparse.load_npz(f"{index_dir}/doc_term_matrix.npz")
+                with open(f"{index_dir}/vocabulary.pkl", 'rb') as f:
+                    self.vocabulary = pickle.load(f)
+            logger.info(f"Loaded similarity index for {self.neighbour_ids.shape[0]} documents")
+            return True
+        except Exception as e:
+            logger.error(f"Error loading similarity index: {e}")
+            return False
+
+    def get_similar(self, doc_id, max_results=10):
+        """Return the precomputed (doc_id, score) neighbours of a document"""
+        if self.neighbour_ids is None or not 0 <= doc_id < self.neighbour_ids.shape[0]:
+            return []
+        ids = self.neighbour_ids[doc_id, :max_results]
+        scores = self.neighbour_scores[doc_id, :max_results]
+        return [(int(i), float(s)) for i, s in zip(ids, scores) if i >= 0]
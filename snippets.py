@@ -0,0 +1,231 @@
+import os
+import pickle
+import logging
+
+import numpy as np
+
+logger = logging.getLogger("SnippetIndex")
+
+# Characters of abstract text in a snippet
+SNIPPET_CHARS = 240
+
+# Matches considered when choosing a passage, bounds the work per result
+MAX_MATCHES = 64
+
+ELLIPSIS = "…"
+
+# Token rows collected per field before they are written out as a block
+BLOCK_ROWS = 65536
+
+
+def _field_text(publication, field):
+    return publication.get(field.capitalize(), publication.get(field, '')) or ''
+
+
+class SnippetIndex:
+    """Character offsets of the index terms in every title and abstract.
+
+    For each field, tokens holds one (start, end, term id) row per term
+    occurrence and offsets[doc_id]:offsets[doc_id + 1] the rows of a
+    document, so at query time matches are found without re-analyzing
+    the text. Offsets count code points, not UTF-16 units.
+    """
+
+    FIELDS = ('title', 'abstract')
+    FILES = tuple(f"snippet_{field}_{part}.npy" for field in FIELDS for part in ('offsets', 'tokens')) + (
+        'snippet_terms.pkl',)
+
+    def __init__(self, analyzer=None):
+        self.analyzer = analyzer
+        self.spill_dir = None
+        self.term_ids = {}
+        self.offsets = {}
+        self.tokens = {}
+
+    def build(self, publications):
+        """Record the term offsets of publications in doc id order"""
+        self.start()
+        for publication in publications:
+            self.add(publication)
+        return self.finish()
+
+    def start(self, spill_dir=None):
+        """Begin an incremental build, documents are then passed to add() in doc id order.
+
+        Token rows are collected in int32 blocks. With spill_dir, full
+        blocks are appended to a file there instead of kept in memory,
+        which save() removes once the tokens are written.
+        """
+        self.term_ids = {}
+        self.spill_dir = spill_dir
+        self._block = {field: np.empty((BLOCK_ROWS, 3), dtype=np.int32) for field in self.FIELDS}
+        self._filled = {field: 0 for field in self.FIELDS}
+        self._blocks = {field: [] for field in self.FIELDS}
+        self._counts = {field: [] for field in self.FIELDS}
+        if spill_dir:
+            for field in self.FIELDS:
+                open(self._spill_path(field), 'wb').close()
+
+    def _spill_path(self, field):
+        # Dot files are left out of generations, see IndexStore
+        return os.path.join(self.spill_dir, f".snippet_{field}_tokens.spill")
+
+    def add(self, publication):
+        for field in self.FIELDS:
+            terms = self.analyzer.analyze_offsets(_field_text(publication, field))
+            rows = np.array([(start, end, self.term_ids.setdefault(term, len(self.term_ids)))
+                             for term, start, end in terms], dtype=np.int32).reshape(-1, 3)
+            self._counts[field].append(len(rows))
+            while len(rows):
+                filled = self._filled[field]
+                taken = min(len(rows), BLOCK_ROWS - filled)
+                self._block[field][filled:filled + taken] = rows[:taken]
+                self._filled[field] = filled + taken
+                rows = rows[taken:]
+                if self._filled[field] == BLOCK_ROWS:
+                    self._flush(field)
+
+    def _flush(self, field):
+        rows = self._block[field][:self._filled[field]]
+        if self.spill_dir:
+            with open(self._spill_path(field), 'ab') as f:
+                rows.tofile(f)
+        else:
+            self._blocks[field].append(rows)
+            self._block[field] = np.empty((BLOCK_ROWS, 3), dtype=np.int32)
+        self._filled[field] = 0
+
+    def finish(self):
+        for field in self.FIELDS:
+            counts = np.asarray(self._counts[field], dtype=np.int64)
+            self.offsets[field] = np.concatenate([[0], np.cumsum(counts)]).astype(np.int64)
+            self._flush(field)
+            if self.spill_dir:
+                path = self._spill_path(field)
+                self.tokens[field] = (np.memmap(path, dtype=np.int32, mode='r').reshape(-1, 3)
+                                      if os.path.getsize(path) else np.zeros((0, 3), dtype=np.int32))
+            else:
+                self.tokens[field] = np.concatenate(self._blocks[field]).reshape(-1, 3)
+        self._block = self._blocks = self._counts = None
+        logger.info(f"Built snippet offsets for {len(self)} documents")
+        return True
+
+    def save(self, index_dir):
+        """Save the term offsets next to the index"""
+        try:
+            for field in self.FIELDS:
+                for part, array in (('offsets', self.offsets[field]), ('tokens', self.tokens[field])):
+                    path = os.path.join(index_dir, f"snippet_{field}_{part}.npy")
+                    with open(path + ".tmp", 'wb') as f:
+                        np.save(f, array)
+                    os.replace(path + ".tmp", path)
+                if self.spill_dir:
+                    # Spilled tokens are read from the saved file from now on
+                    self.tokens[field] = np.load(os.path.join(index_dir, f"snippet_{field}_tokens.npy"),
+                                                 mmap_mode='r')
+                    os.remove(self._spill_path(field))
+            self.spill_dir = None
+            with open(os.path.join(index_dir, 'snippet_terms.pkl'), 'wb') as f:
+                pickle.dump(self.term_ids, f)
+            logger.info(f"Snippet offsets saved to {index_dir}")
+            return True
+        except Exception as e:
+            logger.error(f"Error saving snippet offsets: {e}")
+            return False
+
+    def load(self, index_dir, mmap_mode='r'):
+        """Memory-map the term offsets, False for indexes saved without them"""
+        if not all(os.path.exists(os.path.join(index_dir, name)) for name in self.FILES):
+            return False
+        try:
+            for field in self.FIELDS:
+                self.offsets[field] = np.load(os.path.join(index_dir, f"snippet_{field}_offsets.npy"))
+                self.tokens[field] = np.load(os.path.join(index_dir, f"snippet_{field}_tokens.npy"),
+                                             mmap_mode=mmap_mode)
+            with open(os.path.join(index_dir, 'snippet_terms.pkl'), 'rb') as f:
+                self.term_ids = pickle.load(f)
+            return True
+        except Exception as e:
+            logger.error(f"Error loading snippet offsets: {e}")
+            self.offsets, self.tokens, self.term_ids = {}, {}, {}
+            return False
+
+    def is_built(self):
+        return bool(self.offsets)
+
+    def __len__(self):
+        return len(self.offsets['title']) - 1 if self.offsets else 0
+
+    def query_weights(self, query_terms, idf):
+        """Term id -> weight of the query terms, rarer terms weigh more"""
+        return {self.term_ids[term]: idf.get(term, 0) + 0.1 for term in query_terms if term in self.term_ids}
+
+    def matches(self, field, doc_id, weights):
+        """(start, end, term id) rows of the query terms in a field of a document"""
+        if doc_id >= len(self) or not weights:
+            return np.zeros((0, 3), dtype=np.int32)
+        tokens = self.tokens[field][self.offsets[field][doc_id]:self.offsets[field][doc_id + 1]]
+        return tokens[np.isin(tokens[:, 2], list(weights))]
+
+    def highlights(self, doc_id, text, weights):
+        """Spans of the query terms in a title"""
+        return [[start, end] for start, end, _ in self.matches('title', doc_id, weights).tolist()
+                if end <= len(text)]
+
+    def snippet(self, doc_id, text, weights, max_chars=SNIPPET_CHARS):
+        """The passage of an abstract with the most query term weight and the spans of its matches"""
+        if not text:
+            return {'text': '', 'highlights': []}
+        if len(text) <= max_chars:
+            begin, end = 0, len(text)
+            matches = self.matches('abstract', doc_id, weights).tolist()
+        else:
+            matches = self.matches('abstract', doc_id, weights)[:MAX_MATCHES].tolist()
+            begin, end = self._passage(text, matches, weights, max_chars)
+
+        spans = [[start - begin, stop - begin] for start, stop, _ in matches if start >= begin and stop <= end]
+        passage = text[begin:end]
+        if begin > 0:
+            passage = ELLIPSIS + passage
+            spans = [[start + 1, stop + 1] for start, stop in spans]
+        if end < len(text):
+            passage += ELLIPSIS
+        return {'text': passage, 'highlights': spans}
+
+    @staticmethod
+    def _passage(text, matches, weights, max_chars):
+        """Character range of at most max_chars around the best window of matches"""
+        best, first, last = None, None, None
+        window_end = 0
+        for i, (start, _, _) in enumerate(matches):
+            window_end = max(window_end, i)
+            while window_end + 1 < len(matches) and matches[window_end + 1][1] - start <= max_chars:
+                window_end += 1
+            window = matches[i:window_end + 1]
+            # Distinct terms count by weight, repeats only break ties
+            score = sum(weights[term] for term in {term for _, _, term in window}) + 0.01 * len(window)
+            if best is None or score > best:
+                best, first, last = score, window[0][0], window[-1][1]
+
+        if best is None:
+            # No matches in the abstract, show its beginning
+            begin = 0
+        else:
+            # Some context before the first match, from its sentence start when that is close
+            slack = max(max_chars - (last - first), 0)
+            begin = max(first - slack // 3, 0)
+            sentence = text.rfind('. ', max(first - slack, 0), first)
+            if sentence >= 0:
+                begin = sentence + 2
+            elif begin > 0:
+                # A word boundary within the slack, else the passage starts mid-word
+                space = text.rfind(' ', max(first - slack, 0), begin)
+                if space >= 0:
+                    begin = space + 1
+        end = min(begin + max_chars, len(text))
+        if end < len(text):
+            # Cut at a word boundary, but never before the last match
+            space = text.rfind(' ', last or begin, end)
+            if space > begin:
+                end = space
+        return begin, end
@@ -0,0 +1,149 @@
+import os
+import json
+import heapq
+import pickle
+import shutil
+import logging
+import tempfile
+from itertools import groupby
+from collections.abc import Mapping
+
+import numpy as np
+
+logger = logging.getLogger("SPIMI")
+
+RECORDS_FILE = "publications.jsonl"
+POSTINGS_FILE = "postings.bin"
+LEXICON_FILE = "lexicon.pkl"
+
+
+def iter_publications(data_dir):
+    """Stream publications from the crawler's record file, one at a time.
+
+    Falls back to unpickling publications.pkl for data crawled before
+    record files existed.
+    """
+    records_path = os.path.join(data_dir, RECORDS_FILE)
+    if os.path.exists(records_path):
+        with open(records_path, 'r', encoding='utf-8') as f:
+            for line in f:
+                if line.strip():
+                    yield json.loads(line)
+        return
+
+    pickle_path = os.path.join(data_dir, "publications.pkl")
+    if os.path.exists(pickle_path):
+        logger.warning(f"No {RECORDS_FILE} in {data_dir}, loading {pickle_path} into memory")
+        with open(pickle_path, 'rb') as f:
+            yield from pickle.load(f)
+
+
+def append_records(path, publications):
+    """Append publications to a JSON lines record file"""
+    with open(path, 'a', encoding='utf-8') as f:
+        for publication in publications:
+            f.write(json.dumps(publication, ensure_ascii=False) + '\n')
+
+
+class SpimiIndexer:
+    """Single-pass in-memory inversion into bounded runs with an external merge.
+
+    Postings are collected in a dictionary until run_size postings are held,
+    then written to a temporary file sorted by term. finish() merges all
+    runs into one postings file and a lexicon of term -> (offset, df).
+    Documents must be added in increasing doc id order.
+    """
+
+    def __init__(self, index_dir, run_size=2_000_000):
+        self.index_dir = index_dir
+        self.run_size = run_size
+        self.run_dir = tempfile.mkdtemp(prefix="spimi_runs_", dir=index_dir)
+        self.runs = []
+        self.buffer = {}
+        self.buffered = 0
+
+    def add(self, doc_id, term_freqs):
+        for term, freq in term_freqs.items():
+            postings = self.buffer.get(term)
+            if postings is None:
+                postings = self.buffer[term] = []
+            postings.append((doc_id, freq))
+        self.buffered += len(term_freqs)
+        if self.buffered >= self.run_size:
+            self.flush()
+
+    def flush(self):
+        """Write the buffered postings as one sorted run"""
+        if not self.buffer:
+            return
+        path = os.path.join(self.run_dir, f"run_{len(self.runs):05d}.pkl")
+        with open(path, 'wb') as f:
+            for term in sorted(self.buffer):
+                pickle.dump((term, self.buffer[term]), f, protocol=pickle.HIGHEST_PROTOCOL)
+        logger.info(f"Flushed run {len(self.runs)} with {len(self.buffer)} terms and {self.buffered} postings")
+        self.runs.append(path)
+        self.buffer = {}
+        self.buffered = 0
+
+    @staticmethod
+    def _read_run(path):
+        with open(path, 'rb') as f:
+            while True:
+                try:
+                    yield pickle.load(f)
+                except EOFError:
+                    return
+
+    def finish(self):
+        """Merge the runs into the postings file and lexicon, returns term -> document frequency"""
+        self.flush()
+        lexicon = {}
+        offset = 0
+        postings_path = os.path.join(self.index_dir, POSTINGS_FILE)
+        try:
+            with open(postings_path + ".tmp", 'wb') as out:
+                # Runs hold increasing doc ids, so the stable merge keeps each postings list sorted
+                merged = heapq.merge(*(self._read_run(path) for path in self.runs), key=lambda entry: entry[0])
+                for term, entries in groupby(merged, key=lambda entry: entry[0]):
+                    postings = [posting for _, run_postings in entries for posting in run_postings]
+                    np.asarray(postings, dtype=np.int32).tofile(out)
+                    lexicon[term] = (offset, len(postings))
+                    offset += len(postings)
+            os.replace(postings_path + ".tmp", postings_path)
+            with open(os.path.join(self.index_dir, LEXICON_FILE), 'wb') as f:
+                pickle.dump(lexicon, f)
+        finally:
+            shutil.rmtree(self.run_dir, ignore_errors=True)
+        logger.info(f"Merged {len(self.runs)} runs into {len(lexicon)} terms and {offset} postings")
+        return {term: df for term, (_, df) in lexicon.items()}
+
+
+class DiskPostings(Mapping):
+    """Read-only term -> [(doc_id, freq), ...] view over a memory-mapped postings file"""
+
+    def __init__(self, index_dir):
+        with open(os.path.join(index_dir, LEXICON_FILE), 'rb') as f:
+            self.lexicon = pickle.load(f)
+        path = os.path.join(index_dir, POSTINGS_FILE)
+        if os.path.getsize(path):
+            self.postings = np.memmap(path, dtype=np.int32, mode='r').reshape(-1, 2)
+        else:
+            self.postings = np.zeros((0, 2), dtype=np.int32)
+
+    def __getitem__(self, term):
+        offset, df = self.lexicon[term]
+        block = self.postings[offset:offset + df]
+        return list(zip(block[:, 0].tolist(), block[:, 1].tolist()))
+
+    def __contains__(self, term):
+        return term in self.lexicon
+
+    def __iter__(self):
+        return iter(self.lexicon)
+
+    def __len__(self):
+        return len(self.lexicon)
+
+    @staticmethod
+    def exists(index_dir):
+        return os.path.exists(os.path.join(index_dir, LEXICON_FILE))
@@ -0,0 +1,103 @@
+import os
+import atexit
+import sys
+import pickle
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import log_config
+
+# Entry points configure logging on import, tests must not write the repo's log files
+log_config._configured = True
+
+from benchmark import generate_corpus
+
+PERSON = "https://pureportal.coventry.ac.uk/en/persons/"
+
+MEMBERS = [
+    ("Olubunmi Ajala", PERSON + "olubunmi-ajala"),
+    ("Wei Song", PERSON + "wei-song"),
+    ("Simon Huston", PERSON + "simon-huston"),
+]
+
+TEMPLATE = [
+    {'Title': 'Fostering Entrepreneurship and Innovation in Nigerian Universities', 'Authors': ['Ajala, O.'],
+     'Year': 'Jan 2025', 'Author Profile Links': [PERSON + 'olubunmi-ajala'], 'Journal': 'Journal of Enterprise'},
+    {'Title': 'Fintech adoption and financial inclusion in emerging markets', 'Authors': ['Song, W.', 'Kay, R.'],
+     'Year': '2 Mar 2022', 'Author Profile Links': [PERSON + 'wei-song', PERSON + 'rachel-kay'],
+     'Journal': 'Finance Research Letters'},
+    {'Title': 'Urban land markets and the economics of Kuala Lumpur housing', 'Authors': ['Huston, S.'],
+     'Year': '2019', 'Author Profile Links': [PERSON + 'simon-huston'], 'Journal': 'Journal of Property Research'},
+    {'Title': 'Blockchain, digital finance and bank lending to small firms', 'Authors': ['Okafor, C.'],
+     'Year': '17 Sept 2021', 'Author Profile Links': [PERSON + 'chidi-okafor'], 'Journal': 'Finance Research Letters'},
+    {'Title': 'Monetary policy transmission and inflation expectations', 'Authors': ['Bediako, B.', 'Song, W.'],
+     'Year': 'May 2018', 'Author Profile Links': [PERSON + 'bismark-bediako', PERSON + 'wei-song'],
+     'Journal': 'Economic Modelling'},
+    {'Title': 'Climate risk disclosure and corporate governance quality', 'Authors': ['Noah, A.'],
+     'Year': '25 Nov 2016', 'Author Profile Links': [PERSON + 'abdurafiu-noah'], 'Journal': ''},
+]
+
+
+def make_corpus(size, seed=0, abstract_words=20):
+    return generate_corpus(TEMPLATE, size, seed=seed, abstract_words=abstract_words)
+
+
+def write_data(data_dir, publications, members=MEMBERS):
+    os.makedirs(data_dir, exist_ok=True)
+    with open(os.path.join(data_dir, "publications.pkl"), 'wb') as f:
+        pickle.dump(publications, f)
+    with open(os.path.join(data_dir, "department_members.pkl"), 'wb') as f:
+        pickle.dump(members, f)
+
+
+@pytest.fixture
+def data_dir(tmp_path):
+    """A data directory with 300 synthetic publications and the department members"""
+    path = str(tmp_path / "data")
+    write_data(path, make_corpus(300))
+    return path
+
+
+@pytest.fixture
+def built_index(data_dir, tmp_path):
+    """(data_dir, index_dir) of a freshly built index"""
+    from inverted_index import InvertedIndex
+
+    index_dir = str(tmp_path / "index")
+    assert InvertedIndex(data_dir=data_dir, index_dir=index_dir).build_index()
+    return data_dir, index_dir
+
+
+@pytest.fixture
+def processor(built_index):
+    from query_processor import QueryProcessor
+
+    data_dir, index_dir = built_index
+    return QueryProcessor(data_dir=data_dir, index_dir=index_dir)
+
+
+@pytest.fixture(scope='session')
+def web_app(tmp_path_factory):
+    """The app module, imported in a directory with a freshly built index, its query and job logs stay there"""
+    from inverted_index import InvertedIndex
+
+    root = tmp_path_factory.mktemp("app")
+    write_data(str(root), make_corpus(300))
+    assert InvertedIndex(data_dir=str(root), index_dir=str(root / "index_data")).build_index()
+    cwd = os.getcwd()
+    os.chdir(root)
+    try:
+        import app
+        yield app
+        app.cleanup()
+        # Already done, at exit it would write the job state into the working directory
+        atexit.unregister(app.cleanup)
+    finally:
+        os.chdir(cwd)
+
+
+@pytest.fixture
+def client(web_app):
+    return web_app.app.test_client()
@@ -0,0 +1,24 @@
+from analysis import Analyzer
+
+
+def test_query_stems_are_memoized_up_to_the_limit():
+    analyzer = Analyzer(memo_size=3)
+    words = ["banking", "markets", "policies", "economies", "financing"]
+    stems = [analyzer.stem(word) for word in words]
+    assert stems == [Analyzer().stem(word) for word in words]
+    assert len(analyzer.stems) == 3
+    # Words past the limit are still stemmed, only not remembered
+    assert analyzer.stem("financing") == "financ"
+    assert len(analyzer.stems) == 3
+
+
+def test_loaded_stems_do_not_count_against_the_limit(tmp_path):
+    indexer = Analyzer()
+    terms = indexer.analyze("Banking markets and monetary policies in emerging economies")
+    assert indexer.save(str(tmp_path))
+
+    analyzer = Analyzer(memo_size=1)
+    assert analyzer.load(str(tmp_path))
+    assert analyzer.analyze("Banking markets and monetary policies in emerging economies") == terms
+    analyzer.analyze("lending regulations")
+    assert len(analyzer.stems) == len(indexer.stems) + 1
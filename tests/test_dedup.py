@@ -0,0 +1,78 @@
+import numpy as np
+
+from conftest import make_corpus
+from dedup import PublicationDeduplicator, MAX_BUCKET_FANOUT
+
+
+def publication(title, year, authors=('Song, W.',)):
+    return {'Title': title, 'Year': year, 'Authors': list(authors), 'Abstract': ''}
+
+
+def clusters(publications):
+    return [members for members in PublicationDeduplicator().find_clusters(publications) if len(members) > 1]
+
+
+def test_preprint_and_journal_version_are_merged():
+    publications = [
+        publication("UK Consumers' Perceived Risk of Buying Products from Emerging Economies", 'May 2018'),
+        publication("UK consumers' perceived risk of buying products from emerging economies", 2016),
+        publication("Monetary policy transmission and inflation expectations", 2018),
+    ]
+    assert clusters(publications) == [[0, 1]]
+
+
+def test_typos_and_plurals_are_merged():
+    publications = [
+        publication("Connected Vehicles: Performance Convenience and Safety verses Security", 2016, ()),
+        publication("Connected Vehicles: Performance Convenience and Safety versus Security", 2016, ()),
+        publication("Equilibrium Interaction of Borrowing and Short-Sale Constraints and Asset Prices", 2016, ()),
+        publication("Equilibrium Interaction of Borrowing and Short-Sales Constraints and Asset Prices", 2016, ()),
+    ]
+    assert clusters(publications) == [[0, 1], [2, 3]]
+
+
+def test_volumes_with_one_word_swapped_stay_apart():
+    suffix = ": Proceedings of the 28th Eurasia Business and Economics Society Conference"
+    publications = [
+        publication("Eurasian Business Perspectives" + suffix, '28 Jun 2020', ('Tony-Okeke, U.',)),
+        publication("Eurasian Economic Perspectives" + suffix, '28 Jun 2020', ('Tony-Okeke, U.',)),
+    ]
+    assert clusters(publications) == []
+
+
+def test_deduplicate_keeps_the_most_complete_record_with_aliases():
+    publications = [
+        publication("What drives corporate governance quality in emerging African economies", 2016),
+        dict(publication("What Drives Corporate Governance Quality in Emerging African Economies", 2016),
+             Abstract="A longer record", **{'Publication Link': 'https://example.org/b'}),
+    ]
+    canonical = PublicationDeduplicator().deduplicate(publications)
+    assert len(canonical) == 1
+    assert canonical[0]['Abstract'] == "A longer record"
+    assert [alias['Title'] for alias in canonical[0]['Aliases']] == [publications[0]['Title']]
+
+
+def test_batched_signatures_equal_single_ones():
+    deduplicator = PublicationDeduplicator()
+    shingle_sets = [deduplicator.shingles(pub) for pub in make_corpus(50, seed=3)] + [set()]
+    signatures = deduplicator.signatures(shingle_sets, batch_size=7)
+    for row, shingles in zip(signatures, shingle_sets):
+        assert np.array_equal(row, deduplicator.signature(shingles))
+
+
+def test_duplicates_are_found_in_a_large_corpus():
+    publications = make_corpus(3000, seed=8)
+    copies = [dict(publications[doc_id], Title=publications[doc_id]['Title'].upper()) for doc_id in range(0, 3000, 60)]
+    found = clusters(publications + copies)
+    assert sorted(found) == [[doc_id, 3000 + number] for number, doc_id in enumerate(range(0, 3000, 60))]
+
+
+def test_pair_checks_stay_linear_in_one_huge_bucket():
+    # Every record shares its title, the old all-pairs bucket scan made 2 million checks here
+    publications = [publication("Monetary policy transmission and inflation expectations in emerging markets", 2018,
+                                (f"Author{number:04d}, A.",)) for number in range(2000)]
+    deduplicator = PublicationDeduplicator()
+    shingle_sets = [deduplicator.shingles(pub) for pub in publications]
+    pairs = deduplicator.candidate_pairs(deduplicator.signatures(shingle_sets), np.arange(len(publications)))
+    assert len(pairs) <= len(publications) * deduplicator.bands * MAX_BUCKET_FANOUT // 8
+    assert clusters(publications) == [list(range(2000))]
@@ -0,0 +1,76 @@
+import math
+
+import pytest
+
+from expansion import ExpansionIndex, MIN_NPMI
+
+
+def clustered_index(num_docs=100):
+    """Postings where fintech, blockchain and crypto occur together, and filler terms at random strides"""
+    index = {}
+    for doc_id in range(num_docs):
+        terms = ['term%d' % (doc_id % stride) for stride in (7, 11, 13)]
+        if doc_id % 10 == 0:
+            terms += ['fintech', 'blockchain']
+        if doc_id % 20 == 0:
+            terms.append('crypto')
+        for term in terms:
+            index.setdefault(term, []).append((doc_id, 1))
+    idf = {term: math.log10(num_docs / len(postings)) for term, postings in index.items()}
+    return index, idf
+
+
+def test_neighbours_are_the_strongest_npmi_pairs():
+    index, idf = clustered_index()
+    expansion = ExpansionIndex(top_k=2)
+    assert expansion.build(index, idf, 100)
+    assert [term for term, _ in expansion.neighbours['fintech']] == ['blockchain', 'crypto']
+    assert expansion.neighbours['fintech'][0][1] == pytest.approx(1.0)
+
+    documents = {term: {doc_id for doc_id, _ in postings} for term, postings in index.items()}
+    for term, neighbours in expansion.neighbours.items():
+        assert 0 < len(neighbours) <= expansion.top_k
+        assert [weight for _, weight in neighbours] == sorted((weight for _, weight in neighbours), reverse=True)
+        for neighbour, weight in neighbours:
+            assert neighbour != term
+            joint = len(documents[term] & documents[neighbour]) / 100
+            npmi = math.log(joint / (len(documents[term]) / 100 * len(documents[neighbour]) / 100)) / -math.log(joint)
+            assert weight == pytest.approx(npmi, abs=1e-4)
+            assert weight >= MIN_NPMI - 1e-4
+
+
+def test_expand_never_adds_query_terms():
+    expansion = ExpansionIndex()
+    expansion.neighbours = {'bank': [('lend', 0.8), ('credit', 0.5)], 'credit': [('lend', 0.9), ('bank', 0.5)]}
+    assert expansion.expand(['bank', 'credit'], 0.5) == {'lend': pytest.approx(0.45)}
+    assert expansion.expand(['bank']) == {'lend': 0.8, 'credit': 0.5}
+    assert expansion.expand(['unknown']) == {}
+
+
+def test_expanded_search_keeps_the_unexpanded_matches(processor):
+    processor.expansion_index().neighbours = {'bank': [('monetari', 0.6)], 'lend': [('inflat', 0.4)]}
+    query = "bank lending"
+    terms, weights = processor.expand_query(processor.preprocess_query(query))
+    assert terms[:2] == ['bank', 'lend'] and sorted(terms[2:]) == ['inflat', 'monetari']
+    assert weights == {'monetari': pytest.approx(0.6 * processor.expansion_weight),
+                       'inflat': pytest.approx(0.4 * processor.expansion_weight)}
+    plain = processor.search(query, max_results=1000)
+    expanded = processor.search(query, max_results=1000, expand=True)
+    assert {result['doc_id'] for result in plain} < {result['doc_id'] for result in expanded}
+
+
+def test_neighbours_round_trip(tmp_path):
+    expansion = ExpansionIndex()
+    expansion.build(*clustered_index(), 100)
+    assert expansion.save(str(tmp_path))
+    loaded = ExpansionIndex()
+    assert loaded.load(str(tmp_path))
+    assert loaded.neighbours == expansion.neighbours
+
+
+def test_expanded_searches_are_left_to_flask(web_app):
+    import asgi
+
+    scope = {'method': 'GET', 'path': '/api/search', 'query_string': b'query=finance&expand=1'}
+    assert asgi.pooled_search_args(scope) is None
+    assert asgi.pooled_search_args(dict(scope, query_string=b'query=finance&expand=0')) is not None
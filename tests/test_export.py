@@ -0,0 +1,48 @@
+import io
+import csv
+import json
+
+
+def export(client, **params):
+    response = client.get('/api/export', query_string=params)
+    assert response.status_code == 200
+    return response
+
+
+def test_ndjson_export_has_every_match_in_search_order(client, web_app):
+    processor = web_app.query_processor
+    response = export(client, query='bank lending')
+    assert response.mimetype == 'application/x-ndjson'
+    assert response.headers['Content-Disposition'] == 'attachment; filename=publications.ndjson'
+    rows = [json.loads(line) for line in response.get_data(as_text=True).splitlines()]
+    matched = processor.matching_doc_ids('bank lending')
+    assert len(rows) == len(matched)
+    assert [row['doc_id'] for row in rows[:10]] == [r['doc_id'] for r in processor.search('bank lending')]
+    assert [row['doc_id'] for row in rows] == [r['doc_id'] for r in processor.search('bank lending', len(matched))]
+
+
+def test_csv_export_flattens_lists(client, web_app):
+    response = export(client, query='finance', format='csv', year='2018..2022')
+    assert response.mimetype == 'text/csv'
+    rows = list(csv.DictReader(io.StringIO(response.get_data(as_text=True))))
+    assert rows
+    expected = web_app.query_processor.search('finance', 1000, year_range=(2018, 2022))
+    assert [int(row['doc_id']) for row in rows] == [r['doc_id'] for r in expected]
+    assert rows[0]['authors'] == '; '.join(expected[0]['authors'])
+
+
+def test_export_without_a_query_lists_a_member_newest_first(client, web_app):
+    members = web_app.query_processor.member_index()
+    rows = [json.loads(line) for line in export(client, member='1').get_data(as_text=True).splitlines()]
+    assert [row['doc_id'] for row in rows] == members.doc_ids(1).tolist()
+
+
+def test_export_chunks_equal_one_pass(processor):
+    whole = [(r['doc_id'], r['score']) for r in processor.iter_export('policy', chunk_size=10_000)]
+    chunked = [(r['doc_id'], r['score']) for r in processor.iter_export('policy', chunk_size=7)]
+    assert chunked == whole and len(whole) > 7
+
+
+def test_bad_export_parameters_are_rejected(client):
+    assert client.get('/api/export', query_string={'format': 'xml'}).status_code == 400
+    assert client.get('/api/export', query_string={'query': 'finance', 'recency': 'soon'}).status_code == 400
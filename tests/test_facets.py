@@ -0,0 +1,69 @@
+from collections import Counter
+
+import numpy as np
+
+from conftest import make_corpus
+from facets import FacetIndex
+
+
+def test_saved_value_ids_count_like_the_built_ones(tmp_path):
+    publications = make_corpus(80, seed=6) + [{'Title': 'No facets'}]
+    built = FacetIndex()
+    built.build(publications)
+    assert built.values['year'] == sorted(built.values['year'])
+    assert built.save(str(tmp_path))
+
+    loaded = FacetIndex()
+    assert loaded.load(str(tmp_path))
+    assert len(loaded) == len(publications)
+    matched = np.arange(0, len(publications), 3)
+    assert loaded.counts(matched, limit=100) == built.counts(matched, limit=100)
+    assert loaded.counts(np.zeros(0, dtype=np.int64)) == {facet: [] for facet in FacetIndex.FACETS}
+    for facet in FacetIndex.FACETS:
+        # One entry per distinct value of each document
+        expected = [FacetIndex.facet_values(publications[doc_id])[facet] for doc_id in matched]
+        assert [loaded.values[facet][value_id] for value_id in loaded.value_ids(facet, matched)] == \
+            [value for values in expected for value in dict.fromkeys(values)]
+
+
+def test_indexes_saved_without_value_ids_rebuild_them(processor, tmp_path):
+    processor.facets = FacetIndex()
+    assert not processor.facets.load(str(tmp_path))
+    matched = processor.matching_doc_ids("finance")
+    assert processor.facet_counts(matched)['year']
+    assert len(processor.facets) == len(processor.publications)
+
+
+def test_facet_values_are_normalized():
+    values = FacetIndex.facet_values({'Year': '17 Sept 2021', 'Authors': ['Song, W.', ' '],
+                                      'Journal': 'In: Finance Research Letters.'})
+    assert values == {'year': ['2021'], 'author': ['Song, W.'], 'journal': ['Finance Research Letters']}
+
+
+def brute_force_counts(processor, doc_ids, facet):
+    counts = Counter()
+    for doc_id in doc_ids:
+        counts.update(set(FacetIndex.facet_values(processor.publications[doc_id])[facet]))
+    return counts
+
+
+def test_counts_equal_brute_force_over_the_matches(processor):
+    matched = processor.matching_doc_ids("finance bank")
+    assert np.array_equal(matched, np.unique(matched))
+    processor.build_bm25_matrix()
+    assert np.array_equal(processor.matching_doc_ids("finance bank"), matched)
+    facets = processor.facet_counts(matched, limit=5)
+    for facet in FacetIndex.FACETS:
+        expected = brute_force_counts(processor, matched, facet)
+        top = sorted(expected.items(), key=lambda item: (-item[1], item[0]))[:5]
+        if facet == 'year':
+            top.sort(key=lambda item: item[0], reverse=True)
+        assert [(entry['value'], entry['count']) for entry in facets[facet]] == top
+
+
+def test_search_api_returns_facets_of_every_match(client, web_app):
+    response = client.get('/api/search', query_string={'query': 'finance'}).get_json()
+    processor = web_app.query_processor
+    matched = processor.matching_doc_ids('finance')
+    assert response['facets']['year'] == processor.facet_counts(matched)['year']
+    assert client.get('/api/search', query_string={'query': 'finance', 'facets': '0'}).get_json()['facets'] == {}
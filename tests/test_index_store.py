@@ -0,0 +1,173 @@
+import os
+import sys
+import subprocess
+
+import pytest
+
+from index_store import IndexStore, GenerationConflict, READERS_DIR
+from inverted_index import InvertedIndex
+from rerank import MODEL_FILE
+
+
+def write(path, text):
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write(text)
+
+
+def read(path):
+    with open(path, 'r', encoding='utf-8') as f:
+        return f.read()
+
+
+def commit(store, text, base=None):
+    staging = store.begin(base=base)
+    write(os.path.join(staging, "index.pkl"), text)
+    return store.commit(staging, documents=len(text))
+
+
+@pytest.fixture
+def store(tmp_path):
+    return IndexStore(str(tmp_path / "index"), keep=3)
+
+
+def test_commit_moves_current_to_a_verified_generation(store):
+    assert store.open() is None
+    assert commit(store, "first") == 1
+    assert commit(store, "second") == 2
+    assert store.current_generation() == 2
+    assert read(os.path.join(store.open(), "index.pkl")) == "second"
+    assert store.manifest(2)['documents'] == 6
+    assert store.verify(2) == []
+    assert not any(name.startswith('.staging-') for name in os.listdir(store.index_dir))
+
+
+def test_a_crashed_build_leaves_the_current_generation_readable(store):
+    commit(store, "first")
+    staging = store.begin(base=store.open())
+    write(os.path.join(staging, "index.pkl.tmp"), "half written")
+    # The build dies here, before commit
+    assert store.current_generation() == 1
+    assert read(os.path.join(store.open(), "index.pkl")) == "first"
+    assert os.path.isdir(staging)
+
+
+def test_a_damaged_generation_falls_back_to_the_previous_one(store):
+    commit(store, "first")
+    commit(store, "second")
+    path = os.path.join(store.path(2), "index.pkl")
+    os.truncate(path, 3)
+    assert store.verify(2) == ["index.pkl has 3 bytes, expected 6"]
+    assert store.open() == store.path(1)
+
+    # Same size, different bytes, only the checksums notice
+    write(path, "SECOND")
+    assert store.open(checksums=False) == store.path(2)
+    assert store.verify(2) == ["index.pkl checksum mismatch"]
+    assert store.open() == store.path(1)
+
+
+def test_only_the_first_open_of_a_generation_checks_checksums(store):
+    commit(store, "first")
+    assert store.open() == store.path(1)
+    # Damaged after it was verified, later opens only compare sizes
+    write(os.path.join(store.path(1), "index.pkl"), "FIRST")
+    assert store.open() == store.path(1)
+
+    commit(store, "second")
+    write(os.path.join(store.path(2), "index.pkl"), "SECOND")
+    assert store.open() == store.path(1)
+
+
+def test_old_generations_are_collected(tmp_path):
+    store = IndexStore(str(tmp_path / "index"), keep=2)
+    for text in ("a", "b", "c", "d"):
+        commit(store, text)
+    assert store.generations() == [4, 3]
+
+
+def test_collect_keeps_generations_readers_have_pinned(tmp_path):
+    store = IndexStore(str(tmp_path / "index"), keep=2)
+    commit(store, "a")
+    pin = store.pin(store.open())
+    for text in ("b", "c", "d"):
+        commit(store, text)
+    assert store.generations() == [4, 3, 1]
+
+    store.unpin(pin)
+    commit(store, "e")
+    assert store.generations() == [5, 4]
+    assert store.pin(store.path(1)) is None
+
+
+def test_pins_of_readers_that_are_gone_are_ignored(tmp_path):
+    store = IndexStore(str(tmp_path / "index"), keep=1)
+    commit(store, "a")
+    reader = subprocess.run([sys.executable, "-c", "import os; print(os.getpid())"],
+                            capture_output=True, text=True, check=True)
+    readers = os.path.join(store.index_dir, READERS_DIR)
+    os.makedirs(readers)
+    write(os.path.join(readers, f"{reader.stdout.strip()}-dead"), "1\n")
+    commit(store, "b")
+    assert store.generations() == [2]
+    assert os.listdir(readers) == []
+
+
+def test_a_server_keeps_the_generation_it_loaded(processor, built_index):
+    data_dir, index_dir = built_index
+    loaded = processor.index_path
+    for _ in range(3):
+        assert InvertedIndex(data_dir=data_dir, index_dir=index_dir).build_index()
+    assert os.path.isdir(loaded)
+    # Lazily loaded parts still read the pinned generation
+    processor.snippets = type(processor.snippets)(processor.analyzer)
+    assert len(processor.snippet_index()) == len(processor.publications)
+
+    # Reloading moves the pin to the current generation, the old one is collected at the next commit
+    processor.load_data()
+    assert processor.index_path == IndexStore(index_dir).open()
+    assert InvertedIndex(data_dir=data_dir, index_dir=index_dir).build_index()
+    assert not os.path.isdir(loaded)
+
+
+def test_commit_refuses_a_staging_directory_whose_base_moved_on(store):
+    commit(store, "first")
+    slow = store.begin(base=store.open())
+    write(os.path.join(slow, "extra.pkl"), "slow writer")
+    commit(store, "second")
+
+    with pytest.raises(GenerationConflict):
+        store.commit(slow)
+    assert store.current_generation() == 2
+    assert read(os.path.join(store.open(), "index.pkl")) == "second"
+
+    # Rebased, it carries the new generation's index and keeps its own files
+    store.rebase(slow, files=("index.pkl",))
+    assert store.commit(slow) == 3
+    assert read(os.path.join(store.path(3), "index.pkl")) == "second"
+    assert read(os.path.join(store.path(3), "extra.pkl")) == "slow writer"
+    assert set(store.manifest(3)['files']) == {"index.pkl", "extra.pkl"}
+
+
+def test_a_build_keeps_a_model_committed_while_it_ran(built_index, monkeypatch):
+    data_dir, index_dir = built_index
+    store = IndexStore(index_dir)
+    builder = InvertedIndex(data_dir=data_dir, index_dir=index_dir)
+    assert builder.build_index()
+    generation = store.current_generation()
+
+    # A rerank model is committed between the build's begin and its commit
+    begin = store.begin
+
+    def begin_then_train(*args, **kwargs):
+        staging = begin(*args, **kwargs)
+        model = begin(base=store.open())
+        write(os.path.join(model, MODEL_FILE), "model")
+        store.commit(model, rerank_model='linear')
+        return staging
+
+    builder.store = store
+    monkeypatch.setattr(store, 'begin', begin_then_train)
+    assert builder.save_index()
+    assert store.current_generation() == generation + 2
+    assert read(os.path.join(store.open(), MODEL_FILE)) == "model"
+    assert store.verify(generation + 2) == []
@@ -0,0 +1,98 @@
+import time
+import threading
+
+import pytest
+
+from jobs import JobOrchestrator, Job
+
+
+def wait_for(condition, timeout=5.0):
+    deadline = time.time() + timeout
+    while not condition():
+        assert time.time() < deadline, "timed out"
+        time.sleep(0.01)
+
+
+@pytest.fixture
+def orchestrator(tmp_path):
+    orchestrator = JobOrchestrator(str(tmp_path / "jobs.json"))
+    yield orchestrator
+    orchestrator.shutdown(timeout=2.0)
+
+
+def test_jobs_run_one_at_a_time_in_order(orchestrator):
+    order, running = [], []
+
+    def work(job, name):
+        running.append(name)
+        assert len(running) == 1
+        job.progress('work', 1, 2)
+        order.append(name)
+        job.finish_stage('work')
+        running.remove(name)
+
+    orchestrator.register('a', work)
+    orchestrator.register('b', work)
+    orchestrator.start()
+    first, _ = orchestrator.submit('a', name='a')
+    second, _ = orchestrator.submit('b', name='b')
+    wait_for(lambda: second.status == 'succeeded')
+    assert order == ['a', 'b'] and first.status == 'succeeded'
+    stage = first.to_dict()['stages'][0]
+    assert stage['done'] == stage['total'] == 2 and stage['finished']
+
+
+def test_one_active_job_per_kind_and_cooperative_cancel(orchestrator):
+    started, release = threading.Event(), threading.Event()
+
+    def crawl(job):
+        started.set()
+        while True:
+            release.wait(0.01)
+            job.progress('crawl')
+
+    orchestrator.register('crawl', crawl)
+    orchestrator.start()
+    job, created = orchestrator.submit('crawl')
+    assert created
+    assert orchestrator.submit('crawl') == (job, False)
+    started.wait(5)
+    assert orchestrator.running() is job
+    assert orchestrator.cancel(job.id)
+    wait_for(lambda: job.status == 'cancelled')
+    assert not orchestrator.cancel(job.id)
+    with pytest.raises(ValueError):
+        orchestrator.submit('unknown')
+
+
+def test_failures_are_recorded(orchestrator):
+    def broken(job):
+        raise RuntimeError("no network")
+
+    orchestrator.register('crawl', broken)
+    orchestrator.start()
+    job, _ = orchestrator.submit('crawl')
+    wait_for(lambda: job.status == 'failed')
+    assert job.error == "no network"
+
+
+def test_a_restart_requeues_queued_jobs_and_interrupts_running_ones(tmp_path):
+    path = str(tmp_path / "jobs.json")
+    before = JobOrchestrator(path)
+    before.register('index', lambda job: None)
+    running, queued = Job('index'), Job('index')
+    running.status = 'running'
+    before._track(running)
+    before._track(queued)
+    before._save(force=True)
+
+    done = threading.Event()
+    after = JobOrchestrator(path)
+    after.register('index', lambda job: done.set())
+    after.start()
+    try:
+        assert done.wait(5)
+        wait_for(lambda: after.get(queued.id).status == 'succeeded')
+        assert after.get(running.id).status == 'interrupted'
+    finally:
+        after.shutdown(timeout=2.0)
@@ -0,0 +1,94 @@
+import numpy as np
+import pytest
+
+from conftest import PERSON
+from members import MemberIndex, profile_key
+
+
+def brute_force_members(processor):
+    keys = {profile_key(url): member_id for member_id, (_, url) in enumerate(processor.member_index().members)}
+    owners = {}
+    for doc_id, publication in enumerate(processor.publications):
+        for url in publication.get('Author Profile Links', []):
+            if profile_key(url) in keys:
+                owners.setdefault(keys[profile_key(url)], set()).add(doc_id)
+    return owners
+
+
+def test_member_lists_and_bits_match_the_publications(processor):
+    members = processor.member_index()
+    owners = brute_force_members(processor)
+    member_docs = set().union(*owners.values())
+    assert [members.is_member_document(doc_id) for doc_id in range(len(processor.publications))] == \
+        [doc_id in member_docs for doc_id in range(len(processor.publications))]
+    ordinals = processor.date_index().ordinals
+    for member_id in range(len(members.members)):
+        doc_ids = members.doc_ids(member_id)
+        assert set(doc_ids.tolist()) == owners.get(member_id, set())
+        # Newest first
+        assert np.all(np.diff(ordinals[doc_ids]) <= 0)
+    assert members.publication_counts().tolist() == [len(owners.get(i, ())) for i in range(len(members.members))]
+    assert members.contains([0, len(members) + 5]).tolist() == [members.is_member_document(0), False]
+
+
+def test_profile_links_match_without_scheme_or_trailing_slash():
+    assert profile_key("HTTPS://PurePortal.coventry.ac.uk/en/persons/wei-song/?tab=x") == \
+        profile_key(PERSON + "wei-song")
+
+
+def test_members_only_search_keeps_member_documents(processor):
+    members = processor.member_index()
+    everything = processor.search("finance", max_results=1000)
+    only = processor.search("finance", max_results=20, members_only=True)
+    assert len(only) == 20
+    assert [result['doc_id'] for result in only] == \
+        [result['doc_id'] for result in everything if members.is_member_document(result['doc_id'])][:20]
+
+
+def test_member_index_round_trips(processor, tmp_path):
+    members = processor.member_index()
+    assert members.save(str(tmp_path))
+    loaded = MemberIndex()
+    assert loaded.load(str(tmp_path))
+    assert np.array_equal(loaded.flags, members.flags)
+    assert np.array_equal(loaded.docs, members.docs)
+    assert loaded.members == members.members
+
+
+@pytest.mark.parametrize('query_string', [b'query=finance&members=1', b'query=finance&members=',
+                                          b'query=finance&member=1'])
+def test_member_searches_are_left_to_flask(web_app, query_string):
+    import asgi
+
+    scope = {'method': 'GET', 'path': '/api/search', 'query_string': query_string}
+    assert asgi.pooled_search_args(scope) is None
+    assert asgi.pooled_search_args(dict(scope, query_string=b'query=finance&members=0')) is not None
+
+
+def test_member_search_api(client, web_app):
+    members = web_app.query_processor.member_index()
+    response = client.get('/api/search', query_string={'query': 'finance', 'members': '1'}).get_json()
+    assert response['success'] and response['results']
+    assert all(members.is_member_document(result['doc_id']) for result in response['results'])
+    listed = client.get('/api/members').get_json()['members']
+    assert [member['name'] for member in listed] == [name for name, _ in members.members]
+
+
+def test_member_search_ranks_within_the_member(processor):
+    members = processor.member_index()
+    everything = processor.search("finance", max_results=1000)
+    for member_id in range(len(members.members)):
+        expected = [r['doc_id'] for r in everything if r['doc_id'] in set(members.doc_ids(member_id).tolist())][:10]
+        results = processor.search("finance", max_results=10, member_id=member_id)
+        assert [r['doc_id'] for r in results] == expected and len(expected) == 10
+
+
+def test_member_search_api_fills_the_page(client, web_app):
+    members = web_app.query_processor.member_index()
+    for member_id in range(len(members.members)):
+        response = client.get('/api/search', query_string={'query': 'finance', 'member': member_id}).get_json()
+        assert len(response['results']) == 10
+        assert set(r['doc_id'] for r in response['results']) <= set(members.doc_ids(member_id).tolist())
+        processor = web_app.query_processor
+        matched = set(processor.matching_doc_ids('finance')) & set(members.doc_ids(member_id).tolist())
+        assert response['facets'] == processor.facet_counts(sorted(matched))
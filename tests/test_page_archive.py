@@ -0,0 +1,62 @@
+import os
+import gzip
+
+from page_archive import PageArchive, ARCHIVE_FILE, INDEX_FILE
+
+
+def page(number):
+    return f"<html><body><h3>Publication {number} ü</h3></body></html>"
+
+
+def archive_pages(data_dir, count, crawl='c1'):
+    archive = PageArchive(str(data_dir))
+    for number in range(count):
+        archive.append(f"https://example.org/pages/{number}", page(number), crawl=crawl, kind='publications',
+                       page=number)
+    return archive
+
+
+def test_pages_are_read_back_by_url_and_crawl(tmp_path):
+    archive_pages(tmp_path, 3)
+    archive_pages(tmp_path, 2, crawl='c2')
+    archive = PageArchive(str(tmp_path))
+    assert len(archive) == 5
+    assert archive.crawls() == ['c1', 'c2']
+    assert [entry['page'] for entry in archive.pages()] == [0, 1]
+    assert [entry['page'] for entry in archive.pages('c1')] == [0, 1, 2]
+    assert archive.get("https://example.org/pages/2") == page(2)
+    assert archive.get("https://example.org/missing") is None
+    # Every record is its own gzip member, together a valid .warc.gz
+    with gzip.open(tmp_path / ARCHIVE_FILE, 'rb') as f:
+        assert f.read().count(b"WARC/1.0\r\n") == 5
+
+
+def test_records_missing_from_the_index_are_recovered(tmp_path):
+    archive_pages(tmp_path, 4)
+    index_path = tmp_path / INDEX_FILE
+    lines = index_path.read_text(encoding='utf-8').splitlines(keepends=True)
+    # The crash hit while the third index line was being written
+    index_path.write_text(lines[0] + lines[1] + lines[2][:10], encoding='utf-8')
+
+    archive = PageArchive(str(tmp_path))
+    assert [entry['page'] for entry in archive.entries] == [0, 1, 2, 3]
+    assert [archive.read(entry) for entry in archive.entries] == [page(number) for number in range(4)]
+    assert len(PageArchive(str(tmp_path))) == 4
+
+
+def test_a_truncated_record_is_dropped(tmp_path):
+    archive = archive_pages(tmp_path, 3)
+    last = archive.entries[-1]
+    path = tmp_path / ARCHIVE_FILE
+    # The crash hit while the last record was being written, before its index line
+    os.truncate(path, last['offset'] + last['length'] // 2)
+    index_path = tmp_path / INDEX_FILE
+    lines = index_path.read_text(encoding='utf-8').splitlines(keepends=True)
+    index_path.write_text(''.join(lines[:2]), encoding='utf-8')
+
+    archive = PageArchive(str(tmp_path))
+    assert [entry['page'] for entry in archive.entries] == [0, 1]
+    assert os.path.getsize(path) == last['offset']
+    # Appending after recovery leaves a readable archive
+    archive.append("https://example.org/pages/9", page(9), crawl='c1', kind='publications', page=9)
+    assert PageArchive(str(tmp_path)).get("https://example.org/pages/9") == page(9)
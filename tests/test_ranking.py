@@ -0,0 +1,38 @@
+import pytest
+
+from benchmark import generate_queries
+
+
+@pytest.fixture
+def queries(processor):
+    return generate_queries(processor.publications, 60, seed=7) + ['finance bank', 'policy policy inflation']
+
+
+@pytest.mark.parametrize('prior_weight', [0.0, 1.0, 25.0])
+def test_max_score_top_k_equals_exhaustive_ranking(processor, queries, prior_weight):
+    processor.prior_weight = prior_weight
+    for query in queries:
+        terms = processor.preprocess_query(query)
+        exhaustive = processor.rank_bm25(terms)
+        for k in (1, 5, 20):
+            assert processor.rank_bm25(terms, limit=k) == exhaustive[:k], (query, k)
+
+
+def test_max_score_with_expansion_weights(processor, queries):
+    for query in queries:
+        terms, weights = processor.expand_query(processor.preprocess_query(query))
+        assert processor.rank_bm25(terms, limit=10, term_weights=weights) == \
+            processor.rank_bm25(terms, term_weights=weights)[:10]
+
+
+def test_ties_are_ordered_by_doc_id(processor, queries):
+    for query in queries:
+        ranked = processor.rank_bm25(processor.preprocess_query(query))
+        keys = [(-score, doc_id) for doc_id, score in ranked]
+        assert keys == sorted(keys)
+
+
+def test_date_ranking_agrees_with_bm25_without_filters(processor, queries):
+    for query in queries:
+        terms = processor.preprocess_query(query)
+        assert processor.rank_by_date(terms, 10, members_only=False) == processor.rank_bm25(terms, limit=10)
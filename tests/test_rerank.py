@@ -0,0 +1,50 @@
+import os
+import json
+
+import rerank
+from index_store import IndexStore
+from inverted_index import InvertedIndex
+from query_processor import QueryProcessor
+from rerank import MODEL_FILE, model_path, saved_models
+
+
+def write_click_log(path, processor, queries=('finance', 'bank lending', 'monetary policy', 'housing markets')):
+    with open(path, 'w', encoding='utf-8') as f:
+        for number, query in enumerate(queries):
+            results = processor.search(query, max_results=10)
+            query_id = f"q{number}"
+            f.write(json.dumps({'type': 'query', 'query_id': query_id, 'query': query}) + '\n')
+            # Users click the third and fifth results
+            for result in (results[2], results[4]):
+                f.write(json.dumps({'type': 'click', 'query_id': query_id, 'url': result['Publication Link']}) + '\n')
+
+
+def test_training_never_commits_a_generation(processor, built_index, tmp_path):
+    data_dir, index_dir = built_index
+    log_path = str(tmp_path / "query_log.jsonl")
+    write_click_log(log_path, processor)
+    store = IndexStore(index_dir)
+    generations = store.generations()
+
+    # Training twice used to commit two generations, collecting the one this processor reads
+    assert rerank.train(log_path, data_dir, index_dir) is not None
+    assert rerank.train(log_path, data_dir, index_dir) is not None
+    assert store.generations() == generations
+    assert os.path.isdir(processor.index_path)
+    assert saved_models(index_dir) == [model_path(index_dir, store.current_generation())]
+    assert MODEL_FILE not in os.listdir(store.open())
+    assert QueryProcessor(data_dir=data_dir, index_dir=index_dir).reranker is not None
+
+
+def test_the_model_outlives_the_generation_it_was_trained_on(built_index, tmp_path):
+    data_dir, index_dir = built_index
+    log_path = str(tmp_path / "query_log.jsonl")
+    # No processor is left holding the generation, so the builds below collect it
+    write_click_log(log_path, QueryProcessor(data_dir=data_dir, index_dir=index_dir))
+    trained_on = IndexStore(index_dir).current_generation()
+    assert rerank.train(log_path, data_dir, index_dir) is not None
+
+    for _ in range(2):
+        assert InvertedIndex(data_dir=data_dir, index_dir=index_dir).build_index()
+    assert trained_on not in IndexStore(index_dir).generations()
+    assert QueryProcessor(data_dir=data_dir, index_dir=index_dir).reranker is not None
@@ -0,0 +1,88 @@
+import os
+import stat
+
+import pytest
+
+from conftest import make_corpus, write_data
+from inverted_index import InvertedIndex
+from query_processor import QueryProcessor
+from spimi import RECORDS_FILE, append_records
+from sharding import build_shards, start_local_shards, shard_authkey, ShardedQueryProcessor, ShardServer
+
+QUERIES = ['finance', 'bank lending', 'monetary policy inflation', 'kuala lumpur housing']
+
+
+@pytest.fixture
+def local_shards(built_index, tmp_path):
+    data_dir, index_dir = built_index
+    shard_dir = str(tmp_path / "shards")
+    build_shards(index_dir, shard_dir, num_shards=3)
+    processes, addresses, authkey = start_local_shards(shard_dir)
+    yield data_dir, index_dir, addresses, authkey
+    for process in processes:
+        process.terminate()
+
+
+def ranking(results):
+    return [(result['doc_id'], result['score']) for result in results]
+
+
+def test_sharded_search_matches_the_unsharded_index(local_shards):
+    data_dir, index_dir, addresses, authkey = local_shards
+    sharded = ShardedQueryProcessor(addresses, data_dir=data_dir, index_dir=index_dir, authkey=authkey)
+    single = QueryProcessor(data_dir=data_dir, index_dir=index_dir)
+    single.reranker = None
+    assert sharded.total_documents == single.total_documents
+    for query in QUERIES:
+        # Exactly equal, not approximately: same term order, same prior arithmetic, ties by doc id
+        assert ranking(sharded.search(query)) == ranking(single.search(query))
+        assert ranking(sharded.search(query, max_results=50, expand=True)) == \
+            ranking(single.search(query, max_results=50, expand=True))
+        assert ranking(sharded.search(query, year_range=(2018, None))) == \
+            ranking(single.search(query, year_range=(2018, None)))
+
+
+def test_local_shards_reject_other_keys(local_shards):
+    data_dir, index_dir, addresses, authkey = local_shards
+    assert len(authkey) == 32
+    sharded = ShardedQueryProcessor(addresses, data_dir=data_dir, index_dir=index_dir, authkey=b'search-shards',
+                                    connect_timeout=1.0)
+    assert sharded.search('finance') == []
+    # The shards are still serving the right key
+    trusted = ShardedQueryProcessor(addresses, data_dir=data_dir, index_dir=index_dir, authkey=authkey)
+    assert trusted.search('finance')
+
+
+def test_unix_sockets_are_owner_only(local_shards):
+    _, _, addresses, _ = local_shards
+    # Connecting waits until every shard is listening
+    ShardedQueryProcessor(addresses, index_dir="missing", connect_timeout=10.0)
+    for address in addresses:
+        assert stat.S_IMODE(os.stat(address).st_mode) & 0o077 == 0
+
+
+def test_tcp_needs_a_configured_key(monkeypatch):
+    monkeypatch.delenv('SEARCH_SHARD_KEY', raising=False)
+    with pytest.raises(ValueError):
+        shard_authkey(('0.0.0.0', 7001))
+    assert shard_authkey('/tmp/shard.sock') == b'search-shards'
+    monkeypatch.setenv('SEARCH_SHARD_KEY', 'secret')
+    assert shard_authkey(('0.0.0.0', 7001)) == b'secret'
+
+
+def test_build_shards_reads_streaming_generations(tmp_path):
+    data_dir = str(tmp_path / "data")
+    publications = make_corpus(120, seed=3)
+    write_data(data_dir, publications)
+    append_records(os.path.join(data_dir, RECORDS_FILE), publications)
+    index_dir = str(tmp_path / "index")
+    assert InvertedIndex(data_dir=data_dir, index_dir=index_dir, streaming=True).build_index_streaming()
+    assert not os.path.exists(os.path.join(index_dir, "index.pkl"))
+
+    paths = build_shards(index_dir, str(tmp_path / "shards"), num_shards=2)
+    servers = [ShardServer(path) for path in paths]
+    assert sum(server.info['documents'] for server in servers) == 120
+    single = QueryProcessor(data_dir=data_dir, index_dir=index_dir)
+    for term in single.index:
+        shard_docs = sorted(doc_id for server in servers for doc_id, _ in server.index.get(term, []))
+        assert shard_docs == sorted(doc_id for doc_id, _ in single.index[term])
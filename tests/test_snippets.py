@@ -0,0 +1,105 @@
+import os
+import time
+
+import numpy as np
+
+import search_pool
+import snippets
+from analysis import Analyzer
+from conftest import make_corpus, write_data
+from index_store import IndexStore
+from inverted_index import InvertedIndex
+from query_processor import QueryProcessor
+from snippets import SnippetIndex, ELLIPSIS
+from spimi import RECORDS_FILE, append_records
+
+
+def test_spilled_blocks_equal_the_in_memory_build(tmp_path, monkeypatch):
+    monkeypatch.setattr(snippets, 'BLOCK_ROWS', 7)
+    publications = make_corpus(40, seed=2)
+    in_memory = SnippetIndex(Analyzer())
+    in_memory.build(publications)
+
+    spilled = SnippetIndex(Analyzer())
+    spilled.start(spill_dir=str(tmp_path))
+    for publication in publications:
+        spilled.add(publication)
+    spilled.finish()
+    assert spilled.save(str(tmp_path))
+    assert not [name for name in os.listdir(tmp_path) if name.endswith('.spill')]
+
+    loaded = SnippetIndex()
+    assert loaded.load(str(tmp_path))
+    for field in SnippetIndex.FIELDS:
+        assert np.array_equal(loaded.offsets[field], in_memory.offsets[field])
+        assert np.array_equal(loaded.tokens[field], in_memory.tokens[field])
+        assert np.array_equal(spilled.tokens[field], in_memory.tokens[field])
+    assert loaded.term_ids == in_memory.term_ids
+
+
+def test_streaming_build_commits_snippets_without_spill_files(tmp_path):
+    data_dir = str(tmp_path / "data")
+    publications = make_corpus(60, seed=4)
+    write_data(data_dir, publications)
+    append_records(os.path.join(data_dir, RECORDS_FILE), publications)
+    index_dir = str(tmp_path / "index")
+    assert InvertedIndex(data_dir=data_dir, index_dir=index_dir, streaming=True).build_index_streaming()
+
+    store = IndexStore(index_dir)
+    generation = store.current_generation()
+    assert not any(name.startswith('.') for name in store.manifest(generation)['files'])
+    assert not any(name.startswith('.') for name in os.listdir(store.path(generation)))
+    assert len(QueryProcessor(data_dir=data_dir, index_dir=index_dir).snippet_index()) == 60
+
+
+def snippet_of(text, query, max_chars):
+    analyzer = Analyzer()
+    index = SnippetIndex(analyzer)
+    index.build([{'Title': '', 'Abstract': text}])
+    weights = index.query_weights(analyzer.analyze(query), {})
+    return index.snippet(0, text, weights, max_chars)
+
+
+def test_passages_never_exceed_max_chars():
+    # No space within reach before the match, the passage must not reach back to the start
+    text = "x" * 300 + " banking " + "regulation " * 30
+    snippet = snippet_of(text, "banking regulation", 80)
+    passage = snippet['text'].strip(ELLIPSIS)
+    assert len(passage) <= 80
+    assert "banking" in passage
+    start, end = snippet['highlights'][0]
+    assert snippet['text'][start:end] == "banking"
+
+
+def test_snippet_highlights_point_at_the_query_terms(processor):
+    results = processor.search("monetary policy inflation", max_results=5)
+    processor.add_snippets(results, "monetary policy inflation")
+    for result in results:
+        assert len(result['snippet']['text'].strip(ELLIPSIS)) <= snippets.SNIPPET_CHARS
+        for start, end in result['title_highlights']:
+            assert processor.preprocess_query(result['title'][start:end])
+
+
+def test_pooled_searches_skip_snippets_when_asked(processor, monkeypatch):
+    monkeypatch.setattr(search_pool, '_processor', processor)
+    deadline = time.time() + 60
+    without = search_pool._run_search("bank lending", 'keyword', 5, False, False, deadline)
+    assert without['results'] and all('snippet' not in result for result in without['results'])
+    with_snippets = search_pool._run_search("bank lending", 'keyword', 5, False, True, deadline)
+    assert all('snippet' in result for result in with_snippets['results'])
+
+
+def test_pool_workers_map_the_matrix_the_build_saved(processor, monkeypatch):
+    store = processor.store
+    generation = store.current_generation()
+    files = set(os.listdir(store.path(generation)))
+    assert {'bm25_terms.pkl', 'bm25_data.npy'} <= set(store.manifest(generation)['files'])
+
+    monkeypatch.setattr(search_pool, '_processor', processor)
+    search_pool._ensure_bm25_matrix()
+    mapped = processor.bm25_matrix
+    assert not mapped.data.flags.writeable
+    assert abs(mapped - processor.build_bm25_matrix()).max() < 1e-9
+    # Nothing is written into the committed generation
+    assert set(os.listdir(store.path(generation))) == files
+    assert store.verify(generation) == []